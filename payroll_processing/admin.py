@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PayrollPeriod, Payslip, PayrollSummary
+from .models import PayrollPeriod, Payslip, PayrollSummary, PayrollRun, PayrollRunChunk, ComplianceFinding
 
 
 @admin.register(PayrollPeriod)
@@ -9,6 +9,29 @@ class PayrollPeriodAdmin(admin.ModelAdmin):
     search_fields = ['name']
     ordering = ['-start_date']
     readonly_fields = ['created_at', 'updated_at']
+    actions = ['backfill_periods']
+
+    def backfill_periods(self, request, queryset):
+        """Queue a background payroll run for every month spanned by the selected periods"""
+        from django.db.models import Max, Min
+        from django.urls import reverse
+        from django.utils.html import format_html
+        from .backfill import enqueue_backfill
+        span = queryset.aggregate(first_month=Min('start_date'), last_month=Max('start_date'))
+        results = enqueue_backfill(span['first_month'], span['last_month'], request.user)
+        run_ids = [str(result['run'].pk) for result in results if result['run'] is not None]
+        skipped = sum(bool(result['skipped']) for result in results)
+        self.message_user(
+            request,
+            format_html(
+                '{} payroll run(s) queued{}. <a href="{}?id__in={}">Follow their progress</a>.',
+                len(run_ids),
+                f', {skipped} approved or paid period(s) skipped' if skipped else '',
+                reverse('admin:payroll_processing_payrollrun_changelist'),
+                ','.join(run_ids),
+            )
+        )
+    backfill_periods.short_description = 'Backfill every month spanned by the selected periods'
 
 
 @admin.register(Payslip)
@@ -26,3 +49,38 @@ class PayrollSummaryAdmin(admin.ModelAdmin):
     list_filter = ['payroll_period__status', 'payroll_period__start_date']
     ordering = ['-payroll_period__start_date']
     readonly_fields = ['created_at', 'updated_at']
+
+
+class PayrollRunChunkInline(admin.TabularInline):
+    model = PayrollRunChunk
+    extra = 0
+    can_delete = False
+    readonly_fields = [
+        'sequence', 'first_employee_id', 'last_employee_id', 'employee_count',
+        'payslips_created', 'payslips_updated', 'committed_at',
+    ]
+
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'payroll_period', 'status', 'processed_employees', 'total_employees', 'error_count', 'requested_by', 'created_at']
+    list_filter = ['status', 'payroll_period']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'updated_at', 'started_at', 'finished_at', 'worker_id']
+    inlines = [PayrollRunChunkInline]
+    actions = ['resume_runs']
+
+    def resume_runs(self, request, queryset):
+        """Queue failed runs again; they continue after their last committed chunk"""
+        from .jobs import resume_payroll_run
+        resumed = sum(resume_payroll_run(run) for run in queryset)
+        self.message_user(request, f'{resumed} payroll run(s) queued to resume.')
+    resume_runs.short_description = 'Resume selected failed runs'
+
+
+@admin.register(ComplianceFinding)
+class ComplianceFindingAdmin(admin.ModelAdmin):
+    list_display = ['run', 'employee', 'rule', 'severity']
+    list_filter = ['severity', 'rule']
+    search_fields = ['employee__payroll_number', 'employee__first_name', 'employee__last_name']
+    raw_id_fields = ['run', 'employee']
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PayrollProcessingConfig(AppConfig):
     name = 'payroll_processing'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers artifact cache invalidation
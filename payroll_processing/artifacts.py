@@ -0,0 +1,250 @@
+"""
+Rendered artifact cache
+
+Period exports and payslips are rendered from stored payslips, so the same
+bytes come out until the period changes. Rendered files are kept on local disk
+under MEDIA_ROOT/PAYROLL_ARTIFACT_CACHE_DIR, laid out as
+
+    <period id>/<period fingerprint>/<artifact name>-<key>.<extension>
+
+The period fingerprint hashes the period's own updated_at, the number of
+payslips, the latest payslip, employee and organization updated_at; the key
+hashes the artifact's parameters and a template version (ARTIFACT_VERSION and
+the modification time of the template or renderer source). A re-run that
+changes, adds or removes payslips changes the fingerprint, so stale files are
+never served; publish_payroll_summary() then prunes the superseded fingerprint
+directories once the run commits, and deleting a period removes its directory.
+Older fingerprints left behind by other changes (e.g. approving a period) are
+never read again and age out through eviction.
+
+The cache is bounded by PAYROLL_ARTIFACT_CACHE_BYTES (0 disables it). Every
+hit refreshes the file's modification time and stores evict the least recently
+used files first. Files are written to a temporary name and moved into place,
+so concurrent requests never see a partial artifact.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+
+# Bump when a renderer changes its output without its source file changing
+ARTIFACT_VERSION = '1'
+
+
+def artifact_cache_limit():
+    """Maximum bytes kept in the artifact cache (0 disables caching)"""
+    return getattr(settings, 'PAYROLL_ARTIFACT_CACHE_BYTES', 256 * 1024 * 1024)
+
+
+def artifact_cache_root():
+    """Directory holding the cached artifacts"""
+    return Path(settings.MEDIA_ROOT) / getattr(settings, 'PAYROLL_ARTIFACT_CACHE_DIR', 'artifact_cache')
+
+
+def _digest(parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def period_fingerprint(period):
+    """
+    Hash of everything a period's rendered artifacts are built from
+
+    Args:
+        period: PayrollPeriod
+
+    Returns:
+        str: Hex digest that changes whenever a payslip of the period is written or removed
+    """
+    from employees.models import Organization
+
+    payslips = period.payslips.aggregate(
+        count=Count('id'), payslips_updated=Max('updated_at'), employees_updated=Max('employee__updated_at')
+    )
+    organization = Organization.objects.filter(is_active=True).aggregate(updated=Max('updated_at'))
+    return _digest([
+        period.pk, period.updated_at, payslips['count'], payslips['payslips_updated'],
+        payslips['employees_updated'], organization['updated'],
+    ])[:32]
+
+
+def template_version(*sources):
+    """
+    Version of the templates or renderer modules an artifact is rendered with
+
+    Args:
+        sources: Template or Python source file paths
+
+    Returns:
+        str: ARTIFACT_VERSION followed by the sources' modification times
+    """
+    mtimes = []
+    for source in sources:
+        try:
+            mtimes.append(str(int(os.path.getmtime(source))))
+        except OSError:
+            mtimes.append('0')
+    return '-'.join([ARTIFACT_VERSION] + mtimes)
+
+
+def artifact_path(period, name, extension, sources=(), **params):
+    """
+    Cache file of one rendered artifact of a period
+
+    Args:
+        period: PayrollPeriod the artifact is rendered from
+        name: Artifact name, e.g. 'register' or 'payslip-42'
+        extension: File extension
+        sources: Template or renderer source files (see template_version())
+        params: Anything else the rendered bytes depend on
+
+    Returns:
+        Path or None: None when the cache is disabled
+    """
+    if not artifact_cache_limit():
+        return None
+    key = _digest([name, template_version(*sources), sorted(params.items())])[:32]
+    return artifact_cache_root() / str(period.pk) / period_fingerprint(period) / f'{name}-{key}.{extension}'
+
+
+def open_artifact(path):
+    """
+    Open a cached artifact and mark it as recently used
+
+    Returns:
+        file or None: Binary file, or None on a cache miss
+    """
+    if path is None:
+        return None
+    try:
+        artifact = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return artifact
+
+
+def _temporary_file(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=path.parent, prefix='.', suffix='.tmp', delete=False)
+
+
+def _publish(temporary_name, path):
+    os.replace(temporary_name, path)
+    evict_artifacts()
+
+
+def store_artifact(path, source):
+    """
+    Store a rendered artifact
+
+    Args:
+        path: Path from artifact_path() (None does nothing)
+        source: bytes, or a binary file read from its current position (rewound afterwards)
+    """
+    if path is None:
+        return
+    with _temporary_file(path) as temporary:
+        if isinstance(source, bytes):
+            temporary.write(source)
+        else:
+            position = source.tell()
+            shutil.copyfileobj(source, temporary)
+            source.seek(position)
+    _publish(temporary.name, path)
+
+
+def caching_stream(path, chunks):
+    """
+    Pass a streamed response through while writing it to the cache
+
+    The artifact is only stored once the stream has been read to the end; a
+    download cancelled half way leaves nothing behind.
+
+    Args:
+        path: Path from artifact_path() (None streams without caching)
+        chunks: Iterable of str or bytes
+
+    Yields:
+        The chunks unchanged
+    """
+    if path is None:
+        yield from chunks
+        return
+    temporary = _temporary_file(path)
+    try:
+        for chunk in chunks:
+            temporary.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        temporary.close()
+        _publish(temporary.name, path)
+    finally:
+        temporary.close()
+        if os.path.exists(temporary.name):
+            os.unlink(temporary.name)
+        # Pass a close of the response (e.g. a client disconnect) on to the source
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def prune_period_artifacts(period_id):
+    """Remove a period's artifacts rendered before its latest change"""
+    from .models import PayrollPeriod
+
+    period_dir = artifact_cache_root() / str(period_id)
+    if not period_dir.is_dir():
+        return
+    period = PayrollPeriod.objects.filter(pk=period_id).first()
+    current = period_fingerprint(period) if period is not None else None
+    for entry in period_dir.iterdir():
+        if entry.name != current:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def invalidate_period_artifacts(period_id):
+    """Remove every cached artifact of a period"""
+    shutil.rmtree(artifact_cache_root() / str(period_id), ignore_errors=True)
+
+
+def evict_artifacts(limit=None):
+    """
+    Remove the least recently used artifacts until the cache fits its size limit
+
+    Args:
+        limit: Bytes to keep (default: artifact_cache_limit())
+
+    Returns:
+        int: Number of files removed
+    """
+    limit = artifact_cache_limit() if limit is None else limit
+    files = []
+    total = 0
+    for directory, dirnames, filenames in os.walk(artifact_cache_root()):
+        for filename in filenames:
+            if filename.startswith('.'):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(directory, filename)))
+            total += stat.st_size
+    removed = 0
+    for mtime, size, filename in sorted(files):
+        if total <= limit:
+            break
+        try:
+            os.unlink(filename)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,249 @@
+"""
+Multi-period payroll backfill
+
+Backfilling generates payroll for a range of months in one job, e.g. when a
+company onboards with a year of history. Employees and salary structures are
+loaded once, and every month's rates are resolved from the effective-dated
+rate tables through one RateTimeline. Months in the same rate epoch share a
+RateSnapshot, so each employee is calculated at most once per epoch and the
+results are reused by every month of that epoch. Each month's PayrollPeriod,
+payslips and summary then commit together in one transaction, under the
+period's lock; months with a payroll run in progress are skipped. Like any
+other write path, every month records a completed PayrollRun with its counts
+and compliance findings, so backfilled months carry the same audit trail.
+
+enqueue_backfill() instead queues one background PayrollRun per month (see
+jobs.py), for callers such as the admin that must answer within a request.
+
+The schema keeps only an employee's current salary structure, so that is the
+salary applied to every month; employees appear in the months between their
+date_hired and date_terminated. Payslips carry the same input fingerprints as
+a payroll run, so backfilling a range again only rewrites what changed.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from statutory_deductions.rates import get_rate_timeline
+from statutory_deductions.utils import StatutoryBatchCalculator
+
+from .jobs import (
+    ACTIVE_RUN_STATUSES, LOCKED_PERIOD_STATUSES, PayrollPeriodLocked, calculate_chunks, compliance_findings,
+    departed_employee_ids, enqueue_payroll_run, payroll_employees, period_roster
+)
+from .locks import locked_payroll_period
+from .models import ComplianceFinding, PayrollPeriod, PayrollRun
+from .runs import publish_payroll_summary, payslip_fingerprint, payslip_values, persist_payslips
+
+
+def month_dates(year, month):
+    """
+    Dates of a monthly payroll period
+
+    Returns:
+        tuple: (start_date, end_date, pay_date) with pay day three days after month end
+    """
+    start_date = date(year, month, 1)
+    end_date = date(year, month, monthrange(year, month)[1])
+    return start_date, end_date, end_date + timedelta(days=3)
+
+
+def backfill_months(first_month, last_month):
+    """
+    First days of every month from first_month to last_month, inclusive
+
+    Args:
+        first_month: Any date in the first month
+        last_month: Any date in the last month
+    """
+    year, month = first_month.year, first_month.month
+    months = []
+    while (year, month) <= (last_month.year, last_month.month):
+        months.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def month_period(start_date, end_date, pay_date, created_by):
+    """
+    Get or create the monthly PayrollPeriod of a month
+
+    Returns:
+        tuple: (PayrollPeriod, created)
+    """
+    return PayrollPeriod.objects.get_or_create(
+        start_date=start_date,
+        end_date=end_date,
+        period_type='MONTHLY',
+        defaults={
+            'name': f"{start_date.strftime('%B %Y')} Payroll",
+            'pay_date': pay_date,
+            'status': 'DRAFT',
+            'created_by': created_by,
+        }
+    )
+
+
+def enqueue_backfill(first_month, last_month, requested_by):
+    """
+    Queue a background payroll run for every month in a range
+
+    Args:
+        first_month: Any date in the first month to backfill
+        last_month: Any date in the last month to backfill
+        requested_by: User recorded as creator of new periods and requester of the runs
+
+    Returns:
+        list: Per month a dict with the period, its run (None when skipped), whether
+            the run was newly queued and skipped (the reason a signed-off period was left alone)
+    """
+    results = []
+    for month in backfill_months(first_month, last_month):
+        payroll_period, created = month_period(*month_dates(month.year, month.month), requested_by)
+        result = {'payroll_period': payroll_period, 'run': None, 'queued': False, 'skipped': ''}
+        try:
+            result['run'], result['queued'] = enqueue_payroll_run(payroll_period, requested_by=requested_by)
+        except PayrollPeriodLocked:
+            result['skipped'] = payroll_period.get_status_display()
+        results.append(result)
+    return results
+
+
+def _calculate_payslips(rate_snapshot, employees, fingerprints, chunk_size):
+    """Payslip values for employees under one rate snapshot, keyed by employee id"""
+    chunks = [employees[start:start + chunk_size] for start in range(0, len(employees), chunk_size)]
+    values = {}
+    for chunk, results in zip(chunks, calculate_chunks(rate_snapshot, chunks)):
+        for employee, calculation in zip(chunk, StatutoryBatchCalculator.iter_rows(results)):
+            values[employee.id] = payslip_values(employee.salary_structure, calculation, fingerprints[employee.id])
+    return values
+
+
+def backfill_payroll(first_month, last_month, created_by, chunk_size=None):
+    """
+    Generate payroll for every month in a range
+
+    Each month commits on its own, so a failure keeps the months already done and
+    running the backfill again continues where it stopped.
+
+    Args:
+        first_month: Any date in the first month to backfill
+        last_month: Any date in the last month to backfill
+        created_by: User recorded as creator of new payroll periods
+        chunk_size: Employees calculated per chunk (defaults to PAYROLL_RUN_CHUNK_SIZE)
+
+    Yields:
+        dict: Per month, the period, its rate_snapshot_id, the completed run
+            recording it and payslip counts (created, updated, unchanged, removed);
+            skipped gives the reason an approved, paid or currently running period
+            was left alone (run is then None)
+    """
+    chunk_size = chunk_size or getattr(settings, 'PAYROLL_RUN_CHUNK_SIZE', 250)
+    months = [month_dates(month.year, month.month) for month in backfill_months(first_month, last_month)]
+    employees = list(payroll_employees())
+    snapshots = get_rate_timeline().snapshots_for([end_date for start_date, end_date, pay_date in months])
+
+    # Per rate epoch: employee id to fingerprint, and to payslip values calculated so far
+    epoch_fingerprints = {}
+    epoch_values = {}
+
+    for start_date, end_date, pay_date in months:
+        rate_snapshot = snapshots[end_date]
+        snapshot_id = rate_snapshot.snapshot_id
+        if snapshot_id not in epoch_fingerprints:
+            epoch_fingerprints[snapshot_id] = {
+                employee.id: payslip_fingerprint(employee.salary_structure, employee.employment_type, snapshot_id)
+                for employee in employees
+            }
+            epoch_values[snapshot_id] = {}
+        fingerprints = epoch_fingerprints[snapshot_id]
+        calculated = epoch_values[snapshot_id]
+        roster = period_roster(start_date, end_date, employees)
+
+        payroll_period, created = month_period(start_date, end_date, pay_date, created_by)
+        result = {
+            'payroll_period': payroll_period,
+            'rate_snapshot_id': snapshot_id,
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'removed': 0,
+            'run': None,
+            'skipped': '',
+        }
+        with locked_payroll_period(payroll_period):
+            payroll_period.refresh_from_db()
+            if payroll_period.status in LOCKED_PERIOD_STATUSES:
+                result['skipped'] = payroll_period.get_status_display()
+            elif payroll_period.runs.filter(status__in=ACTIVE_RUN_STATUSES).exists():
+                result['skipped'] = 'run in progress'
+            else:
+                result.update(_backfill_period(
+                    payroll_period, rate_snapshot, roster, fingerprints, calculated, chunk_size, created_by
+                ))
+        yield result
+
+
+def _backfill_period(payroll_period, rate_snapshot, roster, fingerprints, calculated, chunk_size, created_by):
+    """
+    Write one month's changed payslips, drop payslips off its roster and publish its summary
+
+    Must be called with the period locked. calculated caches payslip values of the
+    month's rate epoch and is filled in for employees not calculated yet.
+
+    Returns:
+        dict: The completed PayrollRun, and payslips created, updated, unchanged and removed
+    """
+    started_at = timezone.now()
+    existing = {
+        employee_id: (payslip_id, fingerprint, nssf_employee, housing_levy_employee)
+        for employee_id, payslip_id, fingerprint, nssf_employee, housing_levy_employee
+        in payroll_period.payslips.values_list(
+            'employee_id', 'id', 'input_fingerprint', 'nssf_employee', 'housing_levy_employee'
+        )
+    }
+    changed = [
+        employee for employee in roster
+        if employee.id not in existing or existing[employee.id][1] != fingerprints[employee.id]
+    ]
+    missing = [employee for employee in changed if employee.id not in calculated]
+    if missing:
+        calculated.update(_calculate_payslips(rate_snapshot, missing, fingerprints, chunk_size))
+
+    created, updated = persist_payslips(
+        payroll_period,
+        [(employee.id, calculated[employee.id]) for employee in changed],
+        existing={employee_id: previous[0] for employee_id, previous in existing.items()}
+    )
+    departed = departed_employee_ids(payroll_period, existing.keys() - {employee.id for employee in roster})
+    removed = payroll_period.payslips.filter(employee_id__in=departed).delete()[0] if departed else 0
+
+    if payroll_period.status == 'DRAFT':
+        payroll_period.status = 'PROCESSED'
+        payroll_period.save()
+    publish_payroll_summary(payroll_period)
+
+    run = PayrollRun(
+        payroll_period=payroll_period, status='COMPLETED', requested_by=created_by, worker_id='backfill',
+        total_employees=len(roster), processed_employees=len(roster), payslips_created=created,
+        payslips_updated=updated, payslips_unchanged=len(roster) - len(changed), payslips_removed=removed,
+        started_at=started_at, finished_at=timezone.now(),
+    )
+    # Validated from the amounts each employee's payslip now holds
+    changed_ids = {employee.id for employee in changed}
+    contributions = [
+        (calculated[employee.id]['nssf_employee'], calculated[employee.id]['housing_levy_employee'])
+        if employee.id in changed_ids else existing[employee.id][2:]
+        for employee in roster
+    ]
+    findings = compliance_findings(
+        run, roster, [nssf for nssf, levy in contributions], [levy for nssf, levy in contributions]
+    )
+    run.save()
+    ComplianceFinding.objects.bulk_create(findings, batch_size=chunk_size)
+
+    return {
+        'run': run, 'created': created, 'updated': updated, 'unchanged': run.payslips_unchanged, 'removed': removed
+    }
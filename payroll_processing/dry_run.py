@@ -0,0 +1,163 @@
+"""
+Dry-run payroll preview
+
+A dry run calculates a period in memory and yields a per-employee diff against
+the stored payslips without writing anything. Like a real run it only
+calculates employees whose input fingerprint changed. The calculated payslip
+values are cached under a token for PAYROLL_DRY_RUN_TTL seconds; a run
+confirmed with that token reuses them for every employee whose inputs are
+still the same. The cache is Django's default cache, so with a per-process
+cache a run executed by another process simply calculates again.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from statutory_deductions.rates import get_rate_snapshot
+from statutory_deductions.utils import StatutoryBatchCalculator
+
+from .jobs import calculate_chunks, departed_employee_ids, period_roster
+from .models import PayrollPeriod
+from .runs import PAYSLIP_RUN_FIELDS, payslip_fingerprint, payslip_values
+
+
+DIFF_FIELDS = tuple(field for field in PAYSLIP_RUN_FIELDS if field != 'input_fingerprint')
+
+
+def _cache_key(token):
+    return f'payroll_dry_run:{token}'
+
+
+def dry_run_ttl():
+    return getattr(settings, 'PAYROLL_DRY_RUN_TTL', 600)
+
+
+def load_dry_run(token, payroll_period):
+    """
+    Fetch (and consume) the payslip values cached by a dry run of a period
+
+    Returns:
+        dict: Employee id to (input fingerprint, payslip values); empty when the
+            token expired or belongs to another period
+    """
+    key = _cache_key(token)
+    entry = cache.get(key)
+    if entry is None:
+        return {}
+    cache.delete(key)
+    if (entry['start_date'], entry['end_date']) != (payroll_period.start_date, payroll_period.end_date):
+        return {}
+    return entry['payslips']
+
+
+def _employee_line(status, employee_id, employee, changes, net_pay_delta):
+    return {
+        'type': 'employee',
+        'status': status,
+        'employee_id': employee_id,
+        'payroll_number': employee.payroll_number if employee else None,
+        'name': employee.full_name if employee else None,
+        'changes': changes,
+        'net_pay_delta': str(net_pay_delta),
+    }
+
+
+def iter_payroll_diff(start_date, end_date, chunk_size=None):
+    """
+    Preview a payroll run for a period as a stream of diff lines
+
+    Args:
+        start_date: Period start date
+        end_date: Period end date (its rates apply)
+        chunk_size: Employees calculated per chunk (defaults to PAYROLL_RUN_CHUNK_SIZE)
+
+    Yields:
+        dict: A 'header' line with the token, one 'employee' line per new, changed
+            or removed payslip, and a closing 'summary' line
+    """
+    chunk_size = chunk_size or getattr(settings, 'PAYROLL_RUN_CHUNK_SIZE', 250)
+    token = uuid.uuid4().hex
+    payroll_period = PayrollPeriod.objects.filter(
+        start_date=start_date, end_date=end_date, period_type='MONTHLY'
+    ).first()
+
+    existing = {}
+    if payroll_period is not None:
+        for row in payroll_period.payslips.values_list('employee_id', *PAYSLIP_RUN_FIELDS):
+            existing[row[0]] = dict(zip(PAYSLIP_RUN_FIELDS, row[1:]))
+
+    employees = period_roster(start_date, end_date)
+    rate_snapshot = get_rate_snapshot(end_date)
+    fingerprints = {
+        employee.id: payslip_fingerprint(employee.salary_structure, employee.employment_type, rate_snapshot.snapshot_id)
+        for employee in employees
+    }
+    changed = [
+        employee for employee in employees
+        if employee.id not in existing or existing[employee.id]['input_fingerprint'] != fingerprints[employee.id]
+    ]
+    leavers = departed_employee_ids(payroll_period, existing.keys() - fingerprints.keys()) if existing else []
+
+    yield {
+        'type': 'header',
+        'token': token,
+        'expires_in': dry_run_ttl(),
+        'payroll_period': payroll_period.name if payroll_period else None,
+        'rate_snapshot_id': rate_snapshot.snapshot_id,
+        'total_employees': len(employees),
+        'recalculated_employees': len(changed),
+    }
+
+    counts = {'new': 0, 'changed': 0, 'unchanged': len(employees) - len(changed), 'removed': 0}
+    gross_pay_delta = net_pay_delta = 0
+    cached = {}
+    chunks = [changed[start:start + chunk_size] for start in range(0, len(changed), chunk_size)]
+    chunk_results = calculate_chunks(rate_snapshot, chunks) if chunks else []
+    for chunk, results in zip(chunks, chunk_results):
+        for employee, calculation in zip(chunk, StatutoryBatchCalculator.iter_rows(results)):
+            values = payslip_values(employee.salary_structure, calculation, fingerprints[employee.id])
+            cached[employee.id] = (fingerprints[employee.id], values)
+
+            previous = existing.get(employee.id)
+            if previous is None:
+                counts['new'] += 1
+                changes = {field: {'old': None, 'new': str(values[field])} for field in DIFF_FIELDS}
+                delta = values['net_pay']
+                gross_pay_delta += values['gross_pay']
+            else:
+                changes = {
+                    field: {'old': str(previous[field]), 'new': str(values[field])}
+                    for field in DIFF_FIELDS if previous[field] != values[field]
+                }
+                if not changes:
+                    counts['unchanged'] += 1
+                    continue
+                counts['changed'] += 1
+                delta = values['net_pay'] - previous['net_pay']
+                gross_pay_delta += values['gross_pay'] - previous['gross_pay']
+
+            net_pay_delta += delta
+            yield _employee_line('new' if previous is None else 'changed', employee.id, employee, changes, delta)
+
+    for employee_id in leavers:
+        previous = existing[employee_id]
+        counts['removed'] += 1
+        gross_pay_delta -= previous['gross_pay']
+        net_pay_delta -= previous['net_pay']
+        changes = {field: {'old': str(previous[field]), 'new': None} for field in DIFF_FIELDS}
+        yield _employee_line('removed', employee_id, None, changes, -previous['net_pay'])
+
+    cache.set(_cache_key(token), {
+        'start_date': start_date,
+        'end_date': end_date,
+        'payslips': cached,
+    }, dry_run_ttl())
+
+    yield {
+        'type': 'summary',
+        'token': token,
+        'counts': counts,
+        'gross_pay_delta': str(gross_pay_delta),
+        'net_pay_delta': str(net_pay_delta),
+    }
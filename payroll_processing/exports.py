@@ -0,0 +1,161 @@
+"""
+Export file helpers
+
+Spreadsheet exports are written with xlsxwriter's constant_memory mode: a
+worksheet row is flushed to a temporary file as soon as the next row starts,
+so rows must be written top to bottom. The finished workbook is assembled in a
+SpooledTemporaryFile that stays in memory while small and moves to disk past
+PAYROLL_EXPORT_SPOOL_BYTES, and is sent with a FileResponse. Query results are
+read with .iterator(chunk_size=PAYROLL_EXPORT_CHUNK_SIZE), so memory stays
+flat however many payslips a period has.
+
+CSV and NDJSON exports skip the file altogether: rows are serialized lazily
+into a StreamingHttpResponse while the iterator reads them from a server-side
+cursor (on PostgreSQL), so the first bytes go out before the query finishes.
+
+Exports of a period can pass a cache path from artifacts.artifact_path(): the
+finished file is kept, and cached_response() serves it to later downloads.
+"""
+import csv
+import json
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+
+from .artifacts import caching_stream, open_artifact, store_artifact
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# ?format= value to (content type, file extension) of the streamed exports
+STREAM_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Serialized rows sent per chunk of a streamed export
+STREAM_BATCH_ROWS = 200
+
+
+def export_chunk_size():
+    """Rows fetched per database round trip while exporting"""
+    return getattr(settings, 'PAYROLL_EXPORT_CHUNK_SIZE', 2000)
+
+
+def spooled_output():
+    """Temporary file that stays in memory up to PAYROLL_EXPORT_SPOOL_BYTES, then moves to disk"""
+    return tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'PAYROLL_EXPORT_SPOOL_BYTES', 5 * 1024 * 1024))
+
+
+def spooled_workbook():
+    """
+    Create a constant-memory xlsxwriter workbook backed by a spooled temporary file
+
+    Returns:
+        tuple: (output file, Workbook)
+    """
+    import xlsxwriter
+
+    output = spooled_output()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    return output, workbook
+
+
+def workbook_response(output, workbook, filename, cache_path=None):
+    """
+    Close a spooled workbook and stream it as a download
+
+    Args:
+        output: File returned by spooled_workbook()
+        workbook: Workbook returned by spooled_workbook()
+        filename: Download file name
+        cache_path: Artifact cache file to keep the workbook in (optional)
+
+    Returns:
+        FileResponse: Attachment response that closes the file when sent
+    """
+    workbook.close()
+    output.seek(0)
+    store_artifact(cache_path, output)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def cached_response(cache_path, filename, content_type):
+    """
+    Serve a previously rendered export from the artifact cache
+
+    Returns:
+        FileResponse or None: None on a cache miss
+    """
+    cached = open_artifact(cache_path)
+    if cached is None:
+        return None
+    return FileResponse(cached, as_attachment=True, filename=filename, content_type=content_type)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(columns, rows):
+    """Yield a CSV header line and one line per row"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for key, header in columns])
+    for row in rows:
+        yield writer.writerow(['' if row[key] is None else row[key] for key, header in columns])
+
+
+def ndjson_lines(columns, rows):
+    """Yield one JSON object per row (amounts as strings, like the other NDJSON endpoints)"""
+    for row in rows:
+        yield json.dumps({key: _json_value(row[key]) for key, header in columns}) + '\n'
+
+
+def _batched(lines):
+    # The first line goes out on its own so the download starts right away
+    for line in lines:
+        yield line
+        break
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= STREAM_BATCH_ROWS:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def streaming_export_response(columns, rows, export_format, filename, cache_path=None):
+    """
+    Stream export rows as CSV or NDJSON
+
+    Args:
+        columns: List of (row key, CSV header) pairs
+        rows: Iterable of dicts, consumed lazily while the response is sent
+        export_format: Key of STREAM_FORMATS
+        filename: Download file name without extension
+        cache_path: Artifact cache file to keep the export in once fully sent (optional)
+
+    Returns:
+        StreamingHttpResponse: Attachment response
+    """
+    content_type, extension = STREAM_FORMATS[export_format]
+    lines = csv_lines(columns, rows) if export_format == 'csv' else ndjson_lines(columns, rows)
+    response = StreamingHttpResponse(caching_stream(cache_path, _batched(lines)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
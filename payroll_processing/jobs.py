@@ -0,0 +1,495 @@
+"""
+Background payroll runs
+
+Generating payroll creates a PayrollRun row instead of doing the work inside
+the web request. A worker claims queued runs with a conditional UPDATE (so two
+workers never pick the same run) and calculates the workforce in chunks while
+recording progress on the run. Each chunk's payslips commit together with a
+PayrollRunChunk ledger entry, so a crashed run resumes after its last
+committed chunk; the period summary is only published once every chunk has
+committed. Large runs calculate their chunks in worker processes (see
+sharding.py). Re-runs only recalculate employees whose payslip inputs
+changed, plus new hires, and drop the payslips of leavers. The roster is
+everyone employed during the period (between date_hired and date_terminated),
+so re-running a past month keeps the payslips of people who left after it.
+Approved and paid periods are never rewritten.
+
+Runs are executed by the run_payroll_worker management command. With
+PAYROLL_RUN_MODE = 'thread' (the default) the web process also starts a
+background thread for each run it queues, so single-process deployments work
+without a separate worker; set it to 'worker' when a worker process is running.
+A run whose process died (e.g. a restart mid-run) stops updating updated_at;
+once that is older than PAYROLL_RUN_STALE_SECONDS the run is queued again,
+either by the worker loop or, in thread mode, when its period is generated
+again, and it continues after its last committed chunk. Polling progress is
+read-only and never restarts a run.
+
+A period has at most one queued or running run: generating a period that is
+already being run returns the existing run, whose progress the caller shows.
+A stale run found there is queued again first, so a run orphaned by a dead
+process never blocks its period.
+"""
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from employees.models import Employee
+from statutory_deductions.money import salary_structure_columns
+from statutory_deductions.rates import get_rate_snapshot
+from statutory_deductions.utils import (
+    COMPLIANCE_RULES, StatutoryBatchCalculator, compliance_message, validate_statutory_compliance_batch
+)
+
+from .locks import locked_payroll_period
+from .models import ComplianceFinding, PayrollRun, PayrollRunChunk
+from .runs import publish_payroll_summary, payslip_fingerprint, payslip_values, persist_payslips
+from .sharding import map_shards, shard_workers
+
+
+# Statuses of a run that still owns its period
+ACTIVE_RUN_STATUSES = ('QUEUED', 'RUNNING')
+
+# Periods that were signed off are never rewritten by a payroll run or backfill
+LOCKED_PERIOD_STATUSES = ('APPROVED', 'PAID')
+
+
+class PayrollPeriodLocked(ValueError):
+    """Raised when payroll is generated for an approved or paid period"""
+
+    def __init__(self, payroll_period):
+        super().__init__(
+            f'{payroll_period.name} is {payroll_period.get_status_display().lower()} and cannot be generated again.'
+        )
+
+
+def worker_name():
+    """Identifier recorded on the runs claimed by this process"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue_payroll_run(payroll_period, requested_by=None, dry_run_token=''):
+    """
+    Queue a payroll run for a period, unless one is already queued or running
+
+    The check and the insert happen under the period's lock (see locks.py), so
+    concurrent requests for the same period share one run. An active run that
+    stopped making progress is recovered (see requeue_stale_runs()) and returned.
+
+    Args:
+        payroll_period: PayrollPeriod to generate payslips for
+        requested_by: User who requested the run (optional)
+        dry_run_token: Token of a dry run of the period whose results to reuse (optional)
+
+    Returns:
+        tuple: (PayrollRun, created) where created is False if the period's run
+            already in progress was returned instead
+
+    Raises:
+        PayrollPeriodLocked: If the period is approved or paid
+    """
+    with locked_payroll_period(payroll_period):
+        payroll_period.refresh_from_db(fields=['status'])
+        if payroll_period.status in LOCKED_PERIOD_STATUSES:
+            raise PayrollPeriodLocked(payroll_period)
+        requeue_stale_runs(runs=payroll_period.runs.all())
+        active = payroll_period.runs.filter(status__in=ACTIVE_RUN_STATUSES).order_by('created_at', 'id').first()
+        if active is not None:
+            return active, False
+        run = PayrollRun.objects.create(
+            payroll_period=payroll_period, requested_by=requested_by, dry_run_token=dry_run_token
+        )
+        if getattr(settings, 'PAYROLL_RUN_MODE', 'thread') == 'thread':
+            transaction.on_commit(lambda: _start_thread(run.id))
+    return run, True
+
+
+def _start_thread(run_id):
+    thread = threading.Thread(target=_run_in_thread, args=(run_id,), name=f'payroll-run-{run_id}', daemon=True)
+    thread.start()
+
+
+def _run_in_thread(run_id):
+    try:
+        process_payroll_run(run_id, worker_id=f'{worker_name()}:thread')
+    finally:
+        connections.close_all()
+
+
+def claim_payroll_run(run_id, worker_id=None):
+    """
+    Mark a queued run as running for this worker
+
+    Returns:
+        PayrollRun: The claimed run, or None if another worker claimed it first
+    """
+    now = timezone.now()
+    # Never two running jobs for one period, even if a run was queued around the lock
+    claimed = PayrollRun.objects.filter(pk=run_id, status='QUEUED').exclude(
+        payroll_period__runs__status='RUNNING'
+    ).update(
+        status='RUNNING', worker_id=worker_id or worker_name(), started_at=now, updated_at=now
+    )
+    if not claimed:
+        return None
+    return PayrollRun.objects.select_related('payroll_period').get(pk=run_id)
+
+
+def claim_next_payroll_run(worker_id=None):
+    """Claim the oldest queued run, or return None if the queue is empty"""
+    queued = PayrollRun.objects.filter(status='QUEUED').order_by('created_at', 'id').values_list('id', flat=True)
+    for run_id in queued[:10]:
+        run = claim_payroll_run(run_id, worker_id)
+        if run is not None:
+            return run
+    return None
+
+
+def requeue_stale_runs(stale_after=None, runs=None):
+    """
+    Queue running jobs again when their worker stopped reporting progress
+
+    A run's updated_at moves with every chunk, so a run untouched for longer than
+    PAYROLL_RUN_STALE_SECONDS belongs to a worker that died (e.g. a dyno restart).
+    In thread mode no worker loop would pick the run up again, so a new thread
+    is started for it, and for any run left queued that long (its thread never
+    started or could not claim it).
+
+    Args:
+        stale_after: Seconds without progress (defaults to PAYROLL_RUN_STALE_SECONDS)
+        runs: PayrollRun queryset to look in (default: every run)
+
+    Returns:
+        int: Number of runs queued again
+    """
+    stale_after = stale_after or getattr(settings, 'PAYROLL_RUN_STALE_SECONDS', 600)
+    runs = PayrollRun.objects.all() if runs is None else runs
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_after)
+    stale = runs.filter(status__in=ACTIVE_RUN_STATUSES, updated_at__lt=cutoff)
+    run_ids = list(stale.values_list('id', flat=True))
+    if not run_ids:
+        return 0
+
+    requeued = PayrollRun.objects.filter(pk__in=run_ids, status='RUNNING', updated_at__lt=cutoff).update(
+        status='QUEUED', processed_employees=0, error_count=0, warning_count=0, worker_id='', updated_at=now
+    )
+    if getattr(settings, 'PAYROLL_RUN_MODE', 'thread') == 'thread':
+        # Touching queued runs limits restarts to one per stale interval
+        PayrollRun.objects.filter(pk__in=run_ids, status='QUEUED', updated_at__lt=cutoff).update(updated_at=now)
+        for run_id in run_ids:
+            transaction.on_commit(lambda run_id=run_id: _start_thread(run_id))
+    return requeued
+
+
+def resume_payroll_run(run):
+    """
+    Queue a failed run again; it continues after its last committed chunk
+
+    Returns:
+        bool: True if the run was queued, False if it had not failed or another
+            run of its period is in progress
+    """
+    with locked_payroll_period(run.payroll_period):
+        if run.payroll_period.runs.filter(status__in=ACTIVE_RUN_STATUSES).exists():
+            return False
+        resumed = PayrollRun.objects.filter(pk=run.pk, status='FAILED').update(
+            status='QUEUED', processed_employees=0, error_count=0, warning_count=0,
+            error_message='', worker_id='', finished_at=None, updated_at=timezone.now()
+        )
+        if resumed and getattr(settings, 'PAYROLL_RUN_MODE', 'thread') == 'thread':
+            transaction.on_commit(lambda: _start_thread(run.pk))
+    return bool(resumed)
+
+
+def process_payroll_run(run_id, worker_id=None):
+    """
+    Claim and execute a queued run
+
+    Returns:
+        PayrollRun: The finished run, or None if it was not queued any more
+    """
+    run = claim_payroll_run(run_id, worker_id)
+    if run is not None:
+        execute_payroll_run(run)
+    return run
+
+
+def compliance_findings(run, employees, nssf_contributions, housing_levy_contributions):
+    """
+    Validate a batch of employees and count the results on the run
+
+    Returns:
+        list: Unsaved ComplianceFinding rows
+    """
+    findings = []
+    broken = validate_statutory_compliance_batch(
+        [employee.employment_type for employee in employees], nssf_contributions, housing_levy_contributions
+    )
+    for rule, rows in broken.items():
+        severity = COMPLIANCE_RULES[rule][0]
+        if severity == 'ERROR':
+            run.error_count += len(rows)
+        else:
+            run.warning_count += len(rows)
+        for index in rows:
+            employee = employees[index]
+            findings.append(ComplianceFinding(
+                run=run, employee=employee, rule=rule, severity=severity,
+                message=compliance_message(rule, employee.employment_type, employee.payroll_number),
+            ))
+    return findings
+
+
+def _shard_columns(chunk):
+    gross_pay, reliefs = salary_structure_columns([employee.salary_structure for employee in chunk])
+    return gross_pay, [employee.employment_type for employee in chunk], reliefs
+
+
+def payroll_employees():
+    """Employees with salary structures who may appear in a period, in employee id order"""
+    return Employee.objects.filter(
+        salary_structure__is_active=True
+    ).select_related('salary_structure').order_by('id')
+
+
+def employed_during(employee, start_date, end_date):
+    """True if the employee was on the payroll at any time between two dates"""
+    if not employee.is_active and employee.date_terminated is None:
+        return False
+    if employee.date_hired and employee.date_hired > end_date:
+        return False
+    if employee.date_terminated and employee.date_terminated < start_date:
+        return False
+    return True
+
+
+def period_roster(start_date, end_date, employees=None):
+    """
+    Employees a period's payslips are generated for
+
+    Args:
+        start_date: First day of the period
+        end_date: Last day of the period
+        employees: Candidates from payroll_employees() (loaded when omitted)
+
+    Returns:
+        list: Employees employed during the period, in employee id order
+    """
+    if employees is None:
+        employees = payroll_employees()
+    return [employee for employee in employees if employed_during(employee, start_date, end_date)]
+
+
+def departed_employee_ids(payroll_period, employee_ids):
+    """
+    Employees off a period's roster whose payslips should be removed
+
+    Employees still employed during the period (e.g. whose salary structure was
+    deactivated since) keep their payslips; only those outside the period's
+    employment window are returned.
+
+    Returns:
+        list: Employee ids
+    """
+    employees = Employee.objects.filter(id__in=list(employee_ids)).only(
+        'id', 'is_active', 'date_hired', 'date_terminated'
+    )
+    return [
+        employee.id for employee in employees
+        if not employed_during(employee, payroll_period.start_date, payroll_period.end_date)
+    ]
+
+
+def calculate_chunks(rate_snapshot, chunks):
+    """Yield each chunk's calculator results in order, sharded across processes for large runs"""
+    employee_count = sum(len(chunk) for chunk in chunks)
+    workers = shard_workers(employee_count, len(chunks), settings)
+    shards = (_shard_columns(chunk) for chunk in chunks)
+    if workers:
+        start_method = getattr(settings, 'PAYROLL_SHARD_START_METHOD', 'spawn')
+        yield from map_shards(rate_snapshot, shards, workers, start_method)
+        return
+
+    calculator = StatutoryBatchCalculator(rate_snapshot=rate_snapshot)
+    for gross_pay, employment_types, reliefs in shards:
+        yield calculator.calculate_cents(gross_pay, employment_types, **reliefs)
+
+
+def execute_payroll_run(run, chunk_size=None):
+    """
+    Calculate and persist every payslip of a claimed run
+
+    Failures are recorded on the run (status FAILED and error_message) rather
+    than raised, so a worker loop keeps going.
+
+    Args:
+        run: PayrollRun in RUNNING status
+        chunk_size: Employees calculated between progress updates (defaults to PAYROLL_RUN_CHUNK_SIZE)
+
+    Returns:
+        PayrollRun: The run with its final status
+    """
+    chunk_size = chunk_size or getattr(settings, 'PAYROLL_RUN_CHUNK_SIZE', 250)
+    try:
+        payroll_period = run.payroll_period
+        if payroll_period.status in LOCKED_PERIOD_STATUSES:
+            raise PayrollPeriodLocked(payroll_period)
+        employees = period_roster(payroll_period.start_date, payroll_period.end_date)
+        if not employees:
+            raise ValueError('No active employees with salary structures found for this period.')
+
+        # Rates in force at the end of the period, so past months are recalculated retroactively
+        rate_snapshot = get_rate_snapshot(payroll_period.end_date)
+
+        # Only employees whose inputs changed since the last run are recalculated. Chunks
+        # committed before a crash already carry the new fingerprint, so a resumed run
+        # continues after the last committed chunk.
+        existing = {
+            employee_id: (payslip_id, fingerprint, nssf_employee, housing_levy_employee)
+            for employee_id, payslip_id, fingerprint, nssf_employee, housing_levy_employee
+            in payroll_period.payslips.values_list(
+                'employee_id', 'id', 'input_fingerprint', 'nssf_employee', 'housing_levy_employee'
+            )
+        }
+        fingerprints = {
+            employee.id: payslip_fingerprint(employee.salary_structure, employee.employment_type, rate_snapshot.snapshot_id)
+            for employee in employees
+        }
+        changed = []
+        unchanged = []
+        for employee in employees:
+            previous = existing.get(employee.id)
+            if previous is not None and previous[1] == fingerprints[employee.id]:
+                unchanged.append(employee)
+            else:
+                changed.append(employee)
+        leavers = departed_employee_ids(payroll_period, existing.keys() - fingerprints.keys())
+
+        committed = run.chunks.aggregate(chunks=Count('id'), employees=Sum('employee_count'))
+        sequence = committed['chunks']
+        run.total_employees = len(employees)
+        run.payslips_unchanged = max(len(unchanged) - (committed['employees'] or 0), 0)
+        run.processed_employees = len(unchanged)
+
+        # Findings are rebuilt on every attempt; unchanged payslips are validated from their stored amounts
+        with transaction.atomic():
+            run.findings.all().delete()
+            ComplianceFinding.objects.bulk_create(compliance_findings(
+                run, unchanged,
+                [existing[employee.id][2] for employee in unchanged],
+                [existing[employee.id][3] for employee in unchanged],
+            ), batch_size=chunk_size)
+            run.save(update_fields=[
+                'total_employees', 'payslips_unchanged', 'processed_employees', 'error_count', 'warning_count', 'updated_at'
+            ])
+
+        # Results previewed by a dry run are reused while the employee's inputs are unchanged
+        from .dry_run import load_dry_run
+        previewed = load_dry_run(run.dry_run_token, payroll_period) if run.dry_run_token else {}
+        reused = {
+            employee.id: previewed[employee.id][1]
+            for employee in changed
+            if employee.id in previewed and previewed[employee.id][0] == fingerprints[employee.id]
+        }
+
+        # Contiguous employee id ranges, calculated in-process or across worker processes
+        chunks = [changed[start:start + chunk_size] for start in range(0, len(changed), chunk_size)]
+        pending = [[employee for employee in chunk if employee.id not in reused] for chunk in chunks]
+        chunk_results = calculate_chunks(rate_snapshot, [chunk for chunk in pending if chunk]) if any(pending) else iter(())
+        payslip_ids = {employee_id: previous[0] for employee_id, previous in existing.items()}
+
+        for chunk, calculate in zip(chunks, pending):
+            calculated = {}
+            if calculate:
+                rows = StatutoryBatchCalculator.iter_rows(next(chunk_results))
+                for employee, calculation in zip(calculate, rows):
+                    calculated[employee.id] = payslip_values(
+                        employee.salary_structure, calculation, fingerprints[employee.id]
+                    )
+
+            payslip_rows = [
+                (employee.id, calculated[employee.id] if employee.id in calculated else reused[employee.id])
+                for employee in chunk
+            ]
+
+            findings = compliance_findings(
+                run, chunk,
+                [values['nssf_employee'] for employee_id, values in payslip_rows],
+                [values['housing_levy_employee'] for employee_id, values in payslip_rows],
+            )
+
+            # Each chunk is a checkpoint: its payslips, findings and ledger entry commit together
+            with transaction.atomic():
+                created, updated = persist_payslips(payroll_period, payslip_rows, existing=payslip_ids)
+                ComplianceFinding.objects.bulk_create(findings, batch_size=chunk_size)
+                PayrollRunChunk.objects.create(
+                    run=run,
+                    sequence=sequence,
+                    first_employee_id=chunk[0].id,
+                    last_employee_id=chunk[-1].id,
+                    employee_count=len(chunk),
+                    payslips_created=created,
+                    payslips_updated=updated,
+                )
+                run.processed_employees += len(chunk)
+                run.save(update_fields=['processed_employees', 'error_count', 'warning_count', 'updated_at'])
+            sequence += 1
+
+        # The summary is only published once every chunk has committed
+        with transaction.atomic():
+            if leavers:
+                run.payslips_removed = payroll_period.payslips.filter(employee_id__in=leavers).delete()[0]
+
+            ledger = run.chunks.aggregate(created=Sum('payslips_created'), updated=Sum('payslips_updated'))
+            run.payslips_created = ledger['created'] or 0
+            run.payslips_updated = ledger['updated'] or 0
+
+            if payroll_period.status == 'DRAFT':
+                payroll_period.status = 'PROCESSED'
+                payroll_period.save()
+
+            publish_payroll_summary(payroll_period)
+
+            run.status = 'COMPLETED'
+            run.finished_at = timezone.now()
+            run.save()
+    except Exception as e:
+        run.status = 'FAILED'
+        run.error_message = str(e)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'error_message', 'finished_at', 'updated_at'])
+
+    return run
+
+
+def payroll_run_status(run):
+    """JSON-serializable progress of a run for the generation page"""
+    return {
+        'id': run.id,
+        'status': run.status,
+        'payroll_period': run.payroll_period.name,
+        'payroll_period_id': run.payroll_period_id,
+        'total_employees': run.total_employees,
+        'processed_employees': run.processed_employees,
+        'progress_percent': run.progress_percent,
+        'error_count': run.error_count,
+        'warning_count': run.warning_count,
+        'payslips_created': run.payslips_created,
+        'payslips_updated': run.payslips_updated,
+        'payslips_unchanged': run.payslips_unchanged,
+        'payslips_removed': run.payslips_removed,
+        'elapsed_seconds': round(run.elapsed_seconds),
+        'eta_seconds': run.eta_seconds,
+        'error_message': run.error_message,
+        'findings_by_rule': [
+            {'rule': row['rule'], 'severity': row['severity'], 'count': row['count']}
+            for row in run.findings.values('rule', 'severity').annotate(count=Count('id')).order_by('severity', 'rule')
+        ],
+        'finished': not run.is_active,
+    }
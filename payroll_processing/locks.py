@@ -0,0 +1,78 @@
+"""
+Period-level payroll locks
+
+Starting, resuming and backfilling payroll for a period first takes an
+exclusive lock on that period, so two admins generating the same month
+serialize: the second one finds the first one's run instead of starting
+another run that races on the same payslips. The lock is held for the short
+transaction that checks for and queues a run, never for the run itself.
+
+On PostgreSQL the lock is a transaction-scoped advisory lock keyed by the
+period id. SQLite has no row locks (SELECT ... FOR UPDATE is ignored), so an
+exclusive file lock is held until the transaction has committed. Other
+databases lock the period row with SELECT ... FOR UPDATE.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+
+# First key of the two-key PostgreSQL advisory lock, so payroll locks do not collide with other users
+ADVISORY_LOCK_NAMESPACE = 0x5041_5952  # 'PAYR'
+
+
+def _lock_file_path(payroll_period_id):
+    database = hashlib.sha1(str(connection.settings_dict['NAME']).encode('utf-8')).hexdigest()[:12]
+    lock_dir = getattr(settings, 'PAYROLL_LOCK_DIR', None) or tempfile.gettempdir()
+    return os.path.join(lock_dir, f'payroll-period-{database}-{payroll_period_id}.lock')
+
+
+@contextmanager
+def _file_lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked_payroll_period(payroll_period):
+    """
+    Run a block in a transaction that holds an exclusive lock on a payroll period
+
+    Args:
+        payroll_period: Saved PayrollPeriod to lock
+
+    Yields:
+        None: The block runs inside transaction.atomic()
+    """
+    from .models import PayrollPeriod
+
+    if connection.vendor == 'sqlite':
+        # Released only after the transaction below has committed
+        with _file_lock(_lock_file_path(payroll_period.pk)):
+            with transaction.atomic():
+                yield
+        return
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [ADVISORY_LOCK_NAMESPACE, payroll_period.pk])
+        else:
+            PayrollPeriod.objects.select_for_update().filter(pk=payroll_period.pk).first()
+        yield
@@ -0,0 +1,69 @@
+"""
+Management command to generate payroll for a range of past months in one job
+"""
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll_processing.backfill import backfill_payroll
+
+
+def parse_month(value):
+    """Parse a YYYY-MM month argument into the first day of the month"""
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Invalid month "{value}", expected YYYY-MM')
+
+
+class Command(BaseCommand):
+    help = 'Backfill monthly payroll periods and payslips for a range of months'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='first_month',
+            required=True,
+            help='First month to backfill (YYYY-MM)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='last_month',
+            help='Last month to backfill (YYYY-MM, default: current month)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Username recorded as creator of new periods (default: first superuser)'
+        )
+
+    def handle(self, *args, **options):
+        first_month = parse_month(options['first_month'])
+        last_month = parse_month(options['last_month']) if options['last_month'] else date.today().replace(day=1)
+        if first_month > last_month:
+            raise CommandError('--from must not be after --to')
+        if last_month > date.today():
+            raise CommandError('Cannot generate payroll for future months')
+
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User "{options["user"]}" not found')
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('id').first()
+            if user is None:
+                raise CommandError('No superuser found, pass --user')
+
+        self.stdout.write(f'🔧 Backfilling payroll from {first_month:%B %Y} to {last_month:%B %Y}...')
+        months = 0
+        for result in backfill_payroll(first_month, last_month, user):
+            months += 1
+            period = result['payroll_period']
+            if result['skipped']:
+                self.stdout.write(f'   - {period.name}: skipped ({result["skipped"]})')
+                continue
+            self.stdout.write(
+                f'   - {period.name}: {result["created"]} created, {result["updated"]} updated, '
+                f'{result["unchanged"]} unchanged, {result["removed"]} removed'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✅ {months} payroll periods backfilled'))
@@ -0,0 +1,44 @@
+"""
+Management command to rebuild PayrollSummary rows from stored payslips
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll_processing.models import PayrollPeriod
+from payroll_processing.runs import publish_payroll_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute payroll period summaries from their payslips with one SQL aggregation per period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'period_ids',
+            nargs='*',
+            type=int,
+            help='PayrollPeriod ids to recompute'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute the summary of every payroll period'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            periods = PayrollPeriod.objects.all()
+        elif options['period_ids']:
+            periods = PayrollPeriod.objects.filter(id__in=options['period_ids'])
+            missing = set(options['period_ids']) - set(periods.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f'Payroll period(s) not found: {", ".join(map(str, sorted(missing)))}')
+        else:
+            raise CommandError('Pass payroll period ids or --all')
+
+        self.stdout.write('🔧 Recomputing payroll summaries...')
+        for period in periods.order_by('start_date'):
+            summary = publish_payroll_summary(period)
+            self.stdout.write(
+                f'   - {period.name}: {summary.total_employees} payslips, '
+                f'gross KES {summary.total_gross_pay:,.2f}, net KES {summary.total_net_pay:,.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✅ {periods.count()} payroll summaries recomputed'))
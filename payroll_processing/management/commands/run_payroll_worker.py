@@ -0,0 +1,53 @@
+"""
+Management command that executes queued payroll runs
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from payroll_processing.jobs import (
+    claim_next_payroll_run, execute_payroll_run, requeue_stale_runs, worker_name
+)
+
+
+class Command(BaseCommand):
+    help = 'Process queued payroll runs from the database (no external broker needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the runs currently queued and exit instead of polling'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when the queue is empty (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        worker_id = worker_name()
+        self.stdout.write(f'🔧 Payroll worker {worker_id} started')
+
+        while True:
+            requeued = requeue_stale_runs()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'⚠️ Re-queued {requeued} stale payroll run(s)'))
+
+            run = claim_next_payroll_run(worker_id)
+            if run is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'   - Run #{run.id}: {run.payroll_period.name}')
+            execute_payroll_run(run)
+            if run.status == 'COMPLETED':
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Run #{run.id} completed: {run.payslips_created} created, '
+                    f'{run.payslips_updated} updated, {run.error_count} compliance errors'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ Run #{run.id} failed: {run.error_message}'))
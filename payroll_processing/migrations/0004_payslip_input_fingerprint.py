@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll_processing', '0003_payrollrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrun',
+            name='payslips_removed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='payslips_unchanged',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll_processing', '0004_payslip_input_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRunChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('first_employee_id', models.IntegerField()),
+                ('last_employee_id', models.IntegerField()),
+                ('employee_count', models.IntegerField(default=0)),
+                ('payslips_created', models.IntegerField(default=0)),
+                ('payslips_updated', models.IntegerField(default=0)),
+                ('gross_pay_delta', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('net_pay_delta', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('committed_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='payroll_processing.payrollrun')),
+            ],
+            options={
+                'ordering': ['run', 'sequence'],
+                'unique_together': {('run', 'sequence')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll_processing', '0005_payrollrunchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrun',
+            name='dry_run_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0017_revert_logo_to_charfield'),
+        ('payroll_processing', '0006_payrollrun_dry_run_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceFinding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(max_length=50)),
+                ('severity', models.CharField(choices=[('ERROR', 'Error'), ('WARNING', 'Warning')], max_length=10)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='compliance_findings', to='employees.employee')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='findings', to='payroll_processing.payrollrun')),
+            ],
+            options={
+                'ordering': ['run', 'severity', 'rule', 'id'],
+                'indexes': [models.Index(fields=['run', 'rule'], name='payroll_pro_run_id_7609ac_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll_processing', '0007_compliancefinding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='allowable_deductions',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll_processing', '0008_payslip_allowable_deductions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='payrollrunchunk',
+            name='gross_pay_delta',
+        ),
+        migrations.RemoveField(
+            model_name='payrollrunchunk',
+            name='net_pay_delta',
+        ),
+    ]
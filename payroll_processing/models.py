@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from employees.models import Employee
 
@@ -91,6 +92,12 @@ class Payslip(models.Model):
     mortgage_relief = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     pension_relief = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    # Mortgage interest, pension and post-retirement medical fund deducted before PAYE (after caps)
+    allowable_deductions = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Hash of the salary structure, employment type and rates the payslip was calculated from
+    input_fingerprint = models.CharField(max_length=40, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -194,3 +201,119 @@ class PayrollSummary(models.Model):
 
     class Meta:
         ordering = ['-payroll_period__start_date']
+
+
+class PayrollRun(models.Model):
+    """Background payroll run job for a payroll period"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    payroll_period = models.ForeignKey(PayrollPeriod, on_delete=models.CASCADE, related_name='runs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll_runs')
+
+    # Progress
+    total_employees = models.IntegerField(default=0)
+    processed_employees = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    warning_count = models.IntegerField(default=0)
+
+    # Outcome
+    payslips_created = models.IntegerField(default=0)
+    payslips_updated = models.IntegerField(default=0)
+    payslips_unchanged = models.IntegerField(default=0)
+    payslips_removed = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+
+    # Token of the dry run whose calculated payslips the run may reuse
+    dry_run_token = models.CharField(max_length=32, blank=True)
+
+    worker_id = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Payroll run #{self.id} for {self.payroll_period.name} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in ('QUEUED', 'RUNNING')
+
+    @property
+    def progress_percent(self):
+        """Share of employees calculated so far (0-100)"""
+        if self.status == 'COMPLETED':
+            return 100
+        if not self.total_employees:
+            return 0
+        return int(self.processed_employees * 100 / self.total_employees)
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        return max((end - self.started_at).total_seconds(), 0)
+
+    @property
+    def eta_seconds(self):
+        """Estimated seconds until the run finishes, from the rate so far"""
+        if self.status != 'RUNNING' or not self.processed_employees:
+            return None
+        remaining = self.total_employees - self.processed_employees
+        return round(self.elapsed_seconds * remaining / self.processed_employees)
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class PayrollRunChunk(models.Model):
+    """Ledger entry for a chunk of payslips committed by a payroll run"""
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='chunks')
+    sequence = models.IntegerField()
+
+    first_employee_id = models.IntegerField()
+    last_employee_id = models.IntegerField()
+    employee_count = models.IntegerField(default=0)
+
+    payslips_created = models.IntegerField(default=0)
+    payslips_updated = models.IntegerField(default=0)
+
+    committed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Run #{self.run_id} chunk {self.sequence} (employees {self.first_employee_id}-{self.last_employee_id})"
+
+    class Meta:
+        ordering = ['run', 'sequence']
+        unique_together = ['run', 'sequence']
+
+
+class ComplianceFinding(models.Model):
+    """Statutory compliance finding raised for an employee during a payroll run"""
+    SEVERITY_CHOICES = [
+        ('ERROR', 'Error'),
+        ('WARNING', 'Warning'),
+    ]
+
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='findings')
+    employee = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, blank=True, related_name='compliance_findings')
+    rule = models.CharField(max_length=50)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES)
+    message = models.TextField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.rule} ({self.severity}) - run #{self.run_id}"
+
+    class Meta:
+        ordering = ['run', 'severity', 'rule', 'id']
+        indexes = [models.Index(fields=['run', 'rule'])]
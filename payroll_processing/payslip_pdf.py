@@ -0,0 +1,475 @@
+"""
+Bulk payslip PDFs
+
+A period's payslips are read once into plain "documents" (dicts of strings
+and Decimals) and rendered with reportlab, one PDF per payslip. Large periods
+render in a ProcessPoolExecutor: workers receive documents only, never touch
+the database, and results are written into a ZIP as soon as each one finishes,
+so the download starts while the rest are still rendering. At most a few
+documents per worker are in flight, which keeps memory flat for periods of
+thousands of employees. A merged PDF lays every payslip out in one reportlab
+document, one page per payslip. For large periods it is laid out in a
+background thread into the artifact cache while the page polls its progress,
+then downloaded from the cache once it is stored.
+
+Downloads render inside a web worker, so the pool is small by default
+(DEFAULT_PDF_WORKERS, at most the CPU count) and is shut down, with queued
+renders cancelled, as soon as the stream is closed: a client that disconnects
+half way does not leave worker processes behind.
+
+Rendering progress is published to the Django cache under a client-chosen
+token, like the dry-run preview, and polled by the period page.
+
+Like sharding.py, this module only imports the standard library at import
+time so spawned workers can unpickle its functions before Django is set up.
+"""
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+EARNINGS = (
+    ('Basic Salary', 'basic_salary'),
+    ('House Allowance', 'house_allowance'),
+    ('Transport Allowance', 'transport_allowance'),
+    ('Medical Allowance', 'medical_allowance'),
+    ('Lunch Allowance', 'lunch_allowance'),
+    ('Communication Allowance', 'communication_allowance'),
+    ('Other Allowances', 'other_allowances'),
+    ('Overtime Pay', 'overtime_pay'),
+    ('Bonus', 'bonus'),
+    ('Car Benefit', 'car_benefit'),
+    ('Housing Benefit', 'housing_benefit'),
+    ('Other Benefits', 'other_benefits'),
+)
+
+DEDUCTIONS = (
+    ('PAYE', 'paye_tax'),
+    ('NSSF', 'nssf_employee'),
+    ('SHIF', 'shif_contribution'),
+    ('Housing Levy', 'housing_levy_employee'),
+    ('Loan Deductions', 'loan_deductions'),
+    ('Advance Deductions', 'advance_deductions'),
+    ('Other Deductions', 'other_deductions'),
+)
+
+EMPLOYER_CONTRIBUTIONS = (
+    ('NSSF Employer', 'nssf_employer'),
+    ('Housing Levy Employer', 'housing_levy_employer'),
+)
+
+RELIEFS = (
+    ('Personal Relief', 'personal_relief'),
+    ('Insurance Relief', 'insurance_relief'),
+    ('Mortgage Relief', 'mortgage_relief'),
+    ('Pension Relief', 'pension_relief'),
+)
+
+PAYSLIP_AMOUNT_FIELDS = tuple(
+    field for label, field in EARNINGS + DEDUCTIONS + EMPLOYER_CONTRIBUTIONS + RELIEFS
+) + ('gross_pay', 'total_deductions', 'net_pay')
+
+# Documents queued per worker process, bounding memory while rendering
+DOCUMENTS_PER_WORKER = 4
+
+# Worker processes per download unless PAYROLL_PDF_WORKERS says otherwise
+DEFAULT_PDF_WORKERS = 2
+
+# Progress tokens are chosen by the browser; keep them to a safe cache key
+PROGRESS_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Seconds a finished download's progress stays readable
+PROGRESS_TTL = 600
+
+
+def pdf_workers(payslip_count, settings):
+    """
+    Number of worker processes to render a period's PDFs with (0 renders in-process)
+
+    Args:
+        payslip_count: Payslips to render
+        settings: Django settings (PAYROLL_PDF_WORKERS, PAYROLL_PDF_MIN_PAYSLIPS)
+    """
+    workers = getattr(settings, 'PAYROLL_PDF_WORKERS', None)
+    if workers is None:
+        workers = DEFAULT_PDF_WORKERS
+    workers = min(workers, os.cpu_count() or 1)
+    if payslip_count < getattr(settings, 'PAYROLL_PDF_MIN_PAYSLIPS', 200):
+        return 0
+    return workers if workers > 1 else 0
+
+
+def valid_progress_token(token):
+    """Whether a client-supplied progress token can be used as a cache key"""
+    return bool(token) and bool(PROGRESS_TOKEN_PATTERN.match(token))
+
+
+def _progress_key(token):
+    return f'payslip_pdf_progress:{token}'
+
+
+def publish_progress(token, rendered, total, done=False, **details):
+    """Record how many of a download's payslips have been rendered (details: download, error)"""
+    from django.core.cache import cache
+    cache.set(_progress_key(token), {'rendered': rendered, 'total': total, 'done': done, **details}, PROGRESS_TTL)
+
+
+def progress_reporter(token, total, every=25, finish=True):
+    """
+    Callable publishing progress every few payslips, for stream_payslip_zip() and write_merged_pdf()
+
+    Args:
+        finish: Mark the download done once every payslip is rendered (False when
+            something else still has to happen before it can be downloaded)
+
+    Returns:
+        callable or None: None when the download has no valid progress token
+    """
+    if not valid_progress_token(token):
+        return None
+    publish_progress(token, 0, total)
+
+    def report(rendered):
+        if rendered == total or rendered % every == 0:
+            publish_progress(token, rendered, total, done=finish and rendered == total)
+    return report
+
+
+def render_progress(token):
+    """
+    Progress of a bulk payslip download
+
+    Returns:
+        dict: rendered, total and done, or None when the token is unknown
+    """
+    from django.core.cache import cache
+    return cache.get(_progress_key(token))
+
+
+def payslip_documents(period, chunk_size=2000):
+    """
+    Everything printed on a period's payslips, read lazily with one query
+
+    Args:
+        period: PayrollPeriod whose payslips to render
+        chunk_size: Payslips fetched per round trip
+
+    Yields:
+        dict: One picklable document per payslip, in payroll number order
+    """
+    from employees.models import Organization
+    from statutory_deductions.rates import get_rate_snapshot
+    from statutory_deductions.utils import PAYECalculator
+
+    organization = Organization.objects.filter(is_active=True).first()
+    header = {
+        'organization': organization.name if organization else '',
+        'organization_address': ', '.join(part for part in (
+            organization.address_line_1, organization.address_line_2, organization.city
+        ) if part) if organization else '',
+        'organization_kra_pin': (organization.kra_pin or '') if organization else '',
+        'period': period.name,
+        'period_dates': f'{period.start_date:%d %b %Y} - {period.end_date:%d %b %Y}',
+        'pay_date': f'{period.pay_date:%d %b %Y}',
+    }
+    paye_calc = PAYECalculator(rate_snapshot=get_rate_snapshot(period.end_date))
+
+    payslips = period.payslips.order_by('employee__payroll_number').values(
+        'id', 'employee__payroll_number', 'employee__first_name', 'employee__middle_name',
+        'employee__last_name', 'employee__department__name', 'employee__job_title__title',
+        'employee__kra_pin', 'employee__nssf_number', 'employee__shif_number', 'allowable_deductions',
+        *PAYSLIP_AMOUNT_FIELDS
+    )
+    for row in payslips.iterator(chunk_size=chunk_size):
+        names = (row['employee__first_name'], row['employee__middle_name'], row['employee__last_name'])
+        band = paye_calc.get_marginal_band(
+            max(row['gross_pay'] - row['nssf_employee'] - row['allowable_deductions'], 0)
+        )
+        document = dict(header)
+        document.update({field: row[field] for field in PAYSLIP_AMOUNT_FIELDS})
+        document.update({
+            'payslip_id': row['id'],
+            'payroll_number': row['employee__payroll_number'],
+            'employee_name': ' '.join(name for name in names if name),
+            'department': row['employee__department__name'] or 'N/A',
+            'job_title': row['employee__job_title__title'] or 'N/A',
+            'kra_pin': row['employee__kra_pin'] or '',
+            'nssf_number': row['employee__nssf_number'] or '',
+            'shif_number': row['employee__shif_number'] or '',
+            'tax_band': f"Band {band['band_number']} @ {band['marginal_rate']:.2f}%" if band else '',
+        })
+        yield document
+
+
+def payslip_filename(document):
+    """File name of a payslip inside the period ZIP"""
+    return f"{document['payroll_number']}_{document['period'].replace(' ', '_')}.pdf"
+
+
+def _amount_rows(items, document):
+    return [[label, f'{document[field]:,.2f}'] for label, field in items if document[field]]
+
+
+def payslip_story(document):
+    """reportlab flowables of one payslip page"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    story = []
+    if document['organization']:
+        story.append(Paragraph(f"<b>{document['organization']}</b>", styles['Title']))
+        if document['organization_address']:
+            story.append(Paragraph(document['organization_address'], styles['Normal']))
+        if document['organization_kra_pin']:
+            story.append(Paragraph(f"KRA PIN: {document['organization_kra_pin']}", styles['Normal']))
+    story.append(Paragraph(f"PAYSLIP - {document['period']}", styles['Heading2']))
+
+    details = Table([
+        ['Employee', document['employee_name'], 'Payroll No', document['payroll_number']],
+        ['Department', document['department'], 'Job Title', document['job_title']],
+        ['KRA PIN', document['kra_pin'], 'NSSF No', document['nssf_number']],
+        ['Period', document['period_dates'], 'Pay Date', document['pay_date']],
+    ], colWidths=[1.1 * inch, 2.3 * inch, 1.1 * inch, 2.3 * inch])
+    details.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+    story.extend([details, Spacer(1, 12)])
+
+    sections = [
+        ('Earnings', _amount_rows(EARNINGS, document), ['Gross Pay', f"{document['gross_pay']:,.2f}"]),
+        ('Deductions', _amount_rows(DEDUCTIONS, document), ['Total Deductions', f"{document['total_deductions']:,.2f}"]),
+        ('Employer Contributions', _amount_rows(EMPLOYER_CONTRIBUTIONS, document), None),
+        ('Tax Reliefs Applied', _amount_rows(RELIEFS, document), None),
+    ]
+    for title, rows, total in sections:
+        if not rows:
+            continue
+        data = [[title, 'KES']] + rows + ([total] if total else [])
+        table = Table(data, colWidths=[4.6 * inch, 2.2 * inch])
+        style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ]
+        if total:
+            style.append(('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'))
+        table.setStyle(TableStyle(style))
+        story.extend([table, Spacer(1, 10)])
+
+    net_pay = Table([['NET PAY', f"KES {document['net_pay']:,.2f}"]], colWidths=[4.6 * inch, 2.2 * inch])
+    net_pay.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+    story.append(net_pay)
+    if document['tax_band']:
+        story.extend([Spacer(1, 6), Paragraph(f"Marginal PAYE band: {document['tax_band']}", styles['Normal'])])
+    return story
+
+
+def render_payslip_pdf(document):
+    """
+    Render one payslip (runs in a worker process for large periods)
+
+    Returns:
+        bytes: PDF file content
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.6 * inch, bottomMargin=0.6 * inch,
+                            title=f"Payslip {document['payroll_number']} {document['period']}")
+    doc.build(payslip_story(document))
+    return buffer.getvalue()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def render_payslip_pdfs(documents, workers=0, start_method='spawn'):
+    """
+    Render payslips, yielding each one as soon as it is ready
+
+    Args:
+        documents: Iterable of payslip_documents() dicts
+        workers: Worker processes (0 renders in this process, in order)
+        start_method: multiprocessing start method ('spawn' is safe from threaded web processes)
+
+    Yields:
+        tuple: (document, PDF bytes), in completion order when rendered in workers
+
+    Closing the generator early shuts the pool down and cancels renders not yet started.
+    """
+    if not workers:
+        for document in documents:
+            yield document, render_payslip_pdf(document)
+        return
+
+    documents = iter(documents)
+    context = multiprocessing.get_context(start_method)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+    try:
+        pending = {}
+        for document in documents:
+            pending[executor.submit(render_payslip_pdf, document)] = document
+            if len(pending) >= workers * DOCUMENTS_PER_WORKER:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+                document = next(documents, None)
+                if document is not None:
+                    pending[executor.submit(render_payslip_pdf, document)] = document
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _StreamBuffer:
+    """Write-only file that hands its bytes over as they are written, for a streamed ZIP"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_payslip_zip(rendered, progress=None):
+    """
+    Write rendered payslips into a ZIP, yielding the archive bytes as it grows
+
+    Args:
+        rendered: Iterable of (document, PDF bytes) from render_payslip_pdfs()
+        progress: Callable called with the number of payslips written so far (optional)
+    """
+    buffer = _StreamBuffer()
+    try:
+        # PDFs are already compressed; storing them keeps the archive cheap to write
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for count, (document, pdf) in enumerate(rendered, start=1):
+                archive.writestr(payslip_filename(document), pdf)
+                if progress is not None:
+                    progress(count)
+                yield buffer.pop()
+        yield buffer.pop()
+    finally:
+        # Release the render pool right away when the download is abandoned
+        if hasattr(rendered, 'close'):
+            rendered.close()
+
+
+def write_merged_pdf(documents, output, progress=None):
+    """
+    Lay every payslip out in one PDF, one page each
+
+    Args:
+        documents: Iterable of payslip_documents() dicts
+        output: Binary file to write the PDF to
+        progress: Callable called with the number of payslips laid out so far (optional)
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Flowable, PageBreak, SimpleDocTemplate
+
+    class PayslipLaidOut(Flowable):
+        """Zero-size flowable after each payslip, reporting progress when the build places it"""
+
+        def __init__(self, count):
+            super().__init__()
+            self.count = count
+
+        def wrap(self, available_width, available_height):
+            return 0, 0
+
+        def draw(self):
+            if progress is not None:
+                progress(self.count)
+
+    story = []
+    for count, document in enumerate(documents, start=1):
+        if story:
+            story.append(PageBreak())
+        story.extend(payslip_story(document))
+        story.append(PayslipLaidOut(count))
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.6 * inch, bottomMargin=0.6 * inch)
+    doc.build(story)
+
+
+def store_merged_pdf(period_id, cache_path, token, total, chunk_size=2000):
+    """
+    Lay a period's merged PDF out into the artifact cache, publishing progress under a token
+
+    Progress is only marked done once the file is stored, with download set so
+    the page fetches it from the cache, or with the error if rendering failed.
+
+    Args:
+        period_id: PayrollPeriod id
+        cache_path: Path from artifact_path() to store the PDF at
+        token: Progress token of the download
+        total: Payslips in the period
+        chunk_size: Payslips read per database round trip
+    """
+    from .artifacts import store_artifact
+    from .exports import spooled_output
+    from .models import PayrollPeriod
+
+    try:
+        period = PayrollPeriod.objects.get(pk=period_id)
+        with spooled_output() as output:
+            write_merged_pdf(
+                payslip_documents(period, chunk_size=chunk_size), output, progress_reporter(token, total, finish=False)
+            )
+            output.seek(0)
+            store_artifact(cache_path, output)
+    except Exception as e:
+        publish_progress(token, 0, total, done=True, error=str(e))
+        raise
+    publish_progress(token, total, total, done=True, download=True)
+
+
+def render_merged_pdf_in_background(period_id, cache_path, token, total, chunk_size=2000):
+    """Run store_merged_pdf() in a daemon thread, so a large period is not laid out inside the request"""
+    thread = threading.Thread(
+        target=_store_merged_pdf_in_thread, args=(period_id, cache_path, token, total, chunk_size),
+        name=f'payslip-pdf-{period_id}', daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _store_merged_pdf_in_thread(*args):
+    from django.db import connections
+    try:
+        store_merged_pdf(*args)
+    finally:
+        connections.close_all()
@@ -0,0 +1,221 @@
+"""
+Payroll run persistence
+
+Payslips for a period are written in bulk: the period's existing payslips are
+loaded with one query, new ones go through chunked bulk_create and existing
+ones through chunked bulk_update. On databases that support it (PostgreSQL)
+a native INSERT ... ON CONFLICT upsert is used instead. Callers wrap the
+write in a single transaction.atomic() block together with the summary.
+
+Each payslip stores a fingerprint of its inputs (salary structure amounts,
+employment type and rate snapshot), so a re-run only recalculates employees
+whose fingerprint changed. The PayrollSummary is computed from the stored
+payslips with a single SQL aggregation.
+"""
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from statutory_deductions.money import SALARY_STRUCTURE_AMOUNT_FIELDS, salary_structure_cents
+
+from .artifacts import prune_period_artifacts
+from .models import Payslip, PayrollSummary
+
+
+# Payslip fields written by a payroll run, in addition to payroll_period and employee
+PAYSLIP_RUN_FIELDS = (
+    'basic_salary', 'house_allowance', 'transport_allowance', 'medical_allowance',
+    'lunch_allowance', 'communication_allowance', 'other_allowances',
+    'car_benefit', 'housing_benefit', 'gross_pay',
+    'paye_tax', 'nssf_employee', 'nssf_employer', 'shif_contribution',
+    'housing_levy_employee', 'housing_levy_employer', 'total_deductions', 'net_pay',
+    'personal_relief', 'insurance_relief', 'allowable_deductions', 'input_fingerprint',
+)
+
+# Bump when payslips gain run fields, so the next run recalculates payslips written without them
+PAYSLIP_FINGERPRINT_VERSION = 2
+
+
+def payslip_fingerprint(salary_structure, employment_type, snapshot_id):
+    """
+    Hash of everything a payslip's amounts are calculated from
+
+    Args:
+        salary_structure: Employee's SalaryStructure
+        employment_type: Employee's employment type
+        snapshot_id: RateSnapshot.snapshot_id of the rates applied
+
+    Returns:
+        str: 40-character hex digest
+    """
+    amounts = salary_structure_cents(salary_structure)
+    content = repr((
+        tuple(amounts[field] for field in SALARY_STRUCTURE_AMOUNT_FIELDS), employment_type, snapshot_id,
+        PAYSLIP_FINGERPRINT_VERSION,
+    ))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def payslip_values(salary_structure, calculation, input_fingerprint=''):
+    """
+    Payslip field values for one employee
+
+    Args:
+        salary_structure: Employee's SalaryStructure
+        calculation: Row of Decimal amounts from StatutoryBatchCalculator.iter_rows()
+        input_fingerprint: payslip_fingerprint() of the inputs (optional)
+
+    Returns:
+        dict: Values for PAYSLIP_RUN_FIELDS
+    """
+    return {
+        'basic_salary': salary_structure.basic_salary,
+        'house_allowance': salary_structure.house_allowance,
+        'transport_allowance': salary_structure.transport_allowance,
+        'medical_allowance': salary_structure.medical_allowance,
+        'lunch_allowance': salary_structure.lunch_allowance,
+        'communication_allowance': salary_structure.communication_allowance,
+        'other_allowances': salary_structure.other_allowances,
+        'car_benefit': salary_structure.car_benefit_value,
+        'housing_benefit': salary_structure.housing_benefit_value,
+        'gross_pay': salary_structure.gross_salary,
+        'paye_tax': calculation['paye_tax'],
+        'nssf_employee': calculation['nssf_employee'],
+        'nssf_employer': calculation['nssf_employer'],
+        'shif_contribution': calculation['shif_contribution'],
+        'housing_levy_employee': calculation['housing_levy_employee'],
+        'housing_levy_employer': calculation['housing_levy_employer'],
+        'total_deductions': calculation['total_deductions'],
+        'net_pay': calculation['net_pay'],
+        'personal_relief': calculation['personal_relief'],
+        'insurance_relief': calculation['insurance_relief'],
+        'allowable_deductions': calculation['allowable_deductions'],
+        'input_fingerprint': input_fingerprint,
+    }
+
+
+def _use_native_upsert():
+    return (
+        connection.vendor == 'postgresql' and
+        connection.features.supports_update_conflicts_with_target and
+        getattr(settings, 'PAYROLL_NATIVE_UPSERT', True)
+    )
+
+
+def persist_payslips(payroll_period, payslip_rows, chunk_size=None, existing=None):
+    """
+    Create or update the payslips of a payroll period in bulk
+
+    Must be called inside transaction.atomic().
+
+    Args:
+        payroll_period: PayrollPeriod being run
+        payslip_rows: Iterable of (employee_id, values) with values keyed by PAYSLIP_RUN_FIELDS
+        chunk_size: Rows per INSERT/UPDATE statement (defaults to PAYROLL_BULK_CHUNK_SIZE)
+        existing: Employee id to payslip id of the period's payslips, if already loaded
+
+    Returns:
+        tuple: (payslips created, payslips updated)
+    """
+    chunk_size = chunk_size or getattr(settings, 'PAYROLL_BULK_CHUNK_SIZE', 500)
+    if existing is None:
+        existing = dict(
+            Payslip.objects.filter(payroll_period=payroll_period).values_list('employee_id', 'id')
+        )
+
+    native_upsert = _use_native_upsert()
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for employee_id, values in payslip_rows:
+        payslip = Payslip(payroll_period=payroll_period, employee_id=employee_id, updated_at=now, **values)
+        if employee_id in existing:
+            if not native_upsert:
+                payslip.pk = existing[employee_id]
+            to_update.append(payslip)
+        else:
+            to_create.append(payslip)
+
+    update_fields = list(PAYSLIP_RUN_FIELDS) + ['updated_at']
+    if native_upsert:
+        Payslip.objects.bulk_create(
+            to_create + to_update,
+            batch_size=chunk_size,
+            update_conflicts=True,
+            unique_fields=['payroll_period', 'employee'],
+            update_fields=update_fields,
+        )
+    else:
+        Payslip.objects.bulk_create(to_create, batch_size=chunk_size)
+        Payslip.objects.bulk_update(to_update, update_fields, batch_size=chunk_size)
+
+    return len(to_create), len(to_update)
+
+
+# PayrollSummary column to the per-payslip amount it totals
+SUMMARY_AMOUNTS = {
+    'total_gross_pay': F('gross_pay'),
+    'total_basic_salary': F('basic_salary'),
+    'total_allowances': (
+        F('house_allowance') + F('transport_allowance') + F('medical_allowance') + F('lunch_allowance') +
+        F('communication_allowance') + F('other_allowances') + F('overtime_pay') + F('bonus')
+    ),
+    'total_benefits': F('car_benefit') + F('housing_benefit') + F('other_benefits'),
+    'total_paye': F('paye_tax'),
+    'total_nssf_employee': F('nssf_employee'),
+    'total_nssf_employer': F('nssf_employer'),
+    'total_shif': F('shif_contribution'),
+    'total_housing_levy_employee': F('housing_levy_employee'),
+    'total_housing_levy_employer': F('housing_levy_employer'),
+    'total_other_deductions': F('loan_deductions') + F('advance_deductions') + F('other_deductions'),
+    'total_deductions': F('total_deductions'),
+    'total_net_pay': F('net_pay'),
+    'total_personal_relief': F('personal_relief'),
+    'total_insurance_relief': F('insurance_relief'),
+    'total_mortgage_relief': F('mortgage_relief'),
+    'total_pension_relief': F('pension_relief'),
+}
+
+
+def aggregate_payroll_summary(payroll_period):
+    """
+    Every PayrollSummary column for a period, computed in one SQL aggregation
+
+    Args:
+        payroll_period: PayrollPeriod to summarize
+
+    Returns:
+        dict: PayrollSummary field values
+    """
+    amount_field = PayrollSummary._meta.get_field('total_gross_pay')
+    aggregates = {
+        column: Coalesce(Sum(amount, output_field=amount_field), Value(Decimal('0')), output_field=amount_field)
+        for column, amount in SUMMARY_AMOUNTS.items()
+    }
+    return Payslip.objects.filter(payroll_period=payroll_period).aggregate(
+        total_employees=Count('id'),
+        active_employees=Count('id', filter=Q(employee__is_active=True)),
+        **aggregates
+    )
+
+
+def publish_payroll_summary(payroll_period):
+    """
+    Create or refresh a period's PayrollSummary from its payslips
+
+    Returns:
+        PayrollSummary: The saved summary
+    """
+    summary, created = PayrollSummary.objects.update_or_create(
+        payroll_period=payroll_period,
+        defaults=aggregate_payroll_summary(payroll_period)
+    )
+    # Exports rendered before this run no longer match its payslips
+    period_id = payroll_period.pk
+    transaction.on_commit(lambda: prune_period_artifacts(period_id))
+    return summary
@@ -0,0 +1,89 @@
+"""
+Multi-process payroll computation
+
+Large payroll runs split the workforce into contiguous employee id ranges
+(the run's chunks) and calculate each shard in a ProcessPoolExecutor worker.
+A shard carries only integer cent columns and employment types, and every
+worker receives the run's RateSnapshot, so no worker touches the database and
+the results are identical to calculating the shards in the parent process.
+Results come back in shard order and the parent persists each shard's chunk
+in its own transaction, together with the chunk's checkpoint in the run's
+ledger.
+
+This module only imports the standard library at import time so spawned
+workers can unpickle its functions before Django is set up.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def shard_workers(employee_count, shard_count, settings):
+    """
+    Number of worker processes to use for a run (0 computes in-process)
+
+    Args:
+        employee_count: Employees to calculate
+        shard_count: Number of shards they are split into
+        settings: Django settings (PAYROLL_SHARD_WORKERS, PAYROLL_SHARD_MIN_EMPLOYEES)
+    """
+    workers = getattr(settings, 'PAYROLL_SHARD_WORKERS', None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if employee_count < getattr(settings, 'PAYROLL_SHARD_MIN_EMPLOYEES', 5000):
+        return 0
+    workers = min(workers, shard_count)
+    return workers if workers > 1 else 0
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def calculate_shard(rate_snapshot, gross_pay, employment_types, reliefs):
+    """
+    Calculate one shard's statutory deductions in a worker process
+
+    Args:
+        rate_snapshot: RateSnapshot of the run
+        gross_pay: List of gross pay amounts in cents
+        employment_types: List of employment types
+        reliefs: Relief columns in cents keyed by StatutoryBatchCalculator.INPUT_FIELDS
+
+    Returns:
+        dict: Result columns as lists of int cents
+    """
+    from statutory_deductions.utils import StatutoryBatchCalculator
+
+    results = StatutoryBatchCalculator(rate_snapshot=rate_snapshot).calculate_cents(
+        gross_pay, employment_types, **reliefs
+    )
+    return {field: [int(value) for value in column] for field, column in results.items()}
+
+
+def map_shards(rate_snapshot, shards, workers, start_method='spawn'):
+    """
+    Calculate shards in a process pool, yielding results in shard order
+
+    Args:
+        rate_snapshot: RateSnapshot of the run
+        shards: Iterable of (gross_pay, employment_types, reliefs) tuples
+        workers: Number of worker processes
+        start_method: multiprocessing start method ('spawn' is safe from threaded web processes)
+
+    Closing the generator early shuts the pool down and cancels shards not yet started.
+    """
+    shards = list(shards)
+    context = multiprocessing.get_context(start_method)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+    try:
+        futures = [
+            executor.submit(calculate_shard, rate_snapshot, gross_pay, employment_types, reliefs)
+            for gross_pay, employment_types, reliefs in shards
+        ]
+        for future in futures:
+            yield future.result()
+    finally:
+        # A consumer that stops early or fails does not wait for the shards still queued
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,14 @@
+"""
+Signal handlers for payroll periods
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .artifacts import invalidate_period_artifacts
+from .models import PayrollPeriod
+
+
+@receiver(post_delete, sender=PayrollPeriod, dispatch_uid='payroll_period_artifacts_delete')
+def payroll_period_deleted(sender, instance, **kwargs):
+    """Remove the cached exports and payslips of a deleted period"""
+    invalidate_period_artifacts(instance.pk)
@@ -0,0 +1,120 @@
+"""
+What-if simulation of statutory rate changes
+
+Runs the active workforce through StatutoryBatchCalculator twice, with the
+current rates and with a proposed RateSnapshot, entirely in memory. Nothing is
+written to Payslip or the rate tables.
+"""
+from statutory_deductions.money import cents_to_decimal, salary_structure_columns
+from statutory_deductions.utils import StatutoryBatchCalculator
+
+
+SIMULATED_FIELDS = (
+    'paye_tax', 'nssf_employee', 'nssf_employer', 'shif_contribution',
+    'housing_levy_employee', 'housing_levy_employer', 'total_deductions', 'net_pay',
+)
+
+
+def _workforce_totals(results, size):
+    """Per-employee cents for the simulated fields plus employer cost"""
+    columns = {field: [int(value) for value in results[field]] for field in SIMULATED_FIELDS + ('gross_pay',)}
+    columns['employer_cost'] = [
+        columns['gross_pay'][index] + columns['nssf_employer'][index] + columns['housing_levy_employer'][index]
+        for index in range(size)
+    ]
+    return columns
+
+
+def _comparison(baseline, proposed):
+    return {
+        'baseline': cents_to_decimal(baseline),
+        'proposed': cents_to_decimal(proposed),
+        'delta': cents_to_decimal(proposed - baseline),
+    }
+
+
+def simulate_rate_change(employees, baseline_snapshot, proposed_snapshot, employee_limit=None):
+    """
+    Compare the workforce's statutory deductions under current and proposed rates
+
+    Args:
+        employees: Employees with salary_structure and department loaded
+        baseline_snapshot: RateSnapshot with the current rates
+        proposed_snapshot: RateSnapshot with the proposed rates
+        employee_limit: Only return the employees with the largest net pay change (optional)
+
+    Returns:
+        dict: totals, departments and employees, each with baseline/proposed/delta amounts
+    """
+    employees = list(employees)
+    gross_pay, reliefs = salary_structure_columns([employee.salary_structure for employee in employees])
+    employment_types = [employee.employment_type for employee in employees]
+
+    baseline = _workforce_totals(
+        StatutoryBatchCalculator(rate_snapshot=baseline_snapshot).calculate_cents(
+            gross_pay, employment_types, **reliefs
+        ),
+        len(employees)
+    )
+    proposed = _workforce_totals(
+        StatutoryBatchCalculator(rate_snapshot=proposed_snapshot).calculate_cents(
+            gross_pay, employment_types, **reliefs
+        ),
+        len(employees)
+    )
+    fields = SIMULATED_FIELDS + ('employer_cost',)
+
+    totals = {field: _comparison(sum(baseline[field]), sum(proposed[field])) for field in fields}
+
+    departments = {}
+    for index, employee in enumerate(employees):
+        name = employee.department.name if employee.department else 'N/A'
+        department = departments.setdefault(name, {
+            'employee_count': 0,
+            'baseline': dict.fromkeys(fields, 0),
+            'proposed': dict.fromkeys(fields, 0),
+        })
+        department['employee_count'] += 1
+        for field in fields:
+            department['baseline'][field] += baseline[field][index]
+            department['proposed'][field] += proposed[field][index]
+
+    department_rows = [
+        {
+            'department': name,
+            'employee_count': department['employee_count'],
+            **{
+                field: _comparison(department['baseline'][field], department['proposed'][field])
+                for field in fields
+            },
+        }
+        for name, department in sorted(departments.items())
+    ]
+
+    order = sorted(
+        range(len(employees)),
+        key=lambda index: (-abs(proposed['net_pay'][index] - baseline['net_pay'][index]), index)
+    )
+    if employee_limit is not None:
+        order = order[:employee_limit]
+
+    employee_rows = []
+    for index in order:
+        employee = employees[index]
+        employee_rows.append({
+            'employee_id': employee.id,
+            'payroll_number': employee.payroll_number,
+            'name': employee.full_name,
+            'department': employee.department.name if employee.department else 'N/A',
+            'gross_pay': cents_to_decimal(gross_pay[index]),
+            **{field: _comparison(baseline[field][index], proposed[field][index]) for field in fields},
+        })
+
+    return {
+        'baseline_snapshot_id': baseline_snapshot.snapshot_id,
+        'proposed_snapshot_id': proposed_snapshot.snapshot_id,
+        'employee_count': len(employees),
+        'totals': totals,
+        'departments': department_rows,
+        'employees': employee_rows,
+    }
@@ -1,3 +1,1028 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ComplianceFinding, PayrollPeriod, Payslip, PayrollRun, PayrollSummary
+from .runs import PAYSLIP_RUN_FIELDS, payslip_values, persist_payslips
+from . import artifacts, backfill, payslip_pdf
+from .jobs import (
+    PayrollPeriodLocked, calculate_chunks, claim_next_payroll_run, enqueue_payroll_run, execute_payroll_run,
+    payroll_employees, payroll_run_status, process_payroll_run, resume_payroll_run
+)
+
+from employees.models import Organization, Department, JobTitle, Employee, SalaryStructure
+from statutory_deductions.tests import create_kenyan_rates
+from statutory_deductions.lookup import get_lookup_table, reset_lookup_tables
+from statutory_deductions.models import SHIFRate
+from statutory_deductions.rates import get_rate_snapshot, invalidate_rate_snapshots
+
+
+WORKFORCE = [
+    ('Finance', 'PERMANENT', '50000'),
+    ('Finance', 'CONTRACT', '30000'),
+    ('Operations', 'CASUAL', '120000'),
+    ('Operations', 'INTERN', '8000'),
+    ('Operations', 'PERMANENT', '450000'),
+]
+
+
+def create_workforce(workforce=WORKFORCE):
+    """Create an organization with employees and salary structures"""
+    organization = Organization.objects.create(
+        name='Test Org', address_line_1='Kenyatta Avenue', city='Nairobi',
+        phone_number='0700000000', email='payroll@example.com'
+    )
+    job_title = JobTitle.objects.create(title='Officer')
+    departments = {}
+    employees = []
+    for index, (department_name, employment_type, basic_salary) in enumerate(workforce):
+        if department_name not in departments:
+            departments[department_name] = Department.objects.create(
+                organization=organization, name=department_name, code=department_name[:3].upper()
+            )
+        employee = Employee.objects.create(
+            first_name=f'Employee{index}', last_name='Test', department=departments[department_name],
+            job_title=job_title, employment_type=employment_type, bank_name='KCB', account_number=str(index)
+        )
+        SalaryStructure.objects.create(
+            employee=employee, basic_salary=Decimal(basic_salary), house_allowance=Decimal('1000'),
+            life_insurance_premium=Decimal('500'), effective_date=date(2024, 1, 1)
+        )
+        employees.append(employee)
+    return employees
+
+
+class GrossUpEndpointTests(TestCase):
+    """calculate_gross_from_net_ajax solves single and batch requests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.user = User.objects.create_user('payroll', password='secret')
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        self.client.force_login(self.user)
+        self.url = reverse('payroll_processing:calculate_gross_from_net_ajax')
+
+    def post_json(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_single_net_salary_round_trips(self):
+        response = self.post_json({'net_salary': 75000, 'employment_type': 'PERMANENT'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['exact'])
+
+        check = self.client.post(
+            reverse('payroll_processing:calculate_payroll_ajax'),
+            json.dumps({'gross_salary': data['gross_salary'], 'employment_type': 'PERMANENT'}),
+            content_type='application/json'
+        )
+        self.assertEqual(Decimal(str(check.json()['totals']['net_pay'])), Decimal('75000'))
+
+    def test_grade_table_batch(self):
+        items = [{'reference': f'G{grade}', 'net_salary': 20000 + grade * 15000} for grade in range(10)]
+        items.append({'reference': 'bad', 'net_salary': -1})
+        response = self.post_json({'items': items})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 11)
+        self.assertEqual([item.get('reference') for item in data['results'][:10]], [f'G{grade}' for grade in range(10)])
+        self.assertIn('error', data['results'][10])
+
+    def test_rejects_get(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class CalculatePayrollLookupTests(TestCase):
+    """calculate_payroll_ajax answers identically from the precomputed lookup table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.user = User.objects.create_user('payroll', password='secret')
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        reset_lookup_tables()
+        self.addCleanup(reset_lookup_tables)
+        self.client.force_login(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(STATUTORY_LOOKUP_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def calculate(self, payload):
+        response = self.client.post(
+            reverse('payroll_processing:calculate_payroll_ajax'), json.dumps(payload), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_lookup_response_matches_calculators(self):
+        payloads = [
+            {'gross_salary': gross, 'employment_type': employment_type}
+            for gross in (5000, 15000, 32333.33, 85000, 650000.55, 1200000)
+            for employment_type in ('PERMANENT', 'CONTRACT')
+        ]
+        expected = [self.calculate(payload) for payload in payloads]
+
+        call_command('build_statutory_tables', stdout=StringIO())
+        self.assertIsNotNone(get_lookup_table(get_rate_snapshot()))
+        for payload, calculated in zip(payloads, expected):
+            served = self.calculate(payload)
+            for section in ('paye', 'totals'):
+                for key in ('effective_rate', 'take_home_percentage'):
+                    if key in calculated[section]:
+                        self.assertAlmostEqual(served[section].pop(key), calculated[section].pop(key), places=9)
+            self.assertEqual(served, calculated)
+
+
+class CalculatePayrollBatchTests(TestCase):
+    """calculate_payroll_batch_ajax streams calculate_payroll_ajax responses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.user = User.objects.create_user('payroll', password='secret')
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        self.client.force_login(self.user)
+        self.url = reverse('payroll_processing:calculate_payroll_batch_ajax')
+        self.scenarios = [
+            {'gross_salary': 15000, 'employment_type': 'PERMANENT'},
+            {'gross_salary': '85000.50', 'employment_type': 'CONTRACT', 'insurance_premiums': 4000},
+            {'gross_salary': 250000, 'mortgage_interest': 45000, 'pension_contribution': 12000,
+             'post_retirement_medical': 9000, 'insurance_premiums': 50000},
+            {'gross_salary': 0},
+        ]
+
+    def single(self, payload):
+        response = self.client.post(
+            reverse('payroll_processing:calculate_payroll_ajax'), json.dumps(payload), content_type='application/json'
+        )
+        return response.json()
+
+    def assert_same_response(self, served, calculated):
+        for section, key in (('paye', 'effective_rate'), ('totals', 'take_home_percentage')):
+            self.assertAlmostEqual(served[section].pop(key), calculated[section].pop(key), places=9)
+        self.assertEqual(served, calculated)
+
+    def test_json_array_matches_single_endpoint(self):
+        response = self.client.post(self.url, json.dumps(self.scenarios), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(results), 4)
+        for scenario, served in zip(self.scenarios[:3], results):
+            self.assert_same_response(served, self.single(scenario))
+        self.assertEqual(results[3]['index'], 3)
+        self.assertIn('error', results[3])
+
+    def test_ndjson_stream(self):
+        body = '\n'.join(json.dumps(scenario) for scenario in self.scenarios[:3]) + '\nnot json\n'
+        with self.settings(PAYROLL_BATCH_CHUNK_SIZE=2):
+            response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assert_same_response(json.loads(lines[2]), self.single(self.scenarios[2]))
+        self.assertEqual(json.loads(lines[3])['index'], 3)
+
+    def test_unrepresentable_amounts_become_error_rows(self):
+        scenarios = [
+            {'gross_salary': 'Infinity'}, {'gross_salary': 'NaN'}, {'gross_salary': '1e30'},
+            {'gross_salary': 50000, 'pension_contribution': '-Infinity'}, self.scenarios[0],
+        ]
+        response = self.client.post(self.url, json.dumps(scenarios), content_type='application/json')
+        results = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([result['index'] for result in results[:4]], [0, 1, 2, 3])
+        for result in results[:4]:
+            self.assertIn('error', result)
+        self.assert_same_response(results[4], self.single(self.scenarios[0]))
+
+    def test_malformed_json_body(self):
+        response = self.client.post(self.url, '{"items": 5}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RateSimulationTests(TestCase):
+    """payroll_rate_simulation compares proposed rates without writing payslips"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        self.client.force_login(self.user)
+        self.url = reverse('payroll_processing:payroll_rate_simulation')
+
+    def simulate(self, proposal):
+        return self.client.post(self.url, json.dumps(proposal), content_type='application/json')
+
+    def test_shif_increase_deltas(self):
+        response = self.simulate({'shif_rate': {'contribution_rate': '3.25', 'minimum_contribution': 300}})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['employee_count'], 5)
+        self.assertFalse(Payslip.objects.exists())
+
+        # 50,000 + 1,000 house allowance at 2.75% vs 3.25%
+        finance = next(row for row in report['departments'] if row['department'] == 'Finance')
+        self.assertEqual(finance['employee_count'], 2)
+        employee = next(row for row in report['employees'] if row['gross_pay'] == 51000)
+        self.assertEqual(employee['shif_contribution']['baseline'], 1402.5)
+        self.assertEqual(employee['shif_contribution']['proposed'], 1657.5)
+
+        department_delta = sum(row['net_pay']['delta'] for row in report['departments'])
+        self.assertAlmostEqual(report['totals']['net_pay']['delta'], department_delta, places=2)
+        self.assertLess(report['totals']['net_pay']['delta'], 0)
+
+    def test_unchanged_rates_have_no_delta(self):
+        report = self.simulate({'employee_limit': 2}).json()
+        self.assertEqual(len(report['employees']), 2)
+        self.assertEqual(report['baseline_snapshot_id'], report['proposed_snapshot_id'])
+        self.assertEqual(report['totals']['total_deductions']['delta'], 0)
+
+    def test_invalid_proposal(self):
+        self.assertEqual(self.simulate({'tax_bands': [{'lower_limit': 0}]}).status_code, 400)
+        self.assertEqual(self.simulate({'levy_rate': {'employee_rate': 'abc', 'employer_rate': 1}}).status_code, 400)
+
+
+class PersistPayslipsTests(TestCase):
+    """A payroll run writes payslips in bulk and reports created/updated counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=cls.user
+        )
+
+    def payslip_rows(self, employees):
+        from .views import _calculate_payroll_batch
+        employees = list(Employee.objects.filter(id__in=[e.id for e in employees]).select_related('salary_structure'))
+        calculations = _calculate_payroll_batch(employees, calculation_date=self.period.end_date)
+        return [
+            (employee.id, payslip_values(employee.salary_structure, calculation))
+            for employee, calculation in zip(employees, calculations)
+        ]
+
+    def test_create_then_update_in_bulk(self):
+        rows = self.payslip_rows(self.employees[:3])
+        with transaction.atomic():
+            self.assertEqual(persist_payslips(self.period, rows), (3, 0))
+
+        rows = self.payslip_rows(self.employees)
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            self.assertEqual(persist_payslips(self.period, rows, chunk_size=100), (2, 3))
+        # One SELECT of existing payslips, one INSERT and one UPDATE batch
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 3)
+
+        self.assertEqual(Payslip.objects.filter(payroll_period=self.period).count(), 5)
+        for employee_id, values in rows:
+            payslip = Payslip.objects.get(payroll_period=self.period, employee_id=employee_id)
+            for field, value in values.items():
+                self.assertEqual(getattr(payslip, field), value, field)
+
+
+@override_settings(PAYROLL_RUN_MODE='worker')
+class PayrollRunTests(TestCase):
+    """Payroll generation runs as a queued job that reports its progress"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=cls.user
+        )
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+
+    def test_worker_executes_queued_run(self):
+        run, created = enqueue_payroll_run(self.period, requested_by=self.user)
+        self.assertEqual(run.status, 'QUEUED')
+
+        claimed = claim_next_payroll_run('test-worker')
+        self.assertEqual(claimed.pk, run.pk)
+        self.assertEqual(claimed.status, 'RUNNING')
+        # A claimed run cannot be picked up by a second worker
+        self.assertIsNone(claim_next_payroll_run('other-worker'))
+        self.assertIsNone(process_payroll_run(run.pk))
+
+        execute_payroll_run(claimed, chunk_size=2)
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'COMPLETED')
+        self.assertEqual((run.total_employees, run.processed_employees), (5, 5))
+        self.assertEqual((run.payslips_created, run.payslips_updated), (5, 0))
+        self.assertEqual(run.progress_percent, 100)
+        self.assertIsNotNone(run.finished_at)
+
+        summary = PayrollSummary.objects.get(payroll_period=self.period)
+        payslips = Payslip.objects.filter(payroll_period=self.period)
+        self.assertEqual(summary.total_employees, 5)
+        self.assertEqual(summary.total_net_pay, sum(payslip.net_pay for payslip in payslips))
+
+        # Re-running with unchanged inputs recalculates nothing
+        rerun = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual((rerun.payslips_created, rerun.payslips_updated, rerun.payslips_unchanged), (0, 0, 5))
+        self.assertEqual((rerun.processed_employees, rerun.error_count), (5, run.error_count))
+
+    def test_second_request_attaches_to_active_run(self):
+        run, created = enqueue_payroll_run(self.period, requested_by=self.user)
+        self.assertTrue(created)
+        self.assertEqual(enqueue_payroll_run(self.period), (run, False))
+
+        claimed = claim_next_payroll_run('test-worker')
+        self.assertEqual(enqueue_payroll_run(self.period), (claimed, False))
+        # A run queued behind the lock is never claimed while the period has a running one
+        queued = PayrollRun.objects.create(payroll_period=self.period)
+        self.assertIsNone(claim_next_payroll_run('other-worker'))
+
+        execute_payroll_run(claimed)
+        self.assertEqual(claim_next_payroll_run('other-worker'), queued)
+
+    def test_request_requeues_a_stale_active_run(self):
+        run, created = enqueue_payroll_run(self.period)
+        claim_next_payroll_run('dead-worker')
+        PayrollRun.objects.filter(pk=run.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        attached, created = enqueue_payroll_run(self.period)
+        self.assertEqual((attached.pk, attached.status, created), (run.pk, 'QUEUED', False))
+        self.assertEqual(process_payroll_run(run.pk).status, 'COMPLETED')
+        self.assertTrue(enqueue_payroll_run(self.period)[1])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_generation_page_counts_the_period_roster(self):
+        # Left after January, so still paid for January
+        Employee.objects.filter(pk=self.employees[1].pk).update(is_active=False, date_terminated=date(2025, 3, 15))
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('payroll_processing:payroll_generation'), {'month': 1, 'year': 2025})
+        self.assertEqual(response.context['total_employees'], len(self.employees))
+        self.assertEqual(response.context['payroll_run'].payroll_period, self.period)
+
+    def test_failed_run_records_error(self):
+        Employee.objects.update(is_active=False)
+        run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(run.status, 'FAILED')
+        self.assertIn('No active employees', run.error_message)
+        self.assertFalse(Payslip.objects.filter(payroll_period=self.period).exists())
+
+    def test_rerun_keeps_later_leavers_and_signed_off_periods(self):
+        process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        # Left after January: still on January's roster
+        Employee.objects.filter(pk=self.employees[1].pk).update(is_active=False, date_terminated=date(2025, 3, 15))
+
+        run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(run.status, 'COMPLETED', run.error_message)
+        self.assertEqual((run.total_employees, run.payslips_removed), (5, 0))
+        self.assertTrue(Payslip.objects.filter(payroll_period=self.period, employee=self.employees[1]).exists())
+
+        # A run queued before the period was approved does not touch it
+        queued, created = enqueue_payroll_run(self.period)
+        PayrollPeriod.objects.filter(pk=self.period.pk).update(status='APPROVED')
+        Employee.objects.filter(pk=self.employees[2].pk).update(is_active=False)
+        failed = process_payroll_run(queued.pk)
+        self.assertEqual(failed.status, 'FAILED')
+        self.assertEqual(Payslip.objects.filter(payroll_period=self.period).count(), 5)
+
+        with self.assertRaises(PayrollPeriodLocked):
+            enqueue_payroll_run(self.period)
+
+    def test_progress_endpoint(self):
+        self.client.force_login(self.user)
+        run, created = enqueue_payroll_run(self.period, requested_by=self.user)
+        url = reverse('payroll_processing:payroll_run_progress', args=[run.pk])
+
+        data = self.client.get(url).json()
+        self.assertEqual(data['status'], 'QUEUED')
+        self.assertFalse(data['finished'])
+
+        process_payroll_run(run.pk)
+        data = self.client.get(url).json()
+        self.assertEqual(data['status'], 'COMPLETED')
+        self.assertTrue(data['finished'])
+        self.assertEqual(data['processed_employees'], 5)
+        self.assertEqual(data['progress_percent'], 100)
+        self.assertEqual(data['payslips_created'], 5)
+
+    def test_generating_again_restarts_run_of_a_dead_thread(self):
+        run, created = enqueue_payroll_run(self.period)
+        claim_next_payroll_run('dead-thread')
+        PayrollRun.objects.filter(pk=run.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with self.settings(PAYROLL_RUN_MODE='thread'), \
+                mock.patch('payroll_processing.jobs._start_thread') as start_thread, \
+                self.captureOnCommitCallbacks(execute=True):
+            # Polling progress is read-only
+            self.assertEqual(payroll_run_status(PayrollRun.objects.get(pk=run.pk))['status'], 'RUNNING')
+            start_thread.assert_not_called()
+
+            # Thread mode has no worker, so the next generate request restarts the run itself
+            attached, created = enqueue_payroll_run(self.period)
+        self.assertEqual((attached.pk, attached.status, created), (run.pk, 'QUEUED', False))
+        start_thread.assert_called_once_with(run.pk)
+
+    def test_worker_command_drains_queue(self):
+        enqueue_payroll_run(self.period)
+        output = StringIO()
+        call_command('run_payroll_worker', '--once', stdout=output)
+        self.assertIn('completed', output.getvalue())
+        self.assertFalse(PayrollRun.objects.filter(status='QUEUED').exists())
+
+    def test_sharded_run_matches_single_process(self):
+        payslip_fields = ['employee_id'] + list(PAYSLIP_RUN_FIELDS)
+        process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        single_process = list(
+            Payslip.objects.filter(payroll_period=self.period).order_by('employee_id').values_list(*payslip_fields)
+        )
+        Payslip.objects.all().delete()
+        PayrollSummary.objects.all().delete()
+
+        with self.settings(PAYROLL_SHARD_WORKERS=2, PAYROLL_SHARD_MIN_EMPLOYEES=0, PAYROLL_RUN_CHUNK_SIZE=2):
+            run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(run.status, 'COMPLETED', run.error_message)
+        sharded = list(
+            Payslip.objects.filter(payroll_period=self.period).order_by('employee_id').values_list(*payslip_fields)
+        )
+        self.assertEqual(sharded, single_process)
+
+    def test_abandoned_sharded_calculation_cancels_queued_shards(self):
+        chunks = [[employee] for employee in payroll_employees()]
+        shutdown = ProcessPoolExecutor.shutdown
+        with self.settings(PAYROLL_SHARD_WORKERS=2, PAYROLL_SHARD_MIN_EMPLOYEES=0), \
+                mock.patch.object(ProcessPoolExecutor, 'shutdown', autospec=True, side_effect=shutdown) as stop:
+            results = calculate_chunks(get_rate_snapshot(), chunks)
+            next(results)
+            results.close()
+        stop.assert_called_once_with(mock.ANY, wait=True, cancel_futures=True)
+
+    def test_rerun_only_recalculates_changed_employees(self):
+        process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+
+        raised, leaver = self.employees[0], self.employees[1]
+        SalaryStructure.objects.filter(employee=raised).update(basic_salary=Decimal('65000'))
+        Employee.objects.filter(pk=leaver.pk).update(is_active=False)
+        new_hire = Employee.objects.create(
+            first_name='New', last_name='Hire', department=raised.department, job_title=raised.job_title,
+            employment_type='PERMANENT', bank_name='KCB', account_number='99'
+        )
+        SalaryStructure.objects.create(employee=new_hire, basic_salary=Decimal('42000'), effective_date=date(2024, 1, 1))
+        untouched = Payslip.objects.get(payroll_period=self.period, employee=self.employees[2])
+
+        run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(run.status, 'COMPLETED', run.error_message)
+        self.assertEqual(
+            (run.payslips_created, run.payslips_updated, run.payslips_unchanged, run.payslips_removed),
+            (1, 1, 3, 1)
+        )
+        self.assertEqual(Payslip.objects.get(pk=untouched.pk).updated_at, untouched.updated_at)
+        self.assertFalse(Payslip.objects.filter(payroll_period=self.period, employee=leaver).exists())
+        self.assertEqual(
+            Payslip.objects.get(payroll_period=self.period, employee=raised).basic_salary, Decimal('65000')
+        )
+        self.assertTrue(Payslip.objects.filter(payroll_period=self.period, employee=new_hire).exists())
+
+        # Summary deltas agree with the payslips
+        summary = PayrollSummary.objects.get(payroll_period=self.period)
+        payslips = Payslip.objects.filter(payroll_period=self.period)
+        self.assertEqual(summary.total_employees, 5)
+        self.assertEqual(summary.total_gross_pay, sum(payslip.gross_pay for payslip in payslips))
+        self.assertEqual(summary.total_net_pay, sum(payslip.net_pay for payslip in payslips))
+        self.assertEqual(summary.total_deductions, summary.total_gross_pay - summary.total_net_pay)
+
+    def test_crashed_run_resumes_after_last_committed_chunk(self):
+        from . import jobs
+
+        calls = []
+
+        def crash_on_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return persist_payslips(*args, **kwargs)
+
+        with self.settings(PAYROLL_RUN_CHUNK_SIZE=2), mock.patch.object(jobs, 'persist_payslips', crash_on_second_chunk):
+            run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(run.status, 'FAILED')
+        self.assertEqual(list(run.chunks.values_list('sequence', 'employee_count')), [(0, 2)])
+        self.assertEqual(Payslip.objects.filter(payroll_period=self.period).count(), 2)
+        # No summary is published for a partial run
+        self.assertFalse(PayrollSummary.objects.filter(payroll_period=self.period).exists())
+        committed = {payslip.pk: payslip.updated_at for payslip in Payslip.objects.filter(payroll_period=self.period)}
+
+        self.assertTrue(resume_payroll_run(run))
+        with self.settings(PAYROLL_RUN_CHUNK_SIZE=2):
+            run = process_payroll_run(run.pk)
+        self.assertEqual(run.status, 'COMPLETED', run.error_message)
+        self.assertEqual(list(run.chunks.values_list('sequence', 'employee_count')), [(0, 2), (1, 2), (2, 1)])
+        self.assertEqual((run.payslips_created, run.payslips_updated, run.processed_employees), (5, 0, 5))
+        for pk, updated_at in committed.items():
+            self.assertEqual(Payslip.objects.get(pk=pk).updated_at, updated_at)
+
+        summary = PayrollSummary.objects.get(payroll_period=self.period)
+        payslips = Payslip.objects.filter(payroll_period=self.period)
+        self.assertEqual(summary.total_gross_pay, sum(payslip.gross_pay for payslip in payslips))
+        self.assertEqual(summary.total_net_pay, sum(payslip.net_pay for payslip in payslips))
+
+
+class PayrollSummaryAggregationTests(TestCase):
+    """PayrollSummary columns are aggregated from the stored payslips in SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=cls.user
+        )
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        with self.settings(PAYROLL_RUN_MODE='worker'):
+            process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+
+    def assertSummaryMatchesPayslips(self, summary):
+        payslips = list(Payslip.objects.filter(payroll_period=self.period))
+        self.assertEqual(summary.total_employees, len(payslips))
+        self.assertEqual(summary.active_employees, sum(1 for payslip in payslips if payslip.employee.is_active))
+        expected = {
+            'total_gross_pay': 'gross_pay', 'total_basic_salary': 'basic_salary',
+            'total_allowances': 'total_allowances', 'total_benefits': 'total_benefits',
+            'total_paye': 'paye_tax', 'total_nssf_employee': 'nssf_employee',
+            'total_nssf_employer': 'nssf_employer', 'total_shif': 'shif_contribution',
+            'total_housing_levy_employee': 'housing_levy_employee',
+            'total_housing_levy_employer': 'housing_levy_employer',
+            'total_other_deductions': 'total_other_deductions', 'total_deductions': 'total_deductions',
+            'total_net_pay': 'net_pay', 'total_personal_relief': 'personal_relief',
+            'total_insurance_relief': 'insurance_relief',
+        }
+        for column, attribute in expected.items():
+            self.assertEqual(getattr(summary, column), sum(getattr(payslip, attribute) for payslip in payslips), column)
+
+    def test_run_publishes_every_column(self):
+        summary = PayrollSummary.objects.get(payroll_period=self.period)
+        self.assertGreater(summary.total_paye, 0)
+        self.assertSummaryMatchesPayslips(summary)
+
+    def test_recompute_command(self):
+        PayrollSummary.objects.filter(payroll_period=self.period).update(total_paye=0, total_net_pay=0)
+        Employee.objects.filter(pk=self.employees[0].pk).update(is_active=False)
+
+        output = StringIO()
+        call_command('recompute_payroll_summary', str(self.period.pk), stdout=output)
+        self.assertIn('1 payroll summaries recomputed', output.getvalue())
+        summary = PayrollSummary.objects.get(payroll_period=self.period)
+        self.assertEqual(summary.active_employees, 4)
+        self.assertSummaryMatchesPayslips(summary)
+
+
+class PayrollBackfillTests(TestCase):
+    """A range of months is backfilled in one job, calculating once per rate epoch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        SHIFRate.objects.create(
+            contribution_rate=Decimal('3'), minimum_contribution=Decimal('300'), effective_date=date(2024, 3, 1)
+        )
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        new_hire = Employee.objects.create(
+            first_name='New', last_name='Hire', department=cls.employees[0].department,
+            job_title=cls.employees[0].job_title, employment_type='PERMANENT', bank_name='KCB',
+            account_number='99', date_hired=date(2024, 3, 15)
+        )
+        SalaryStructure.objects.create(employee=new_hire, basic_salary=Decimal('42000'), effective_date=date(2024, 3, 15))
+        cls.new_hire = new_hire
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+
+    def test_backfill_range(self):
+        with mock.patch.object(backfill, 'calculate_chunks', wraps=backfill.calculate_chunks) as calculate:
+            results = list(backfill.backfill_payroll(date(2024, 1, 1), date(2024, 4, 30), self.user))
+        # January and March each calculate their rate epoch; February and April reuse it
+        self.assertEqual(calculate.call_count, 2)
+        self.assertEqual([result['created'] for result in results], [5, 5, 6, 6])
+        self.assertEqual(len({result['rate_snapshot_id'] for result in results}), 2)
+
+        periods = PayrollPeriod.objects.order_by('start_date')
+        self.assertEqual([period.name for period in periods], [
+            'January 2024 Payroll', 'February 2024 Payroll', 'March 2024 Payroll', 'April 2024 Payroll'
+        ])
+        self.assertEqual({period.status for period in periods}, {'PROCESSED'})
+        self.assertFalse(Payslip.objects.filter(employee=self.new_hire, payroll_period__start_date__lt=date(2024, 3, 1)).exists())
+
+        january, february, march = (
+            Payslip.objects.get(payroll_period=period, employee=self.employees[0]) for period in periods[:3]
+        )
+        self.assertEqual(january.shif_contribution, february.shif_contribution)
+        self.assertGreater(march.shif_contribution, february.shif_contribution)
+        for period in periods:
+            self.assertEqual(
+                PayrollSummary.objects.get(payroll_period=period).total_net_pay,
+                sum(payslip.net_pay for payslip in period.payslips.all())
+            )
+
+        # Backfilling again rewrites nothing
+        rerun = list(backfill.backfill_payroll(date(2024, 1, 1), date(2024, 4, 30), self.user))
+        self.assertEqual([(result['created'], result['updated']) for result in rerun], [(0, 0)] * 4)
+        self.assertEqual([result['unchanged'] for result in rerun], [5, 5, 6, 6])
+
+        # Every month records a run with the findings a regular run would report
+        january_run = rerun[0]['run']
+        self.assertEqual(PayrollRun.objects.filter(payroll_period=periods[0], status='COMPLETED').count(), 2)
+        self.assertEqual((january_run.total_employees, january_run.payslips_unchanged), (5, 5))
+        with self.settings(PAYROLL_RUN_MODE='worker'):
+            regular_run = process_payroll_run(enqueue_payroll_run(periods[0])[0].pk)
+        expected = sorted(regular_run.findings.values_list('employee_id', 'rule', 'severity'))
+        self.assertTrue(expected)
+        self.assertEqual(sorted(january_run.findings.values_list('employee_id', 'rule', 'severity')), expected)
+        self.assertEqual(
+            (january_run.error_count, january_run.warning_count), (regular_run.error_count, regular_run.warning_count)
+        )
+
+    def test_command_skips_approved_periods(self):
+        PayrollPeriod.objects.create(
+            name='February 2024 Payroll', start_date=date(2024, 2, 1), end_date=date(2024, 2, 29),
+            pay_date=date(2024, 3, 3), status='APPROVED', created_by=self.user
+        )
+        output = StringIO()
+        call_command('backfill_payroll', '--from', '2024-01', '--to', '2024-03', stdout=output)
+        self.assertIn('February 2024 Payroll: skipped (Approved)', output.getvalue())
+        self.assertEqual(Payslip.objects.filter(payroll_period__start_date=date(2024, 2, 1)).count(), 0)
+        self.assertEqual(Payslip.objects.filter(payroll_period__start_date=date(2024, 3, 1)).count(), 6)
+
+
+    @override_settings(PAYROLL_RUN_MODE='worker')
+    def test_admin_action_queues_one_run_per_month(self):
+        january = PayrollPeriod.objects.create(
+            name='January 2024 Payroll', start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+            pay_date=date(2024, 2, 3), created_by=self.user
+        )
+        march = PayrollPeriod.objects.create(
+            name='March 2024 Payroll', start_date=date(2024, 3, 1), end_date=date(2024, 3, 31),
+            pay_date=date(2024, 4, 3), status='APPROVED', created_by=self.user
+        )
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:payroll_processing_payrollperiod_changelist'), {
+            'action': 'backfill_periods', '_selected_action': [january.pk, march.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+
+        # The request only queues the runs: January and February, not the approved March
+        runs = PayrollRun.objects.order_by('payroll_period__start_date')
+        self.assertEqual([run.payroll_period.name for run in runs], ['January 2024 Payroll', 'February 2024 Payroll'])
+        self.assertEqual({run.status for run in runs}, {'QUEUED'})
+        self.assertFalse(Payslip.objects.exists())
+
+        call_command('run_payroll_worker', '--once', stdout=StringIO())
+        self.assertEqual(Payslip.objects.filter(payroll_period__start_date=date(2024, 2, 1)).count(), 5)
+
+
+class PeriodExportTests(TestCase):
+    """Exports for a payroll period read its stored payslips instead of recalculating"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=cls.user
+        )
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with self.settings(PAYROLL_RUN_MODE='worker'):
+            process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+
+    def test_period_rows_match_stored_payslips(self):
+        from .views import _period_export_rows
+        # Salaries changed after the run do not change what was paid
+        SalaryStructure.objects.update(basic_salary=Decimal('99999'))
+
+        with self.assertNumQueries(1):
+            rows = list(_period_export_rows(self.period))
+        payslips = Payslip.objects.filter(payroll_period=self.period).select_related('employee')
+        stored = {payslip.employee.payroll_number: payslip for payslip in payslips}
+        self.assertEqual(len(rows), len(stored))
+        for row in rows:
+            payslip = stored[row['payroll_number']]
+            self.assertEqual(row['name'], f"{payslip.employee.first_name} {payslip.employee.last_name}")
+            self.assertEqual(row['employment_type'], payslip.employee.get_employment_type_display())
+            for field in ('basic_salary', 'paye_tax', 'nssf_employee', 'shif_contribution', 'net_pay'):
+                self.assertEqual(row[field], getattr(payslip, field))
+            self.assertEqual(row['taxable_income'], payslip.gross_pay - payslip.nssf_employee)
+
+    def test_live_tax_report_uses_the_batch_calculator(self):
+        from statutory_deductions.utils import NSSFCalculator, PAYECalculator
+        from . import views
+        rate_snapshot = get_rate_snapshot()
+        nssf_calc = NSSFCalculator(rate_snapshot=rate_snapshot)
+        paye_calc = PAYECalculator(rate_snapshot=rate_snapshot)
+
+        with mock.patch.object(views, '_calculate_payroll_batch', wraps=views._calculate_payroll_batch) as batch:
+            rows = {row[1]: row for row in views._tax_report_rows(None)}
+        batch.assert_called_once()
+        self.assertEqual(len(rows), len(self.employees))
+        for employee in self.employees:
+            basic_salary = employee.salary_structure.basic_salary
+            taxable_income = basic_salary - nssf_calc.calculate_nssf_contribution(
+                basic_salary, employee.employment_type
+            )['employee_contribution']
+            row = rows[f'{employee.first_name} {employee.last_name}']
+            self.assertEqual(row[3:], (basic_salary, taxable_income, paye_calc.calculate_paye(taxable_income)['paye_tax']))
+
+    def test_taxable_income_and_band_after_pension_mortgage_and_medical_fund(self):
+        from statutory_deductions.utils import PAYECalculator
+        from .views import _payslip_tax_band, _period_export_rows
+        employee = self.employees[0]
+        SalaryStructure.objects.filter(employee=employee).update(
+            pension_contribution=Decimal('20000'), mortgage_interest=Decimal('5000'),
+            post_retirement_medical_fund=Decimal('3000')
+        )
+        with self.settings(PAYROLL_RUN_MODE='worker'):
+            process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+
+        payslip = Payslip.objects.select_related('payroll_period').get(payroll_period=self.period, employee=employee)
+        self.assertEqual(payslip.allowable_deductions, Decimal('28000'))
+        live = PAYECalculator(rate_snapshot=get_rate_snapshot(self.period.end_date)).calculate_paye(
+            payslip.gross_pay - payslip.nssf_employee, insurance_premiums=Decimal('500'),
+            mortgage_interest=Decimal('5000'), pension_contribution=Decimal('20000'),
+            post_retirement_medical=Decimal('3000')
+        )
+        self.assertEqual(payslip.paye_tax, live['paye_tax'])
+        self.assertEqual(_payslip_tax_band(payslip)['band_index'], live['tax_band_index'])
+        row = next(row for row in _period_export_rows(self.period) if row['payroll_number'] == employee.payroll_number)
+        self.assertEqual(row['taxable_income'], live['income_after_deductions'])
+
+    def test_streamed_register_and_returns(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('payroll_processing:download_period_payslips', args=[self.period.pk]), {'format': 'csv'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['Payroll Number', 'Employee Name'])
+        self.assertEqual(len(lines), 1 + len(self.employees))
+        payslip = Payslip.objects.select_related('employee').get(payroll_period=self.period, employee=self.employees[0])
+        first = lines[1].split(',')
+        self.assertEqual(first[0], payslip.employee.payroll_number)
+        self.assertEqual(Decimal(first[5]), payslip.total_allowances)
+        self.assertEqual(Decimal(first[12]), payslip.net_pay)
+
+        response = self.client.get(
+            reverse('payroll_processing:export_statutory_returns'), {'period': self.period.pk, 'format': 'ndjson'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]['payroll_number'], payslip.employee.payroll_number)
+        self.assertEqual(Decimal(rows[0]['nssf_employee']), payslip.nssf_employee)
+        self.assertEqual(len(rows), len(self.employees))
+
+    def test_payslip_zip_and_merged_pdf(self):
+        import zipfile
+        self.client.force_login(self.user)
+        url = reverse('payroll_processing:download_period_payslips', args=[self.period.pk])
+
+        response = self.client.get(url, {'format': 'zip', 'progress': 'zip-download-1'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), len(self.employees))
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+        progress = self.client.get(reverse('payroll_processing:payslip_download_progress', args=['zip-download-1']))
+        self.assertEqual(progress.json(), {'rendered': len(self.employees), 'total': len(self.employees), 'done': True})
+
+        response = self.client.get(url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        merged = b''.join(response.streaming_content)
+        self.assertTrue(merged.startswith(b'%PDF'))
+        self.assertEqual(merged.count(b'/Type /Page\n'), len(self.employees))
+
+    def test_large_merged_pdf_renders_in_the_background(self):
+        self.client.force_login(self.user)
+        url = reverse('payroll_processing:download_period_payslips', args=[self.period.pk])
+        progress_url = reverse('payroll_processing:payslip_download_progress', args=['pdf-download-1'])
+        reported = []
+        publish_progress = payslip_pdf.publish_progress
+
+        def record(token, rendered, total, done=False, **details):
+            reported.append((rendered, done))
+            publish_progress(token, rendered, total, done, **details)
+
+        # Rendered inline rather than in a thread, which would not see the test transaction
+        in_request = mock.patch.object(
+            payslip_pdf, 'render_merged_pdf_in_background', side_effect=payslip_pdf.store_merged_pdf
+        )
+        with self.settings(PAYROLL_PDF_MIN_PAYSLIPS=0), in_request, \
+                mock.patch.object(payslip_pdf, 'publish_progress', side_effect=record):
+            response = self.client.get(url, {'format': 'pdf', 'progress': 'pdf-download-1'})
+        self.assertEqual(response.status_code, 204)
+        # Counted while the document was built, and only done once it is stored
+        self.assertEqual(reported[-2:], [(len(self.employees), False), (len(self.employees), True)])
+        total = len(self.employees)
+        self.assertEqual(
+            self.client.get(progress_url).json(), {'rendered': total, 'total': total, 'done': True, 'download': True}
+        )
+
+        with mock.patch.object(payslip_pdf, 'write_merged_pdf', side_effect=AssertionError('rendered again')):
+            response = self.client.get(url, {'format': 'pdf'})
+        merged = b''.join(response.streaming_content)
+        self.assertEqual(merged.count(b'/Type /Page\n'), total)
+
+    def test_exports_are_cached_until_a_rerun_changes_the_period(self):
+        self.client.force_login(self.user)
+        url = reverse('payroll_processing:download_period_payslips', args=[self.period.pk])
+        period_dir = artifacts.artifact_cache_root() / str(self.period.pk)
+
+        first = b''.join(self.client.get(url, {'format': 'csv'}).streaming_content)
+        self.assertEqual(len(list(period_dir.iterdir())), 1)
+        with mock.patch('payroll_processing.views._period_register_rows', side_effect=AssertionError):
+            self.assertEqual(b''.join(self.client.get(url, {'format': 'csv'}).streaming_content), first)
+
+        SalaryStructure.objects.filter(employee=self.employees[0]).update(basic_salary=Decimal('61000'))
+        with self.captureOnCommitCallbacks(execute=True), self.settings(PAYROLL_RUN_MODE='worker'):
+            process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        # The re-run pruned the artifacts rendered from the old payslips
+        self.assertFalse(list(period_dir.iterdir()))
+        rerun = b''.join(self.client.get(url, {'format': 'csv'}).streaming_content)
+        self.assertNotEqual(rerun, first)
+        self.assertIn(b'61000', rerun)
+
+    def test_eviction_drops_least_recently_used_artifacts(self):
+        paths = [artifacts.artifact_path(self.period, f'artifact-{index}', 'bin') for index in range(3)]
+        for index, path in enumerate(paths):
+            artifacts.store_artifact(path, b'x' * 100)
+            os.utime(path, (1000 + index, 1000 + index))
+        # Reading the oldest artifact makes the second one the least recently used
+        artifacts.open_artifact(paths[0]).close()
+
+        self.assertEqual(artifacts.evict_artifacts(limit=250), 1)
+        self.assertEqual([path.exists() for path in paths], [True, False, True])
+
+        self.period.delete()
+        self.assertFalse(paths[0].parent.exists())
+
+    def test_pdf_pool_is_small_by_default(self):
+        with mock.patch('os.cpu_count', return_value=32):
+            self.assertEqual(payslip_pdf.pdf_workers(1000, settings), payslip_pdf.DEFAULT_PDF_WORKERS)
+            with self.settings(PAYROLL_PDF_WORKERS=64):
+                self.assertEqual(payslip_pdf.pdf_workers(1000, settings), 32)
+
+    def test_abandoned_zip_download_closes_the_renderer(self):
+        closed = []
+
+        def rendered():
+            try:
+                for number in range(10):
+                    yield {'payroll_number': f'E{number}', 'period': 'January 2025'}, b'%PDF'
+            finally:
+                closed.append(True)
+
+        path = artifacts.artifact_path(self.period, 'payslips', 'zip')
+        chunks = artifacts.caching_stream(path, payslip_pdf.stream_payslip_zip(rendered()))
+        next(chunks)
+        chunks.close()
+        self.assertEqual(closed, [True])
+
+
+@override_settings(PAYROLL_RUN_MODE='worker')
+class PayrollDryRunTests(TestCase):
+    """A dry run streams the payslip diff without writing and its results are reused"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        self.client.force_login(self.user)
+
+    def dry_run(self):
+        response = self.client.post(reverse('payroll_processing:payroll_dry_run'), {'month': '1', 'year': '2025'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_first_dry_run_writes_nothing(self):
+        lines = self.dry_run()
+        self.assertEqual(lines[0]['type'], 'header')
+        self.assertEqual(lines[-1]['type'], 'summary')
+        self.assertEqual(lines[-1]['counts'], {'new': 5, 'changed': 0, 'unchanged': 0, 'removed': 0})
+        self.assertEqual([line['status'] for line in lines[1:-1]], ['new'] * 5)
+        self.assertFalse(PayrollPeriod.objects.exists())
+        self.assertFalse(Payslip.objects.exists())
+
+    def test_diff_against_existing_payslips_and_confirm(self):
+        from . import jobs
+
+        period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=self.user
+        )
+        process_payroll_run(enqueue_payroll_run(period)[0].pk)
+        raised = self.employees[0]
+        old_net = Payslip.objects.get(payroll_period=period, employee=raised).net_pay
+        SalaryStructure.objects.filter(employee=raised).update(basic_salary=Decimal('65000'))
+        Employee.objects.filter(pk=self.employees[1].pk).update(is_active=False)
+
+        lines = self.dry_run()
+        summary = lines[-1]
+        self.assertEqual(summary['counts'], {'new': 0, 'changed': 1, 'unchanged': 3, 'removed': 1})
+        changed = next(line for line in lines if line.get('status') == 'changed')
+        self.assertEqual(changed['employee_id'], raised.pk)
+        self.assertEqual(changed['changes']['basic_salary'], {'old': '50000.00', 'new': '65000.00'})
+        self.assertIn('paye_tax', changed['changes'])
+        self.assertNotIn('input_fingerprint', changed['changes'])
+        # Nothing was written by the preview
+        self.assertEqual(Payslip.objects.get(payroll_period=period, employee=raised).net_pay, old_net)
+
+        # Confirming with the token reuses the previewed payslips instead of recalculating
+        with mock.patch.object(jobs, 'calculate_chunks', side_effect=AssertionError('recalculated')):
+            run = process_payroll_run(enqueue_payroll_run(period, dry_run_token=summary['token'])[0].pk)
+        self.assertEqual(run.status, 'COMPLETED', run.error_message)
+        self.assertEqual((run.payslips_updated, run.payslips_removed), (1, 1))
+        new_net = Payslip.objects.get(payroll_period=period, employee=raised).net_pay
+        self.assertEqual(str(new_net - old_net), changed['net_pay_delta'])
+
+    def test_rejects_future_month(self):
+        response = self.client.post(reverse('payroll_processing:payroll_dry_run'), {'month': '1', 'year': '2999'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAYROLL_RUN_MODE='worker')
+class ComplianceFindingTests(TestCase):
+    """Compliance results are stored as findings on the run instead of flash messages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+        cls.employees = create_workforce()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        cls.period = PayrollPeriod.objects.create(
+            name='January 2025 Payroll', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+            pay_date=date(2025, 2, 3), created_by=cls.user
+        )
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+
+    def test_findings_are_grouped_per_rule(self):
+        run = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        # One contract employee: the SHIF-only notice
+        contract = self.employees[1]
+        self.assertEqual(
+            list(run.findings.values_list('employee_id', 'rule', 'severity')),
+            [(contract.pk, 'CONTRACT_SHIF_ONLY', 'WARNING')]
+        )
+        self.assertEqual((run.error_count, run.warning_count), (0, 1))
+
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('payroll_processing:payroll_run_progress', args=[run.pk])).json()
+        self.assertEqual(data['findings_by_rule'], [{'rule': 'CONTRACT_SHIF_ONLY', 'severity': 'WARNING', 'count': 1}])
+
+        # A re-run rebuilds the findings from the stored payslips
+        rerun = process_payroll_run(enqueue_payroll_run(self.period)[0].pk)
+        self.assertEqual(rerun.payslips_unchanged, 5)
+        self.assertEqual(rerun.findings.count(), 1)
+        self.assertEqual(ComplianceFinding.objects.count(), 2)
@@ -10,14 +10,21 @@ urlpatterns = [
     path('calculator/', views.payroll_calculator, name='payroll_calculator'),
     path('tax-calculator/', views.tax_calculator, name='tax_calculator'),
     path('calculate-ajax/', views.calculate_payroll_ajax, name='calculate_payroll_ajax'),
+    path('calculate-batch/', views.calculate_payroll_batch_ajax, name='calculate_payroll_batch_ajax'),
+    path('gross-up-ajax/', views.calculate_gross_from_net_ajax, name='calculate_gross_from_net_ajax'),
+    path('simulate-rates/', views.payroll_rate_simulation, name='payroll_rate_simulation'),
     path('employee/<int:employee_id>/', views.employee_payroll_detail, name='employee_payroll_detail'),
     path('payslip/<int:payslip_id>/', views.view_payslip, name='view_payslip'),
     path('payslip/generate/<int:employee_id>/', views.generate_payslip, name='generate_payslip'),
     path('reports/', views.payroll_reports, name='payroll_reports'),
     path('generate/', views.payroll_generation, name='payroll_generation'),
+    path('generate/dry-run/', views.payroll_dry_run, name='payroll_dry_run'),
+    path('runs/<int:run_id>/progress/', views.payroll_run_progress, name='payroll_run_progress'),
+    path('runs/<int:run_id>/findings/', views.payroll_run_findings, name='payroll_run_findings'),
     path('periods/', views.payroll_periods, name='payroll_periods'),
     path('periods/<int:period_id>/', views.payroll_period_detail, name='payroll_period_detail'),
     path('periods/<int:period_id>/download/', views.download_period_payslips, name='download_period_payslips'),
+    path('periods/download-progress/<str:token>/', views.payslip_download_progress, name='payslip_download_progress'),
     path('periods/<int:period_id>/delete/', views.payroll_period_delete, name='payroll_period_delete'),
     path('periods/bulk-delete/', views.bulk_payroll_period_delete, name='bulk_payroll_period_delete'),
 
@@ -1,13 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
-from django.db.models import Sum
+from django.conf import settings
+from django.db.models import ExpressionWrapper, Sum
 from django.template.loader import get_template
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 import io
 # import xlsxwriter  # Temporarily disabled for deployment
 # from reportlab.lib.pagesizes import letter, A4, landscape  # Temporarily disabled for deployment
@@ -17,15 +19,64 @@ import io
 # from reportlab.lib.units import inch  # Temporarily disabled for deployment
 import os
 from employees.models import Employee, Department, JobTitle
-from .models import PayrollPeriod, Payslip, PayrollSummary
+from .models import PayrollPeriod, Payslip, PayrollSummary, PayrollRun
+from .jobs import PayrollPeriodLocked, enqueue_payroll_run, payroll_run_status, period_roster
+from .artifacts import artifact_path, caching_stream, open_artifact, store_artifact
+from .exports import (
+    STREAM_FORMATS, XLSX_CONTENT_TYPE, cached_response, export_chunk_size, spooled_output, spooled_workbook,
+    streaming_export_response, workbook_response
+)
+from .runs import SUMMARY_AMOUNTS
+from .simulation import simulate_rate_change
 from statutory_deductions.utils import (
     PAYECalculator, NSSFCalculator, SHIFCalculator,
-    AffordableHousingLevyCalculator, validate_statutory_deductions_compliance
+    AffordableHousingLevyCalculator, StatutoryBatchCalculator,
+    MORTGAGE_INTEREST_CAP, PENSION_CONTRIBUTION_CAP, POST_RETIREMENT_MEDICAL_CAP,
+    INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP
 )
+from statutory_deductions.rates import get_rate_snapshot, build_proposed_snapshot
+from statutory_deductions.money import MICRO_PER_CENT, to_cents, salary_structure_columns
+from statutory_deductions.gross_up import NetToGrossSolver
+from statutory_deductions.lookup import get_lookup_table
 import json
+from datetime import datetime
 from decimal import Decimal
 
 
+def _calculate_payroll_batch(employees, amount_field='gross_salary', include_reliefs=True, calculation_date=None):
+    """
+    Calculate statutory deductions for employees' salary structures in one batch
+
+    Args:
+        employees: Employees with salary_structure loaded (list or queryset)
+        amount_field: SalaryStructure attribute used as gross pay
+        include_reliefs: Pass insurance, mortgage, pension and medical fund reliefs to PAYE
+        calculation_date: Date whose rates apply, e.g. the period end date (defaults to today)
+
+    Returns:
+        list: One dict of Decimal amounts per employee, in the same order
+    """
+    # Convert to integer cents once, at the model boundary
+    gross_pay, reliefs = salary_structure_columns(
+        [employee.salary_structure for employee in employees],
+        amount_field='gross_pay' if amount_field == 'gross_salary' else amount_field,
+        include_reliefs=include_reliefs
+    )
+    results = StatutoryBatchCalculator(rate_snapshot=get_rate_snapshot(calculation_date)).calculate_cents(
+        gross_pay,
+        [employee.employment_type for employee in employees],
+        **reliefs
+    )
+    return list(StatutoryBatchCalculator.iter_rows(results))
+
+
+def _payslip_tax_band(payslip):
+    """Marginal PAYE band for a stored payslip, for display on the payslip"""
+    rate_snapshot = get_rate_snapshot(payslip.payroll_period.end_date)
+    income_after_deductions = max(payslip.gross_pay - payslip.nssf_employee - payslip.allowable_deductions, 0)
+    return PAYECalculator(rate_snapshot=rate_snapshot).get_marginal_band(income_after_deductions)
+
+
 @login_required
 def dashboard(request):
     """Dashboard view with system statistics - Login required"""
@@ -69,6 +120,239 @@ def tax_calculator(request):
     return render(request, 'payroll/tax_calculator.html', context)
 
 
+RELIEF_FIELDS = ('insurance_premiums', 'mortgage_interest', 'pension_contribution', 'post_retirement_medical')
+
+# Largest amount a batch scenario may carry, keeping every cents calculation inside int64
+BATCH_MAX_AMOUNT = Decimal('1000000000')
+
+
+def _cents_payroll_response(row, gross_salary, employment_type, shif_terms, tax_micro, reliefs=None):
+    """
+    Build the calculate_payroll_ajax response from an integer-cents result row
+
+    Args:
+        row: Result of CentsStatutoryCalculator.calculate() (or a lookup table)
+        gross_salary: Gross salary as received
+        employment_type: Employee's employment type
+        shif_terms: (contribution rate, minimum contribution) to report
+        tax_micro: Tax before relief in micro-shillings, before rounding
+        reliefs: Relief inputs in cents, keyed as RELIEF_FIELDS (optional)
+
+    Returns:
+        dict: Response in the same shape as calculate_payroll_ajax
+    """
+    reliefs = reliefs or {}
+    contract = employment_type == 'CONTRACT'
+
+    def amount(field):
+        return row[field] / 100
+
+    mortgage_interest = min(reliefs.get('mortgage_interest', 0), MORTGAGE_INTEREST_CAP)
+    pension_contribution = min(reliefs.get('pension_contribution', 0), PENSION_CONTRIBUTION_CAP)
+    post_retirement_medical = min(reliefs.get('post_retirement_medical', 0), POST_RETIREMENT_MEDICAL_CAP)
+    insurance_micro = min(
+        reliefs.get('insurance_premiums', 0) * INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP * MICRO_PER_CENT
+    )
+    personal_micro = row['personal_relief'] * MICRO_PER_CENT
+    paye_micro = max(tax_micro - personal_micro - insurance_micro, 0)
+    taxable_income = row['taxable_income']
+
+    return {
+        'gross_salary': float(gross_salary),
+        'employment_type': employment_type,
+        'nssf': {
+            'employee': amount('nssf_employee'),
+            'employer': amount('nssf_employer'),
+            'total': amount('nssf_total'),
+            'tier_1': amount('nssf_tier_1'),
+            'tier_2': amount('nssf_tier_2'),
+            'exemption_reason': 'Contract employees are exempt from NSSF contributions' if contract else '',
+            'applicable': not contract
+        },
+        'shif': {
+            'contribution': amount('shif_contribution'),
+            'rate': shif_terms[0],
+            'minimum': shif_terms[1]
+        },
+        'housing_levy': {
+            'employee': amount('housing_levy_employee'),
+            'employer': amount('housing_levy_employer'),
+            'total': amount('housing_levy_total'),
+            'exemption_reason': 'Contract employees are exempt from Housing Levy contributions' if contract else '',
+            'applicable': not contract
+        },
+        'paye': {
+            'taxable_income': taxable_income / 100,
+            'income_after_deductions': amount('income_after_deductions'),
+            'tax_before_relief': tax_micro / 1000000,
+            'tax': amount('paye_tax'),
+            'effective_rate': (paye_micro / (taxable_income * 100)) if taxable_income > 0 else 0,
+            'reliefs': {
+                'personal': personal_micro / 1000000,
+                'insurance': insurance_micro / 1000000,
+                'total': (personal_micro + insurance_micro) / 1000000
+            },
+            'deductions': {
+                'mortgage_interest': mortgage_interest / 100,
+                'pension_contribution': pension_contribution / 100,
+                'post_retirement_medical': post_retirement_medical / 100,
+                'total': (mortgage_interest + pension_contribution + post_retirement_medical) / 100
+            }
+        },
+        'totals': {
+            'statutory_deductions': amount('total_deductions'),
+            'net_pay': amount('net_pay'),
+            'take_home_percentage': row['net_pay'] / row['gross_pay'] * 100
+        }
+    }
+
+
+def _lookup_payroll_response(lookup_table, gross_salary, employment_type):
+    """Build the calculate_payroll_ajax response from a precomputed lookup table"""
+    row = lookup_table.calculate(int(gross_salary * 100), employment_type)
+    shif_terms = (
+        float(lookup_table.header['shif_contribution_rate']),
+        float(lookup_table.header['shif_minimum_contribution'])
+    )
+    return _cents_payroll_response(row, gross_salary, employment_type, shif_terms, row['tax_before_relief_micro'])
+
+
+def _read_batch_items(request):
+    """
+    Yield (index, item) pairs from a JSON array, {"items": [...]} or an NDJSON body
+
+    Lines of an NDJSON body are read lazily; a malformed line is yielded as the
+    exception so it can be reported in place.
+    """
+    if request.content_type in ('application/x-ndjson', 'application/jsonlines'):
+        index = 0
+        for line in request:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, e
+            index += 1
+        return
+
+    data = json.loads(request.body)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array of salary scenarios')
+    yield from enumerate(items)
+
+
+def _batch_amount_cents(item, field):
+    """A scenario amount in cents, rejecting NaN, infinities and amounts beyond BATCH_MAX_AMOUNT"""
+    amount = Decimal(str(item.get(field) or 0))
+    if not amount.is_finite() or abs(amount) > BATCH_MAX_AMOUNT:
+        raise ValueError(f'{field} must be a number of at most {BATCH_MAX_AMOUNT:,}')
+    return to_cents(amount)
+
+
+def _calculate_batch_chunk(batch_calculator, shif_terms, chunk):
+    """Calculate one chunk of batch scenarios, returning responses in input order"""
+    responses = {}
+    scenarios = []
+    for index, item in chunk:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise TypeError('Each scenario must be a JSON object')
+            # Everything is converted here, so a bad row becomes an error row rather than
+            # an exception after the streamed response has started
+            gross_cents = _batch_amount_cents(item, 'gross_salary')
+            if gross_cents <= 0:
+                raise ValueError('Gross salary must be greater than 0')
+            gross_salary = Decimal(str(item['gross_salary']))
+            reliefs = {field: _batch_amount_cents(item, field) for field in RELIEF_FIELDS}
+            scenarios.append((index, item, gross_salary, item.get('employment_type', 'PERMANENT'), reliefs, gross_cents))
+        except (ValueError, TypeError, ArithmeticError) as e:
+            responses[index] = {'index': index, 'error': f'Invalid input: {str(e)}'}
+
+    if scenarios:
+        results = batch_calculator.calculate_cents(
+            [scenario[5] for scenario in scenarios],
+            [scenario[3] for scenario in scenarios],
+            **{field: [scenario[4][field] for scenario in scenarios] for field in RELIEF_FIELDS}
+        )
+        cents_calculator = batch_calculator.cents_calculator
+        for position, (index, item, gross_salary, employment_type, reliefs, gross_cents) in enumerate(scenarios):
+            row = {field: int(results[field][position]) for field in StatutoryBatchCalculator.RESULT_FIELDS}
+            tax_micro = cents_calculator._tax_on_income(row['income_after_deductions'])
+            response = _cents_payroll_response(row, gross_salary, employment_type, shif_terms, tax_micro, reliefs)
+            if 'reference' in item:
+                response['reference'] = item['reference']
+            responses[index] = response
+
+    return [responses[index] for index, item in chunk]
+
+
+def _stream_payroll_batch(items, ndjson):
+    """Yield the serialized batch response chunk by chunk"""
+    rate_snapshot = get_rate_snapshot()
+    batch_calculator = StatutoryBatchCalculator(rate_snapshot=rate_snapshot)
+    shif_rate = rate_snapshot.shif_rate
+    shif_terms = (
+        float(shif_rate.contribution_rate) if shif_rate else 0.0,
+        float(shif_rate.minimum_contribution) if shif_rate else 0.0
+    )
+    chunk_size = getattr(settings, 'PAYROLL_BATCH_CHUNK_SIZE', 500)
+
+    def serialize(responses, first):
+        if ndjson:
+            return ''.join(json.dumps(response) + '\n' for response in responses)
+        separator = '' if first else ','
+        return separator + ','.join(json.dumps(response) for response in responses)
+
+    if not ndjson:
+        yield '['
+    first = True
+    chunk = []
+    for index, item in items:
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield serialize(_calculate_batch_chunk(batch_calculator, shif_terms, chunk), first)
+            first = False
+            chunk = []
+    if chunk:
+        yield serialize(_calculate_batch_chunk(batch_calculator, shif_terms, chunk), first)
+    if not ndjson:
+        yield ']'
+
+
+@csrf_exempt
+@login_required
+def calculate_payroll_batch_ajax(request):
+    """
+    Bulk payroll calculations - Login required
+
+    Accepts a JSON array (or {"items": [...]}) of calculate_payroll_ajax payloads,
+    or one payload per line with Content-Type application/x-ndjson, and streams
+    back one calculate_payroll_ajax response per scenario in the same format.
+    Invalid scenarios are reported in place as {"index": ..., "error": ...}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    ndjson = request.content_type in ('application/x-ndjson', 'application/jsonlines')
+    items = _read_batch_items(request)
+    if not ndjson:
+        try:
+            # Parse the whole JSON body up front so a malformed body is a 400
+            items = list(items)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': f'Invalid input: {str(e)}'}, status=400)
+
+    return StreamingHttpResponse(
+        _stream_payroll_batch(items, ndjson),
+        content_type='application/x-ndjson' if ndjson else 'application/json'
+    )
+
+
 @csrf_exempt
 @login_required
 def calculate_payroll_ajax(request):
@@ -90,11 +374,21 @@ def calculate_payroll_ajax(request):
         if gross_salary <= 0:
             return JsonResponse({'error': 'Gross salary must be greater than 0'}, status=400)
 
-        # Initialize calculators
-        nssf_calc = NSSFCalculator()
-        shif_calc = SHIFCalculator()
-        housing_calc = AffordableHousingLevyCalculator()
-        paye_calc = PAYECalculator()
+        rate_snapshot = get_rate_snapshot()
+
+        # Standard cases (no reliefs, whole cents) are served from the precomputed lookup table
+        source = data if request.content_type == 'application/json' else request.POST
+        has_reliefs = any(source.get(field) for field in RELIEF_FIELDS)
+        if not has_reliefs and (gross_salary * 100) == (gross_salary * 100).to_integral_value():
+            lookup_table = get_lookup_table(rate_snapshot)
+            if lookup_table is not None:
+                return JsonResponse(_lookup_payroll_response(lookup_table, gross_salary, employment_type))
+
+        # Initialize calculators from the cached rate snapshot
+        nssf_calc = NSSFCalculator(rate_snapshot=rate_snapshot)
+        shif_calc = SHIFCalculator(rate_snapshot=rate_snapshot)
+        housing_calc = AffordableHousingLevyCalculator(rate_snapshot=rate_snapshot)
+        paye_calc = PAYECalculator(rate_snapshot=rate_snapshot)
 
         # Calculate NSSF (exempt for contract employees)
         nssf_result = nssf_calc.calculate_nssf_contribution(gross_salary, employment_type)
@@ -196,6 +490,141 @@ def calculate_payroll_ajax(request):
         return JsonResponse({'error': f'Calculation error: {str(e)}'}, status=500)
 
 
+def _gross_up_response(solver, item):
+    """Solve one net-to-gross request item and shape it for JSON"""
+    net_salary = Decimal(str(item.get('net_salary', 0)))
+    if net_salary <= 0:
+        raise ValueError('Net salary must be greater than 0')
+    employment_type = item.get('employment_type', 'PERMANENT')
+
+    result = solver.solve(
+        net_salary,
+        employment_type,
+        insurance_premiums=item.get('insurance_premiums') or 0,
+        mortgage_interest=item.get('mortgage_interest') or 0,
+        pension_contribution=item.get('pension_contribution') or 0,
+        post_retirement_medical=item.get('post_retirement_medical') or 0,
+    )
+    breakdown = result['breakdown']
+    response_item = {
+        'net_salary': float(result['target_net_pay']),
+        'gross_salary': float(result['gross_salary']),
+        'achieved_net_pay': float(result['net_pay']),
+        'exact': result['exact'],
+        'employment_type': employment_type,
+        'nssf': float(breakdown['nssf_employee']),
+        'shif': float(breakdown['shif_contribution']),
+        'housing_levy': float(breakdown['housing_levy_employee']),
+        'paye': float(breakdown['paye_tax']),
+        'total_deductions': float(breakdown['total_deductions']),
+    }
+    if 'reference' in item:
+        response_item['reference'] = item['reference']
+    return response_item
+
+
+@csrf_exempt
+@login_required
+def calculate_gross_from_net_ajax(request):
+    """
+    AJAX endpoint that grosses up a net salary - Login required
+
+    Accepts the same fields as calculate_payroll_ajax with net_salary in place of
+    gross_salary, or JSON {"items": [...]} to solve a whole grade table at once.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = request.POST.dict()
+
+        solver = NetToGrossSolver(rate_snapshot=get_rate_snapshot())
+
+        if 'items' not in data:
+            return JsonResponse(_gross_up_response(solver, data))
+
+        items = data['items']
+        if not isinstance(items, list):
+            return JsonResponse({'error': 'items must be a list'}, status=400)
+        max_items = getattr(settings, 'GROSS_UP_MAX_BATCH', 1000)
+        if len(items) > max_items:
+            return JsonResponse({'error': f'At most {max_items} items per request'}, status=400)
+
+        results = []
+        for index, item in enumerate(items):
+            try:
+                results.append(_gross_up_response(solver, item))
+            except (ValueError, TypeError, ArithmeticError) as e:
+                results.append({'index': index, 'error': f'Invalid input: {str(e)}'})
+        return JsonResponse({'count': len(results), 'results': results})
+
+    except (ValueError, TypeError, KeyError, ArithmeticError) as e:
+        return JsonResponse({'error': f'Invalid input: {str(e)}'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Calculation error: {str(e)}'}, status=500)
+
+
+def _json_floats(value):
+    """Convert Decimal amounts in a nested report to floats for JsonResponse"""
+    if isinstance(value, dict):
+        return {key: _json_floats(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_floats(item) for item in value]
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+@staff_member_required
+def payroll_rate_simulation(request):
+    """
+    What-if simulation of proposed statutory rates - Staff only
+
+    POST a JSON proposal with any of tax_bands, nssf_rates, shif_rate, levy_rate and
+    personal_relief (omitted sections keep the current rates), plus an optional
+    calculation_date (YYYY-MM-DD) and employee_limit. The active workforce is
+    recalculated in memory under both rate sets; no payslips are written.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        proposal = json.loads(request.body)
+        if not isinstance(proposal, dict):
+            raise ValueError('Proposal must be a JSON object')
+
+        calculation_date = None
+        if proposal.get('calculation_date'):
+            calculation_date = datetime.strptime(proposal['calculation_date'], '%Y-%m-%d').date()
+        employee_limit = proposal.get('employee_limit')
+        if employee_limit is not None:
+            employee_limit = int(employee_limit)
+
+        baseline_snapshot = get_rate_snapshot(calculation_date)
+        proposed_snapshot = build_proposed_snapshot(
+            baseline_snapshot,
+            tax_bands=proposal.get('tax_bands'),
+            nssf_rates=proposal.get('nssf_rates'),
+            shif_rate=proposal.get('shif_rate'),
+            levy_rate=proposal.get('levy_rate'),
+            personal_relief=proposal.get('personal_relief'),
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid proposal: {str(e)}'}, status=400)
+
+    employees = Employee.objects.filter(
+        is_active=True,
+        salary_structure__is_active=True
+    ).select_related('salary_structure', 'department')
+
+    report = simulate_rate_change(employees, baseline_snapshot, proposed_snapshot, employee_limit)
+    report['calculation_date'] = baseline_snapshot.calculation_date.isoformat()
+    return JsonResponse(_json_floats(report))
+
+
 @login_required
 def employee_payroll_detail(request, employee_id):
     """View employee payroll details - Login required"""
@@ -213,11 +642,12 @@ def employee_payroll_detail(request, employee_id):
         # Calculate payroll for this employee
         gross_salary = salary_structure.gross_salary
 
-        # Initialize calculators
-        nssf_calc = NSSFCalculator()
-        shif_calc = SHIFCalculator()
-        housing_calc = AffordableHousingLevyCalculator()
-        paye_calc = PAYECalculator()
+        # Initialize calculators from the cached rate snapshot
+        rate_snapshot = get_rate_snapshot()
+        nssf_calc = NSSFCalculator(rate_snapshot=rate_snapshot)
+        shif_calc = SHIFCalculator(rate_snapshot=rate_snapshot)
+        housing_calc = AffordableHousingLevyCalculator(rate_snapshot=rate_snapshot)
+        paye_calc = PAYECalculator(rate_snapshot=rate_snapshot)
 
         # Calculate all deductions (pass employment type for contract exemptions)
         nssf_result = nssf_calc.calculate_nssf_contribution(gross_salary, employee.employment_type)
@@ -312,11 +742,12 @@ def generate_payslip(request, employee_id):
         # Calculate payroll for this employee
         gross_salary = salary_structure.gross_salary
 
-        # Initialize calculators
-        nssf_calc = NSSFCalculator()
-        shif_calc = SHIFCalculator()
-        housing_calc = AffordableHousingLevyCalculator()
-        paye_calc = PAYECalculator()
+        # Initialize calculators from the cached rate snapshot
+        rate_snapshot = get_rate_snapshot()
+        nssf_calc = NSSFCalculator(rate_snapshot=rate_snapshot)
+        shif_calc = SHIFCalculator(rate_snapshot=rate_snapshot)
+        housing_calc = AffordableHousingLevyCalculator(rate_snapshot=rate_snapshot)
+        paye_calc = PAYECalculator(rate_snapshot=rate_snapshot)
 
         # Calculate all deductions (pass employment type for contract exemptions)
         nssf_result = nssf_calc.calculate_nssf_contribution(gross_salary, employee.employment_type)
@@ -382,6 +813,7 @@ def generate_payslip(request, employee_id):
             'salary_structure': salary_structure,
             'payroll_period': payroll_period,
             'payslip': payslip,
+            'tax_band': _payslip_tax_band(payslip),
             'organization': organization,
         }
 
@@ -397,6 +829,23 @@ def generate_payslip(request, employee_id):
         })
 
 
+def _payslip_card_html(request, payslip, context):
+    """Rendered payslip card of a stored payslip, kept in the artifact cache"""
+    card_template = get_template('payroll/partials/payslip_card.html')
+    cache_path = artifact_path(
+        payslip.payroll_period, f'payslip-{payslip.pk}', 'html', sources=(card_template.origin.name,)
+    )
+    cached = open_artifact(cache_path)
+    if cached is not None:
+        with cached:
+            return mark_safe(cached.read().decode())
+
+    # The card only shows the payslip and organization, never anything about the viewer
+    card_html = card_template.render(dict(context, tax_band=_payslip_tax_band(payslip)), request)
+    store_artifact(cache_path, card_html.encode())
+    return mark_safe(card_html)
+
+
 @login_required
 def view_payslip(request, payslip_id):
     """View an existing payslip by payslip ID"""
@@ -413,6 +862,7 @@ def view_payslip(request, payslip_id):
             'payslip': payslip,
             'organization': organization,
         }
+        context['payslip_html'] = _payslip_card_html(request, payslip, context)
 
         return render(request, 'payroll/payslip.html', context)
 
@@ -454,15 +904,10 @@ def payroll_reports(request):
             'total_tax_relief': 0,
             'employees_with_relief': 0,
             'organization': organization,
+            'payroll_periods': PayrollPeriod.objects.filter(payslips__isnull=False).distinct(),
         }
         return render(request, 'payroll/reports.html', context)
 
-    # Initialize calculators
-    nssf_calc = NSSFCalculator()
-    shif_calc = SHIFCalculator()
-    housing_calc = AffordableHousingLevyCalculator()
-    paye_calc = PAYECalculator()
-
     # Calculate totals
     total_employees = employees_with_salary.count()
     total_gross_payroll = 0
@@ -486,46 +931,25 @@ def payroll_reports(request):
         'Over 200K': 0
     }
 
-    for employee in employees_with_salary:
-        salary_structure = employee.salary_structure
-        gross_salary = salary_structure.gross_salary
-
-        # Calculate deductions for this employee (pass employment type for contract exemptions)
-        nssf_result = nssf_calc.calculate_nssf_contribution(gross_salary, employee.employment_type)
-        shif_result = shif_calc.calculate_shif_contribution(gross_salary)
-        housing_result = housing_calc.calculate_housing_levy(gross_salary, employee.employment_type)
+    # Calculate deductions for all employees in one batch (contract exemptions included)
+    employees_list = list(employees_with_salary)
+    calculations = _calculate_payroll_batch(employees_list)
 
-        # Calculate PAYE
-        taxable_income = gross_salary - nssf_result['employee_contribution']
-        paye_result = paye_calc.calculate_paye(
-            taxable_income=taxable_income,
-            insurance_premiums=salary_structure.life_insurance_premium +
-                             salary_structure.health_insurance_premium +
-                             salary_structure.education_insurance_premium,
-            mortgage_interest=salary_structure.mortgage_interest,
-            pension_contribution=salary_structure.pension_contribution,
-            post_retirement_medical=salary_structure.post_retirement_medical_fund
-        )
-
-        # Calculate net pay
-        total_deductions = (
-            nssf_result['employee_contribution'] +
-            shif_result['shif_contribution'] +
-            housing_result['employee_contribution'] +
-            paye_result['paye_tax']
-        )
-        net_pay = gross_salary - total_deductions
+    for employee, calculation in zip(employees_list, calculations):
+        gross_salary = employee.salary_structure.gross_salary
+        net_pay = calculation['net_pay']
+        tax_relief = calculation['personal_relief'] + calculation['insurance_relief']
 
         # Add to totals
         total_gross_payroll += gross_salary
         total_net_payroll += net_pay
-        total_paye += paye_result['paye_tax']
-        total_nssf_employee += nssf_result['employee_contribution']
-        total_shif += shif_result['shif_contribution']
-        total_housing_levy += housing_result['employee_contribution']
-        total_tax_relief += paye_result['tax_reliefs']['total']
+        total_paye += calculation['paye_tax']
+        total_nssf_employee += calculation['nssf_employee']
+        total_shif += calculation['shif_contribution']
+        total_housing_levy += calculation['housing_levy_employee']
+        total_tax_relief += tax_relief
 
-        if paye_result['tax_reliefs']['total'] > paye_result['tax_reliefs']['personal_relief']:
+        if tax_relief > calculation['personal_relief']:
             employees_with_relief += 1
 
         # Department analysis
@@ -627,31 +1051,206 @@ def payroll_reports(request):
         'avg_other_deductions': avg_other_deductions,
         'employees': employees_with_salary,  # For JavaScript calculations
         'organization': organization,
+        # Periods with payslips; exports for a period read its stored payslips
+        'payroll_periods': PayrollPeriod.objects.filter(payslips__isnull=False).distinct(),
     }
 
     return render(request, 'payroll/reports.html', context)
 
 
+# Export row key to the Payslip lookup it is read from
+EXPORT_PAYSLIP_COLUMNS = {
+    'payroll_number': 'employee__payroll_number',
+    'first_name': 'employee__first_name',
+    'last_name': 'employee__last_name',
+    'department': 'employee__department__name',
+    'employment_type': 'employee__employment_type',
+    'national_id': 'employee__national_id',
+    'shif_number': 'employee__shif_number',
+    'basic_salary': 'basic_salary',
+    'gross_pay': 'gross_pay',
+    'paye_tax': 'paye_tax',
+    'nssf_employee': 'nssf_employee',
+    'nssf_employer': 'nssf_employer',
+    'shif_contribution': 'shif_contribution',
+    'housing_levy_employee': 'housing_levy_employee',
+    'housing_levy_employer': 'housing_levy_employer',
+    'mortgage_relief': 'mortgage_relief',
+    'pension_relief': 'pension_relief',
+    'allowable_deductions': 'allowable_deductions',
+    'net_pay': 'net_pay',
+}
+
+
+def _export_period(request):
+    """PayrollPeriod selected with ?period=<id> for an export, or None to recalculate live"""
+    period_id = request.GET.get('period')
+    if not period_id:
+        return None
+    if not period_id.isdigit():
+        raise Http404('Invalid payroll period')
+    return get_object_or_404(PayrollPeriod, pk=period_id)
+
+
+def _period_export_rows(payroll_period):
+    """
+    Export rows of a period's stored payslips, read with a single values_list query
+
+    Yields:
+        dict: One row per payslip keyed like EXPORT_PAYSLIP_COLUMNS, plus name,
+            employment type display and taxable_income
+    """
+    employment_types = dict(Employee.EMPLOYMENT_TYPE_CHOICES)
+    payslips = payroll_period.payslips.order_by('employee__payroll_number').values_list(
+        *EXPORT_PAYSLIP_COLUMNS.values()
+    )
+    for values in payslips.iterator(chunk_size=export_chunk_size()):
+        row = dict(zip(EXPORT_PAYSLIP_COLUMNS, values))
+        row['name'] = f"{row['first_name']} {row['last_name']}"
+        row['employment_type'] = employment_types.get(row['employment_type'], row['employment_type'])
+        # PAYE is charged on gross less NSSF and the capped pension, mortgage and medical fund deductions
+        row['taxable_income'] = max(row['gross_pay'] - row['nssf_employee'] - row['allowable_deductions'], 0)
+        yield row
+
+
+def _live_export_rows():
+    """
+    Export rows recalculated from current salary structures (basic salary, no reliefs)
+
+    Used when no payroll period is selected. Rows have the same keys as
+    _period_export_rows(); employees are read and calculated one chunk at a time.
+    """
+    employees = Employee.objects.filter(
+        is_active=True,
+        salary_structure__is_active=True
+    ).select_related('salary_structure', 'department').iterator(chunk_size=export_chunk_size())
+
+    chunk = []
+    for employee in employees:
+        chunk.append(employee)
+        if len(chunk) == export_chunk_size():
+            yield from _live_export_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _live_export_chunk(chunk)
+
+
+def _live_export_chunk(employees):
+    calculations = _calculate_payroll_batch(employees, amount_field='basic_salary', include_reliefs=False)
+    for employee, calculation in zip(employees, calculations):
+        basic_salary = employee.salary_structure.basic_salary
+        yield {
+            'payroll_number': employee.payroll_number or '',
+            'name': f"{employee.first_name} {employee.last_name}",
+            'department': employee.department.name if employee.department else None,
+            'employment_type': employee.get_employment_type_display(),
+            'national_id': employee.national_id,
+            'shif_number': employee.shif_number,
+            'basic_salary': basic_salary,
+            'gross_pay': basic_salary,
+            'taxable_income': calculation['income_after_deductions'],
+            'paye_tax': calculation['paye_tax'],
+            'nssf_employee': calculation['nssf_employee'],
+            'nssf_employer': calculation['nssf_employer'],
+            'shif_contribution': calculation['shif_contribution'],
+            'housing_levy_employee': calculation['housing_levy_employee'],
+            'housing_levy_employer': calculation['housing_levy_employer'],
+            'net_pay': calculation['net_pay'],
+        }
+
+
+# (row key, CSV header) of the streamed statutory returns, one row per employee
+STATUTORY_RETURN_COLUMNS = [
+    ('payroll_number', 'Employee No'),
+    ('name', 'Name'),
+    ('national_id', 'National ID'),
+    ('shif_number', 'SHIF Number'),
+    ('basic_salary', 'Basic Salary'),
+    ('nssf_employee', 'NSSF Employee'),
+    ('nssf_employer', 'NSSF Employer'),
+    ('shif_contribution', 'SHIF Contribution'),
+    ('housing_levy_employee', 'Housing Levy Employee'),
+    ('housing_levy_employer', 'Housing Levy Employer'),
+]
+
+# (row key, CSV header) of the streamed employee list, read with .values()
+EMPLOYEE_LIST_COLUMNS = [
+    ('payroll_number', 'Employee No'),
+    ('first_name', 'First Name'),
+    ('last_name', 'Last Name'),
+    ('national_id', 'National ID'),
+    ('email', 'Email'),
+    ('department__name', 'Department'),
+    ('job_title__title', 'Job Title'),
+    ('employment_type', 'Employment Type'),
+    ('date_hired', 'Date Hired'),
+    ('salary_structure__basic_salary', 'Basic Salary'),
+    ('shif_number', 'SHIF Number'),
+    ('nssf_number', 'NSSF Number'),
+    ('is_active', 'Active'),
+]
+
+# (row key, CSV header) of the streamed period payslip register
+PERIOD_REGISTER_COLUMNS = [
+    ('payroll_number', 'Payroll Number'),
+    ('employee_name', 'Employee Name'),
+    ('department', 'Department'),
+    ('job_title', 'Job Title'),
+    ('basic_salary', 'Basic Salary'),
+    ('allowances', 'Allowances'),
+    ('gross_pay', 'Gross Pay'),
+    ('paye_tax', 'PAYE'),
+    ('nssf_employee', 'NSSF Employee'),
+    ('shif_contribution', 'SHIF'),
+    ('housing_levy_employee', 'Housing Levy'),
+    ('total_deductions', 'Total Deductions'),
+    ('net_pay', 'Net Pay'),
+    ('nssf_employer', 'NSSF Employer'),
+    ('housing_levy_employer', 'Housing Levy Employer'),
+]
+
+
+def _period_register_rows(period):
+    """Payslip register rows of a period, read lazily in payroll number order"""
+    payslips = period.payslips.annotate(
+        allowances=ExpressionWrapper(
+            SUMMARY_AMOUNTS['total_allowances'], output_field=Payslip._meta.get_field('basic_salary')
+        )
+    ).order_by('employee__payroll_number').values(
+        'employee__payroll_number', 'employee__first_name', 'employee__middle_name', 'employee__last_name',
+        'employee__department__name', 'employee__job_title__title', 'allowances',
+        *(key for key, header in PERIOD_REGISTER_COLUMNS[4:] if key != 'allowances')
+    )
+    for row in payslips.iterator(chunk_size=export_chunk_size()):
+        names = (row['employee__first_name'], row['employee__middle_name'], row['employee__last_name'])
+        row['payroll_number'] = row['employee__payroll_number']
+        row['employee_name'] = ' '.join(name for name in names if name)
+        row['department'] = row['employee__department__name']
+        row['job_title'] = row['employee__job_title__title']
+        row['allowances'] = Decimal(row['allowances']).quantize(Decimal('0.01'))
+        yield row
+
+
+def _employee_list_rows():
+    """Every employee as an EMPLOYEE_LIST_COLUMNS row, read lazily"""
+    employees = Employee.objects.order_by('payroll_number').values(*(key for key, header in EMPLOYEE_LIST_COLUMNS))
+    return employees.iterator(chunk_size=export_chunk_size())
+
+
 @login_required
 def export_payroll_summary(request):
     """Export payroll summary to Excel"""
-    import io
-    import xlsxwriter
-    from django.http import HttpResponse
     from employees.models import Organization
 
     # Get organization
     organization = Organization.objects.filter(is_active=True).first()
 
-    # Get employees with salary structures
-    employees = Employee.objects.filter(
-        is_active=True,
-        salary_structure__is_active=True
-    ).select_related('salary_structure', 'department')
+    # Stored payslips of the selected period, or a live recalculation when none is selected
+    payroll_period = _export_period(request)
+    rows = _period_export_rows(payroll_period) if payroll_period else _live_export_rows()
 
-    # Create Excel file
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    # Create Excel file; rows are flushed to disk as they are written
+    output, workbook = spooled_workbook()
     worksheet = workbook.add_worksheet('Payroll Summary')
 
     # Define formats
@@ -725,7 +1324,8 @@ def export_payroll_summary(request):
             current_row += 1
 
         # Report title
-        worksheet.merge_range(current_row, 0, current_row, 9, "PAYROLL SUMMARY REPORT", title_format)
+        report_title = f"PAYROLL SUMMARY REPORT - {payroll_period.name}" if payroll_period else "PAYROLL SUMMARY REPORT"
+        worksheet.merge_range(current_row, 0, current_row, 9, report_title, title_format)
         current_row += 2
 
     # Write headers
@@ -737,47 +1337,19 @@ def export_payroll_summary(request):
     for col, header in enumerate(headers):
         worksheet.write(current_row, col, header, header_format)
 
-    # Initialize calculators
-    from statutory_deductions.utils import NSSFCalculator, SHIFCalculator, AffordableHousingLevyCalculator, PAYECalculator
-    nssf_calc = NSSFCalculator()
-    shif_calc = SHIFCalculator()
-    housing_calc = AffordableHousingLevyCalculator()
-    paye_calc = PAYECalculator()
-
     # Write data
     row = current_row + 1
-    for employee in employees:
-        basic_salary = employee.salary_structure.basic_salary
-
-        # Calculate deductions (pass employment type for contract exemptions)
-        nssf_result = nssf_calc.calculate_nssf_contribution(basic_salary, employee.employment_type)
-        shif_result = shif_calc.calculate_shif_contribution(basic_salary)
-        housing_result = housing_calc.calculate_housing_levy(basic_salary, employee.employment_type)
-
-        nssf = nssf_result['employee_contribution']
-        shif = shif_result['shif_contribution']
-        housing_levy = housing_result['employee_contribution']
-
-        # Calculate taxable income
-        taxable_income = basic_salary - nssf
-        paye_result = paye_calc.calculate_paye(taxable_income)
-        paye = paye_result['paye_tax']
-
-        # Calculate net pay
-        total_deductions = paye + nssf + shif + housing_levy
-        net_pay = basic_salary - total_deductions
-
-        # Write row data
-        worksheet.write(row, 0, employee.payroll_number or '')
-        worksheet.write(row, 1, f"{employee.first_name} {employee.last_name}")
-        worksheet.write(row, 2, employee.department.name if employee.department else 'N/A')
-        worksheet.write(row, 3, employee.get_employment_type_display())
-        worksheet.write(row, 4, basic_salary, money_format)
-        worksheet.write(row, 5, paye, money_format)
-        worksheet.write(row, 6, nssf, money_format)
-        worksheet.write(row, 7, shif, money_format)
-        worksheet.write(row, 8, housing_levy, money_format)
-        worksheet.write(row, 9, net_pay, money_format)
+    for payslip in rows:
+        worksheet.write(row, 0, payslip['payroll_number'])
+        worksheet.write(row, 1, payslip['name'])
+        worksheet.write(row, 2, payslip['department'] or 'N/A')
+        worksheet.write(row, 3, payslip['employment_type'])
+        worksheet.write(row, 4, payslip['basic_salary'], money_format)
+        worksheet.write(row, 5, payslip['paye_tax'], money_format)
+        worksheet.write(row, 6, payslip['nssf_employee'], money_format)
+        worksheet.write(row, 7, payslip['shif_contribution'], money_format)
+        worksheet.write(row, 8, payslip['housing_levy_employee'], money_format)
+        worksheet.write(row, 9, payslip['net_pay'], money_format)
 
         row += 1
 
@@ -788,19 +1360,24 @@ def export_payroll_summary(request):
     worksheet.set_column('D:D', 15)
     worksheet.set_column('E:J', 12)
 
-    workbook.close()
-    output.seek(0)
-
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-
     org_name = organization.name if organization else "Organization"
-    response['Content-Disposition'] = f'attachment; filename="{org_name}_Payroll_Summary.xlsx"'
-
-    return response
+    period_suffix = f"_{payroll_period.start_date:%Y_%m}" if payroll_period else ""
+    return workbook_response(output, workbook, f"{org_name}_Payroll_Summary{period_suffix}.xlsx")
+
+
+def _tax_report_rows(payroll_period):
+    """
+    (payroll number, name, department, basic salary, taxable income, PAYE) per employee
+
+    Read from the period's stored payslips, or recalculated on basic salary with
+    today's rates through the batch calculator when no period is selected.
+    """
+    rows = _period_export_rows(payroll_period) if payroll_period is not None else _live_export_rows()
+    for row in rows:
+        yield (
+            row['payroll_number'], row['name'], row['department'],
+            row['basic_salary'], row['taxable_income'], row['paye_tax']
+        )
 
 
 @login_required
@@ -818,11 +1395,16 @@ def export_tax_report(request):
     # Get organization
     organization = Organization.objects.filter(is_active=True).first()
 
-    # Get employees with salary structures
-    employees = Employee.objects.filter(
-        is_active=True,
-        salary_structure__is_active=True
-    ).select_related('salary_structure', 'department')
+    payroll_period = _export_period(request)
+    org_name = organization.name if organization else "Organization"
+    period_suffix = f"_{payroll_period.start_date:%Y_%m}" if payroll_period else ""
+    filename = f"{org_name}_Tax_Report{period_suffix}.pdf"
+
+    # Reports of a period are rendered from its stored payslips, so they can be kept
+    cache_path = artifact_path(payroll_period, 'tax-report', 'pdf', sources=(__file__,)) if payroll_period else None
+    cached = cached_response(cache_path, filename, 'application/pdf')
+    if cached is not None:
+        return cached
 
     # Create PDF
     buffer = io.BytesIO()
@@ -924,29 +1506,18 @@ def export_tax_report(request):
         elements.append(Spacer(1, 20))
 
     # Add title
-    title = Paragraph("PAYE Tax Report", title_style)
+    title = Paragraph(f"PAYE Tax Report - {payroll_period.name}" if payroll_period else "PAYE Tax Report", title_style)
     elements.append(title)
     elements.append(Spacer(1, 12))
 
     # Prepare table data
     data = [['Employee No', 'Name', 'Department', 'Basic Salary', 'Taxable Income', 'PAYE Tax', 'Tax Rate %']]
 
-    # Initialize calculators
-    from statutory_deductions.utils import NSSFCalculator, PAYECalculator
-    nssf_calc = NSSFCalculator()
-    paye_calc = PAYECalculator()
-
     total_basic = 0
     total_taxable = 0
     total_paye = 0
 
-    for employee in employees:
-        basic_salary = employee.salary_structure.basic_salary
-        nssf_result = nssf_calc.calculate_nssf_contribution(basic_salary, employee.employment_type)
-        nssf = nssf_result['employee_contribution']
-        taxable_income = basic_salary - nssf
-        paye_result = paye_calc.calculate_paye(taxable_income)
-        paye = paye_result['paye_tax']
+    for payroll_number, name, department, basic_salary, taxable_income, paye in _tax_report_rows(payroll_period):
         tax_rate = (paye / taxable_income * 100) if taxable_income > 0 else 0
 
         total_basic += basic_salary
@@ -954,9 +1525,9 @@ def export_tax_report(request):
         total_paye += paye
 
         data.append([
-            employee.payroll_number or '',
-            f"{employee.first_name} {employee.last_name}",
-            employee.department.name if employee.department else 'N/A',
+            payroll_number,
+            name,
+            department or 'N/A',
             f"KES {basic_salary:,.2f}",
             f"KES {taxable_income:,.2f}",
             f"KES {paye:,.2f}",
@@ -1005,9 +1576,9 @@ def export_tax_report(request):
     pdf = buffer.getvalue()
     buffer.close()
 
+    store_artifact(cache_path, pdf)
     response = HttpResponse(content_type='application/pdf')
-    org_name = organization.name if organization else "Organization"
-    response['Content-Disposition'] = f'attachment; filename="{org_name}_Tax_Report.pdf"'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     response.write(pdf)
 
     return response
@@ -1016,23 +1587,26 @@ def export_tax_report(request):
 @login_required
 def export_statutory_returns(request):
     """Export statutory returns (NSSF, SHIF, Housing Levy) to Excel"""
-    import io
-    import xlsxwriter
-    from django.http import HttpResponse
     from employees.models import Organization
 
     # Get organization
     organization = Organization.objects.filter(is_active=True).first()
 
-    # Get employees with salary structures
-    employees = Employee.objects.filter(
-        is_active=True,
-        salary_structure__is_active=True
-    ).select_related('salary_structure', 'department')
+    # Stored payslips of the selected period, or a live recalculation when none is selected
+    payroll_period = _export_period(request)
+    rows = _period_export_rows(payroll_period) if payroll_period else _live_export_rows()
+
+    # ?format=csv or ?format=ndjson streams one row per employee instead of a workbook
+    export_format = request.GET.get('format')
+    if export_format in STREAM_FORMATS:
+        org_name = organization.name if organization else "Organization"
+        period_suffix = f"_{payroll_period.start_date:%Y_%m}" if payroll_period else ""
+        return streaming_export_response(
+            STATUTORY_RETURN_COLUMNS, rows, export_format, f"{org_name}_Statutory_Returns{period_suffix}"
+        )
 
-    # Create Excel file
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    # Create Excel file; rows are flushed to disk as they are written
+    output, workbook = spooled_workbook()
 
     # Create worksheets for each statutory return
     nssf_sheet = workbook.add_worksheet('NSSF Returns')
@@ -1066,12 +1640,6 @@ def export_statutory_returns(request):
 
     money_format = workbook.add_format({'num_format': '#,##0.00'})
 
-    # Initialize calculators
-    from statutory_deductions.utils import NSSFCalculator, SHIFCalculator, AffordableHousingLevyCalculator
-    nssf_calc = NSSFCalculator()
-    shif_calc = SHIFCalculator()
-    housing_calc = AffordableHousingLevyCalculator()
-
     # Helper function to add organization header to worksheet
     def add_org_header(sheet, title, max_cols):
         current_row = 0
@@ -1117,6 +1685,8 @@ def export_statutory_returns(request):
                 current_row += 1
 
             # Report title
+            if payroll_period:
+                title = f"{title} - {payroll_period.name}"
             sheet.merge_range(current_row, 0, current_row, max_cols-1, title, title_format)
             current_row += 2
         return current_row
@@ -1147,19 +1717,13 @@ def export_statutory_returns(request):
     total_housing_employee = 0
     total_housing_employer = 0
 
-    for employee in employees:
-        basic_salary = employee.salary_structure.basic_salary
-
-        # Calculate contributions (pass employment type for contract exemptions)
-        nssf_result = nssf_calc.calculate_nssf_contribution(basic_salary, employee.employment_type)
-        shif_result = shif_calc.calculate_shif_contribution(basic_salary)
-        housing_result = housing_calc.calculate_housing_levy(basic_salary, employee.employment_type)
-
-        nssf_employee = nssf_result['employee_contribution']
-        nssf_employer = nssf_result['employer_contribution']
-        shif = shif_result['shif_contribution']
-        housing_employee = housing_result['employee_contribution']
-        housing_employer = housing_result['employer_contribution']
+    for payslip in rows:
+        basic_salary = payslip['basic_salary']
+        nssf_employee = payslip['nssf_employee']
+        nssf_employer = payslip['nssf_employer']
+        shif = payslip['shif_contribution']
+        housing_employee = payslip['housing_levy_employee']
+        housing_employer = payslip['housing_levy_employer']
 
         # Update totals
         total_nssf_employee += nssf_employee
@@ -1169,24 +1733,24 @@ def export_statutory_returns(request):
         total_housing_employer += housing_employer
 
         # NSSF Sheet
-        nssf_sheet.write(row, 0, employee.payroll_number or '')
-        nssf_sheet.write(row, 1, f"{employee.first_name} {employee.last_name}")
-        nssf_sheet.write(row, 2, employee.national_id or '')
+        nssf_sheet.write(row, 0, payslip['payroll_number'])
+        nssf_sheet.write(row, 1, payslip['name'])
+        nssf_sheet.write(row, 2, payslip['national_id'] or '')
         nssf_sheet.write(row, 3, basic_salary, money_format)
         nssf_sheet.write(row, 4, nssf_employee, money_format)
         nssf_sheet.write(row, 5, nssf_employer, money_format)
         nssf_sheet.write(row, 6, nssf_employee + nssf_employer, money_format)
 
         # SHIF Sheet
-        shif_sheet.write(row, 0, employee.payroll_number or '')
-        shif_sheet.write(row, 1, f"{employee.first_name} {employee.last_name}")
-        shif_sheet.write(row, 2, employee.shif_number or '')
+        shif_sheet.write(row, 0, payslip['payroll_number'])
+        shif_sheet.write(row, 1, payslip['name'])
+        shif_sheet.write(row, 2, payslip['shif_number'] or '')
         shif_sheet.write(row, 3, basic_salary, money_format)
         shif_sheet.write(row, 4, shif, money_format)
 
         # Housing Levy Sheet
-        housing_sheet.write(row, 0, employee.payroll_number or '')
-        housing_sheet.write(row, 1, f"{employee.first_name} {employee.last_name}")
+        housing_sheet.write(row, 0, payslip['payroll_number'])
+        housing_sheet.write(row, 1, payslip['name'])
         housing_sheet.write(row, 2, basic_salary, money_format)
         housing_sheet.write(row, 3, housing_employee, money_format)
         housing_sheet.write(row, 4, housing_employer, money_format)
@@ -1212,38 +1776,32 @@ def export_statutory_returns(request):
         sheet.set_column('B:B', 25)
         sheet.set_column('C:G', 15)
 
-    workbook.close()
-    output.seek(0)
-
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-
     org_name = organization.name if organization else "Organization"
-    response['Content-Disposition'] = f'attachment; filename="{org_name}_Statutory_Returns.xlsx"'
-
-    return response
+    period_suffix = f"_{payroll_period.start_date:%Y_%m}" if payroll_period else ""
+    return workbook_response(output, workbook, f"{org_name}_Statutory_Returns{period_suffix}.xlsx")
 
 
 @login_required
 def export_employee_list(request):
     """Export employee list to Excel"""
-    import io
-    import xlsxwriter
-    from django.http import HttpResponse
     from employees.models import Organization
 
     # Get organization
     organization = Organization.objects.filter(is_active=True).first()
 
+    # ?format=csv or ?format=ndjson streams the list instead of building a workbook
+    export_format = request.GET.get('format')
+    if export_format in STREAM_FORMATS:
+        org_name = organization.name if organization else "Organization"
+        return streaming_export_response(
+            EMPLOYEE_LIST_COLUMNS, _employee_list_rows(), export_format, f"{org_name}_Employee_List"
+        )
+
     # Get all employees
     employees = Employee.objects.all().select_related('department', 'job_title', 'salary_structure')
 
-    # Create Excel file
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    # Create Excel file; rows are flushed to disk as they are written
+    output, workbook = spooled_workbook()
     worksheet = workbook.add_worksheet('Employee List')
 
     # Define formats
@@ -1333,7 +1891,7 @@ def export_employee_list(request):
 
     # Write data
     row = current_row + 1
-    for employee in employees:
+    for employee in employees.iterator(chunk_size=export_chunk_size()):
         worksheet.write(row, 0, employee.payroll_number or '')
         worksheet.write(row, 1, employee.first_name)
         worksheet.write(row, 2, employee.last_name)
@@ -1348,8 +1906,9 @@ def export_employee_list(request):
         else:
             worksheet.write(row, 8, 'N/A')
 
-        if employee.salary_structure:
-            worksheet.write(row, 9, employee.salary_structure.basic_salary, money_format)
+        salary_structure = getattr(employee, 'salary_structure', None)
+        if salary_structure:
+            worksheet.write(row, 9, salary_structure.basic_salary, money_format)
         else:
             worksheet.write(row, 9, 'N/A')
 
@@ -1371,26 +1930,54 @@ def export_employee_list(request):
     worksheet.set_column('K:L', 15)
     worksheet.set_column('M:M', 10)
 
-    workbook.close()
-    output.seek(0)
+    org_name = organization.name if organization else "Organization"
+    return workbook_response(output, workbook, f"{org_name}_Employee_List.xlsx")
 
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
 
-    org_name = organization.name if organization else "Organization"
-    response['Content-Disposition'] = f'attachment; filename="{org_name}_Employee_List.xlsx"'
+def _payroll_month_dates(month, year):
+    """
+    Validate a month/year selection for payroll generation
 
-    return response
+    Returns:
+        tuple: (month, year, start_date, end_date, pay_date)
+
+    Raises:
+        ValueError: If the month or year is invalid or in the future
+    """
+    from datetime import date, timedelta
+    from calendar import monthrange
+
+    today = date.today()
+    selected_month = int(month)
+    selected_year = int(year)
+
+    # Validate month and year
+    if not (1 <= selected_month <= 12):
+        raise ValueError("Invalid month")
+    if not (2020 <= selected_year <= today.year):
+        raise ValueError("Invalid year")
+
+    # Check if the selected period is in the future
+    selected_date = date(selected_year, selected_month, 1)
+    current_month_start = date(today.year, today.month, 1)
+
+    if selected_date > current_month_start:
+        raise ValueError("Cannot generate payroll for future months. Please select current month or earlier.")
+
+    # Calculate period dates
+    start_date = date(selected_year, selected_month, 1)
+    last_day = monthrange(selected_year, selected_month)[1]
+    end_date = date(selected_year, selected_month, last_day)
+
+    # Calculate pay date (typically 3 days after month end)
+    pay_date = end_date + timedelta(days=3)
+    return selected_month, selected_year, start_date, end_date, pay_date
 
 
 @staff_member_required
 def payroll_generation(request):
     """Generate payroll for selected month/year - Admin only"""
     from datetime import date, datetime
-    from calendar import monthrange
 
     today = date.today()
 
@@ -1411,176 +1998,63 @@ def payroll_generation(request):
         'organization': organization,
     }
 
+    # Reopening the page for a run shows its progress again
+    run_id = request.GET.get('run')
+    if request.method == 'GET' and run_id and run_id.isdigit():
+        payroll_run = PayrollRun.objects.select_related('payroll_period').filter(pk=run_id).first()
+        if payroll_run is not None:
+            context.update({
+                'payroll_run': payroll_run,
+                'payroll_period': payroll_run.payroll_period,
+                'total_employees': payroll_run.total_employees,
+            })
+
     if request.method == 'POST':
         try:
-            selected_month = int(request.POST.get('month'))
-            selected_year = int(request.POST.get('year'))
-
-            # Validate month and year
-            if not (1 <= selected_month <= 12):
-                raise ValueError("Invalid month")
-            if not (2020 <= selected_year <= today.year):
-                raise ValueError("Invalid year")
-
-            # Check if the selected period is in the future
-            selected_date = date(selected_year, selected_month, 1)
-            current_month_start = date(today.year, today.month, 1)
-
-            if selected_date > current_month_start:
-                raise ValueError("Cannot generate payroll for future months. Please select current month or earlier.")
-
-            # Calculate period dates
-            start_date = date(selected_year, selected_month, 1)
-            last_day = monthrange(selected_year, selected_month)[1]
-            end_date = date(selected_year, selected_month, last_day)
-
-            # Calculate pay date (typically 3 days after month end)
-            from datetime import timedelta
-            pay_date = end_date + timedelta(days=3)
+            selected_month, selected_year, start_date, end_date, pay_date = _payroll_month_dates(
+                request.POST.get('month'), request.POST.get('year')
+            )
 
-            # Create or get payroll period
+            # Create or get payroll period; the lookup covers the unique key, so a concurrent
+            # request creating the same period makes get_or_create fetch that one instead
             period_name = f"{start_date.strftime('%B %Y')} Payroll"
             payroll_period, created = PayrollPeriod.objects.get_or_create(
                 start_date=start_date,
                 end_date=end_date,
+                period_type='MONTHLY',
                 defaults={
                     'name': period_name,
-                    'period_type': 'MONTHLY',
                     'pay_date': pay_date,
                     'status': 'DRAFT',
                     'created_by': request.user  # Use current admin user
                 }
             )
 
-            # Get all active employees with salary structures
-            employees = Employee.objects.filter(
-                is_active=True,
-                salary_structure__is_active=True
-            ).select_related('salary_structure', 'department', 'job_title')
+            # Everyone the run will generate payslips for, including people who left after the period
+            roster = period_roster(start_date, end_date)
 
-            if not employees.exists():
+            if not roster:
                 context['error'] = 'No active employees with salary structures found.'
                 return render(request, 'payroll/payroll_generation.html', context)
 
-            # Initialize calculators
-            nssf_calc = NSSFCalculator()
-            shif_calc = SHIFCalculator()
-            housing_calc = AffordableHousingLevyCalculator()
-            paye_calc = PAYECalculator()
-
-            payslips_created = 0
-            payslips_updated = 0
-
-            # Generate payslips for each employee
-            for employee in employees:
-                salary_structure = employee.salary_structure
-                gross_salary = salary_structure.gross_salary
-
-                # Calculate all deductions (pass employment type for contract exemptions)
-                nssf_result = nssf_calc.calculate_nssf_contribution(gross_salary, employee.employment_type)
-                shif_result = shif_calc.calculate_shif_contribution(gross_salary)
-                housing_result = housing_calc.calculate_housing_levy(gross_salary, employee.employment_type)
-
-                # Validate statutory deductions compliance
-                validation_result = validate_statutory_deductions_compliance(
-                    employee=employee,
-                    nssf_contribution=nssf_result['employee_contribution'],
-                    housing_levy_contribution=housing_result['employee_contribution']
-                )
-
-                # Log any compliance issues
-                if not validation_result['is_compliant']:
-                    for error in validation_result['errors']:
-                        messages.error(request, f"Compliance Error: {error}")
-
-                if validation_result['warnings']:
-                    for warning in validation_result['warnings']:
-                        messages.warning(request, f"Compliance Notice: {warning}")
-
-                # Calculate PAYE with employee's specific deductions
-                taxable_income = gross_salary - nssf_result['employee_contribution']
-                paye_result = paye_calc.calculate_paye(
-                    taxable_income=taxable_income,
-                    insurance_premiums=salary_structure.life_insurance_premium +
-                                     salary_structure.health_insurance_premium +
-                                     salary_structure.education_insurance_premium,
-                    mortgage_interest=salary_structure.mortgage_interest,
-                    pension_contribution=salary_structure.pension_contribution,
-                    post_retirement_medical=salary_structure.post_retirement_medical_fund
-                )
-
-                # Calculate totals
-                total_deductions = (
-                    nssf_result['employee_contribution'] +
-                    shif_result['shif_contribution'] +
-                    housing_result['employee_contribution'] +
-                    paye_result['paye_tax']
-                )
-
-                net_pay = gross_salary - total_deductions
-
-                # Create or update payslip
-                payslip, created = Payslip.objects.update_or_create(
-                    payroll_period=payroll_period,
-                    employee=employee,
-                    defaults={
-                        'basic_salary': salary_structure.basic_salary,
-                        'house_allowance': salary_structure.house_allowance,
-                        'transport_allowance': salary_structure.transport_allowance,
-                        'medical_allowance': salary_structure.medical_allowance,
-                        'lunch_allowance': salary_structure.lunch_allowance,
-                        'communication_allowance': salary_structure.communication_allowance,
-                        'other_allowances': salary_structure.other_allowances,
-                        'car_benefit': salary_structure.car_benefit_value,
-                        'housing_benefit': salary_structure.housing_benefit_value,
-                        'gross_pay': gross_salary,
-                        'paye_tax': paye_result['paye_tax'],
-                        'nssf_employee': nssf_result['employee_contribution'],
-                        'nssf_employer': nssf_result['employer_contribution'],
-                        'shif_contribution': shif_result['shif_contribution'],
-                        'housing_levy_employee': housing_result['employee_contribution'],
-                        'housing_levy_employer': housing_result['employer_contribution'],
-                        'total_deductions': total_deductions,
-                        'net_pay': net_pay,
-                        'personal_relief': paye_result['tax_reliefs']['personal_relief'],
-                        'insurance_relief': paye_result['tax_reliefs']['insurance_relief'],
-                    }
-                )
-
-                if created:
-                    payslips_created += 1
-                else:
-                    payslips_updated += 1
-
-            # Update payroll period status
-            if payroll_period.status == 'DRAFT':
-                payroll_period.status = 'PROCESSED'
-                payroll_period.save()
-
-            # Create or update payroll summary
-            total_gross = sum(p.gross_pay for p in payroll_period.payslips.all())
-            total_net = sum(p.net_pay for p in payroll_period.payslips.all())
-
-            summary, created = PayrollSummary.objects.update_or_create(
-                payroll_period=payroll_period,
-                defaults={
-                    'total_employees': employees.count(),
-                    'total_gross_pay': total_gross,
-                    'total_net_pay': total_net,
-                    'total_deductions': total_gross - total_net,
-                }
+            # Calculate and persist in the background; the page polls the run's progress.
+            # A period already being generated shows that run instead of starting another.
+            payroll_run, run_created = enqueue_payroll_run(
+                payroll_period, requested_by=request.user,
+                dry_run_token=request.POST.get('dry_run_token', '')[:32]
             )
 
             context.update({
-                'success': True,
+                'payroll_run': payroll_run,
+                'run_in_progress': not run_created,
                 'payroll_period': payroll_period,
-                'payslips_created': payslips_created,
-                'payslips_updated': payslips_updated,
-                'total_employees': employees.count(),
+                'total_employees': len(roster),
                 'selected_month': selected_month,
                 'selected_year': selected_year,
             })
 
+        except PayrollPeriodLocked as e:
+            context['error'] = str(e)
         except ValueError as e:
             context['error'] = f'Invalid input: {str(e)}'
         except Exception as e:
@@ -1589,6 +2063,74 @@ def payroll_generation(request):
     return render(request, 'payroll/payroll_generation.html', context)
 
 
+@staff_member_required
+def payroll_dry_run(request):
+    """
+    Preview what generating payroll for a month would change - Admin only
+
+    Streams one JSON object per line: a header with the dry-run token, one line per
+    new, changed or removed payslip with old/new values and the net pay delta, and a
+    closing summary. Nothing is written; posting the token with the generation form
+    reuses the calculated payslips.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        selected_month, selected_year, start_date, end_date, pay_date = _payroll_month_dates(
+            request.POST.get('month'), request.POST.get('year')
+        )
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid input: {str(e)}'}, status=400)
+
+    from .dry_run import iter_payroll_diff
+    lines = (json.dumps(line) + '\n' for line in iter_payroll_diff(start_date, end_date))
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+@staff_member_required
+def payroll_run_progress(request, run_id):
+    """Progress of a background payroll run, polled by the generation page - Admin only"""
+    payroll_run = get_object_or_404(PayrollRun.objects.select_related('payroll_period'), id=run_id)
+    return JsonResponse(payroll_run_status(payroll_run))
+
+
+@staff_member_required
+def payroll_run_findings(request, run_id):
+    """Compliance findings of a payroll run, grouped by rule and paginated - Admin only"""
+    from django.core.paginator import Paginator
+    from django.db.models import Count
+
+    payroll_run = get_object_or_404(PayrollRun.objects.select_related('payroll_period'), id=run_id)
+    rule_counts = payroll_run.findings.values('rule', 'severity').annotate(count=Count('id')).order_by('severity', 'rule')
+
+    findings = payroll_run.findings.select_related('employee').order_by('severity', 'rule', 'id')
+    rule = request.GET.get('rule', '')
+    severity = request.GET.get('severity', '')
+    if rule:
+        findings = findings.filter(rule=rule)
+    if severity:
+        findings = findings.filter(severity=severity)
+
+    paginator = Paginator(findings, 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Get organization data
+    from employees.models import Organization
+    organization = Organization.objects.filter(is_active=True).first()
+
+    context = {
+        'payroll_run': payroll_run,
+        'payroll_period': payroll_run.payroll_period,
+        'rule_counts': rule_counts,
+        'page_obj': page_obj,
+        'selected_rule': rule,
+        'selected_severity': severity,
+        'organization': organization,
+    }
+    return render(request, 'payroll/payroll_run_findings.html', context)
+
+
 @staff_member_required
 def payroll_periods(request):
     """List all payroll periods - Admin only"""
@@ -1646,10 +2188,16 @@ def payroll_period_detail(request, period_id):
 
 @staff_member_required
 def download_period_payslips(request, period_id):
-    """Download all payslips for a period as PDF or Excel"""
+    """Download all payslips for a period as PDF or Excel, or stream the register as CSV or NDJSON"""
     period = get_object_or_404(PayrollPeriod, id=period_id)
     download_format = request.GET.get('format', 'pdf')
 
+    if download_format in STREAM_FORMATS:
+        content_type, extension = STREAM_FORMATS[download_format]
+        cache_path = artifact_path(period, 'register', extension, sources=(__file__,))
+        return cached_response(cache_path, f'Payroll_{period.name}.{extension}', content_type) or streaming_export_response(
+            PERIOD_REGISTER_COLUMNS, _period_register_rows(period), download_format, f'Payroll_{period.name}', cache_path
+        )
     if download_format == 'excel':
         return download_period_excel(request, period)
     else:
@@ -1657,18 +2205,27 @@ def download_period_payslips(request, period_id):
 
 
 def download_period_excel(request, period):
-    """Generate Excel file with all payroll data for the period - TEMPORARILY DISABLED"""
-    # Temporarily disabled - requires xlsxwriter dependency
-    from django.http import HttpResponse
-    response = HttpResponse("Excel export temporarily disabled during deployment. Please use individual payslip downloads.", content_type='text/plain')
-    return response
+    """Generate Excel file with all payroll data for the period (needs xlsxwriter)"""
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        # Deployments without xlsxwriter keep the plain-text notice
+        from django.http import HttpResponse
+        response = HttpResponse("Excel export temporarily disabled during deployment. Please use individual payslip downloads.", content_type='text/plain')
+        return response
+    return download_period_excel_original(request, period)
 
 def download_period_excel_original(request, period):
-    """Original function - temporarily disabled"""
-    # Create a workbook and add a worksheet
-    output = io.BytesIO()
-    # workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet(f'Payroll_{period.name}')
+    """Excel payroll register of a period, written in constant memory"""
+    filename = f'Payroll_{period.name}_{timezone.now().strftime("%Y%m%d")}.xlsx'
+    cache_path = artifact_path(period, 'register', 'xlsx', sources=(__file__,))
+    cached = cached_response(cache_path, filename, XLSX_CONTENT_TYPE)
+    if cached is not None:
+        return cached
+
+    # Create a workbook and add a worksheet; rows are flushed to disk as they are written
+    output, workbook = spooled_workbook()
+    worksheet = workbook.add_worksheet(f'Payroll_{period.name}'[:31])
 
     # Set page orientation to landscape
     worksheet.set_landscape()
@@ -1787,9 +2344,17 @@ def download_period_excel_original(request, period):
     # Get payslips data
     payslips = period.payslips.select_related('employee', 'employee__department', 'employee__job_title').order_by('employee__payroll_number')
 
+    # Totals are accumulated while writing, so the payslips are read only once
+    total_fields = [
+        'basic_salary', 'total_allowances', 'gross_pay', 'paye_tax', 'nssf_employee',
+        'shif_contribution', 'housing_levy_employee', 'total_deductions', 'net_pay',
+        'nssf_employer', 'housing_levy_employer'
+    ]
+    totals = [0.0] * len(total_fields)
+
     # Write data
     row = current_row + 1
-    for payslip in payslips:
+    for payslip in payslips.iterator(chunk_size=export_chunk_size()):
         worksheet.write(row, 0, payslip.employee.full_name, text_format)
         worksheet.write(row, 1, payslip.employee.payroll_number, center_format)
         worksheet.write(row, 2, payslip.employee.department.name if payslip.employee.department else 'N/A', text_format)
@@ -1805,6 +2370,8 @@ def download_period_excel_original(request, period):
         worksheet.write(row, 12, float(payslip.net_pay), currency_format)
         worksheet.write(row, 13, float(payslip.nssf_employer), currency_format)
         worksheet.write(row, 14, float(payslip.housing_levy_employer), currency_format)
+        for index, field in enumerate(total_fields):
+            totals[index] += float(getattr(payslip, field))
         row += 1
 
     # Add totals row
@@ -1812,24 +2379,7 @@ def download_period_excel_original(request, period):
     worksheet.write(total_row, 0, 'TOTALS', header_format)
     worksheet.merge_range(total_row, 1, total_row, 3, '', header_format)
 
-    # Calculate totals
-    total_basic = sum(float(p.basic_salary) for p in payslips)
-    total_allowances = sum(float(p.total_allowances) for p in payslips)
-    total_gross = sum(float(p.gross_pay) for p in payslips)
-    total_paye = sum(float(p.paye_tax) for p in payslips)
-    total_nssf_emp = sum(float(p.nssf_employee) for p in payslips)
-    total_shif = sum(float(p.shif_contribution) for p in payslips)
-    total_housing_emp = sum(float(p.housing_levy_employee) for p in payslips)
-    total_deductions = sum(float(p.total_deductions) for p in payslips)
-    total_net = sum(float(p.net_pay) for p in payslips)
-    total_nssf_employer = sum(float(p.nssf_employer) for p in payslips)
-    total_housing_employer = sum(float(p.housing_levy_employer) for p in payslips)
-
     # Write totals
-    totals = [total_basic, total_allowances, total_gross, total_paye, total_nssf_emp,
-              total_shif, total_housing_emp, total_deductions, total_net,
-              total_nssf_employer, total_housing_employer]
-
     for col, total in enumerate(totals, start=4):
         worksheet.write(total_row, col, total, currency_format)
 
@@ -1845,36 +2395,81 @@ def download_period_excel_original(request, period):
     worksheet.set_header('&C&"Arial,Bold"&14' + f'Payroll Report - {period.name}')
     worksheet.set_footer('&L&D &T&R&P of &N')  # Date, time on left; page numbers on right
 
-    workbook.close()
-    output.seek(0)
-
-    # Create response
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="Payroll_{period.name}_{timezone.now().strftime("%Y%m%d")}.xlsx"'
-
-    return response
+    return workbook_response(output, workbook, filename, cache_path)
 
 
 def download_period_pdf(request, period):
-    """Generate PDF file with all payslips for the period - TEMPORARILY DISABLED"""
-    # Temporarily disabled - requires reportlab dependency
-    from django.http import HttpResponse
-    response = HttpResponse("PDF export temporarily disabled during deployment. Please use individual payslip downloads.", content_type='text/plain')
-    return response
+    """Generate all payslips for the period as one PDF or a ZIP of PDFs (needs reportlab)"""
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        # Deployments without reportlab keep the plain-text notice
+        from django.http import HttpResponse
+        response = HttpResponse("PDF export temporarily disabled during deployment. Please use individual payslip downloads.", content_type='text/plain')
+        return response
+    return download_period_pdf_original(request, period)
 
 def download_period_pdf_original(request, period):
-    """Original function - temporarily disabled"""
-    # Create a file-like buffer to receive PDF data
-    buffer = io.BytesIO()
+    """
+    Payslips of a period as one merged PDF, or with ?format=zip one PDF per payslip
+
+    The ZIP is streamed while payslips render in a process pool; ?progress=<token>
+    publishes rendering progress for payslip_download_progress. A large merged PDF
+    requested with a progress token renders in the background and answers 204;
+    the page downloads it once the progress reports it ready.
+    """
+    from . import payslip_pdf
+
+    total = period.payslips.count()
+    progress = payslip_pdf.progress_reporter(request.GET.get('progress', ''), total)
+    filename = f'Payslips_{period.name}_{timezone.now().strftime("%Y%m%d")}'.replace(' ', '_')
+    extension, content_type = ('zip', 'application/zip') if request.GET.get('format') == 'zip' else ('pdf', 'application/pdf')
+
+    cache_path = artifact_path(period, 'payslips', extension, sources=(payslip_pdf.__file__,))
+    cached = cached_response(cache_path, f'{filename}.{extension}', content_type)
+    if cached is not None:
+        if progress is not None:
+            progress(total)
+        return cached
+
+    documents = payslip_pdf.payslip_documents(period, chunk_size=export_chunk_size())
+    if extension == 'zip':
+        rendered = payslip_pdf.render_payslip_pdfs(
+            documents,
+            workers=payslip_pdf.pdf_workers(total, settings),
+            start_method=getattr(settings, 'PAYROLL_SHARD_START_METHOD', 'spawn'),
+        )
+        chunks = caching_stream(cache_path, payslip_pdf.stream_payslip_zip(rendered, progress))
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+        return response
+
+    # A large merged PDF is laid out in the background; the page polls its progress
+    # and downloads it from the cache once stored
+    progress_token = request.GET.get('progress', '')
+    if progress is not None and cache_path is not None and total >= getattr(settings, 'PAYROLL_PDF_MIN_PAYSLIPS', 200):
+        payslip_pdf.render_merged_pdf_in_background(
+            period.pk, cache_path, progress_token, total, chunk_size=export_chunk_size()
+        )
+        return HttpResponse(status=204)
+
+    # A merged PDF is one reportlab document, so it is laid out in this process
+    output = spooled_output()
+    payslip_pdf.write_merged_pdf(documents, output, progress)
+    output.seek(0)
+    store_artifact(cache_path, output)
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.pdf', content_type=content_type)
 
-    # Create the PDF object, using the buffer as its "file" with landscape orientation
-    # doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=36, leftMargin=36, topMargin=72, bottomMargin=18)
 
-    # Temporarily disabled - requires reportlab
-    return HttpResponse("PDF export temporarily disabled during deployment.", content_type='text/plain')
+@staff_member_required
+def payslip_download_progress(request, token):
+    """Rendering progress of a bulk payslip download, polled by the period page"""
+    from .payslip_pdf import render_progress, valid_progress_token
+
+    progress = render_progress(token) if valid_progress_token(token) else None
+    if progress is None:
+        return JsonResponse({'error': 'Unknown download'}, status=404)
+    return JsonResponse(progress)
 
 
 @staff_member_required
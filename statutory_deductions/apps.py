@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class StatutoryDeductionsConfig(AppConfig):
     name = 'statutory_deductions'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - registers rate snapshot invalidation
+        from .lookup import load_active_table
+        load_active_table()
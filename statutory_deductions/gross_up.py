@@ -0,0 +1,236 @@
+"""
+Net-to-gross (grossing-up) solver
+
+Before rounding, net pay is a continuous, increasing, piecewise-linear function
+of gross pay: every kink comes from an NSSF tier limit, the SHIF minimum, a PAYE
+band limit or the point where PAYE exceeds the reliefs. NetToGrossSolver lists
+those kinks in gross-pay terms, finds the segment containing the target net pay
+and solves the linear equation on it exactly (with Fractions). The answer is
+then settled to the cent against CentsStatutoryCalculator, so the returned gross
+produces the requested net pay under the same rounding as the payroll run.
+"""
+from fractions import Fraction
+from math import ceil
+
+from .money import MICRO_PER_CENT, to_cents, cents_to_decimal
+from .utils import (
+    CentsStatutoryCalculator, MORTGAGE_INTEREST_CAP, PENSION_CONTRIBUTION_CAP,
+    POST_RETIREMENT_MEDICAL_CAP, INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP,
+)
+
+
+# Rounding moves net pay by at most a few cents, so the exact answer lies within
+# this many cents of the unrounded solution
+SETTLE_WINDOW_CENTS = 12
+
+
+def _invert_increasing(function, breakpoints, target):
+    """
+    Solve function(x) == target for a continuous, increasing, piecewise-linear function
+
+    Args:
+        function: Callable returning a Fraction; linear between consecutive breakpoints
+            and beyond the last one
+        breakpoints: Every x at which the function may change slope
+        target: Value to solve for
+
+    Returns:
+        Fraction: x with function(x) == target, clamped to the first breakpoint,
+            or None if the function never reaches the target
+    """
+    points = sorted(set(breakpoints))
+    previous_x = points[0]
+    previous_y = function(previous_x)
+    if target <= previous_y:
+        return Fraction(previous_x)
+
+    for x in points[1:]:
+        y = function(x)
+        if y >= target:
+            return previous_x + Fraction(target - previous_y) * (x - previous_x) / (y - previous_y)
+        previous_x, previous_y = x, y
+
+    # Past the last kink the function is a single line
+    x = previous_x + 1000000
+    y = function(x)
+    if y <= previous_y:
+        return None
+    return previous_x + Fraction(target - previous_y) * (x - previous_x) / (y - previous_y)
+
+
+class NetToGrossSolver:
+    """
+    Find the gross pay that yields a given net pay after statutory deductions
+
+    Segments are built once per (employment type, reliefs) combination, so a
+    whole grade table with shared reliefs costs one segment build plus a
+    constant amount of work per grade.
+    """
+
+    def __init__(self, calculation_date=None, rate_snapshot=None):
+        """
+        Initialize solver with effective date
+
+        Args:
+            calculation_date: Date for which to calculate deductions (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
+        """
+        self.calculator = CentsStatutoryCalculator(calculation_date, rate_snapshot, use_memo=False)
+        self.calculation_date = self.calculator.calculation_date
+        self.rates = self.calculator.rates
+        self._breakpoints = {}
+
+    def solve(self, net_pay, employment_type=None, insurance_premiums=0, mortgage_interest=0,
+              pension_contribution=0, post_retirement_medical=0):
+        """
+        Gross up a net pay amount
+
+        Args:
+            net_pay: Desired monthly net pay (Decimal, int, float or str)
+            employment_type: Employee's employment type (optional)
+            insurance_premiums: Monthly insurance premiums
+            mortgage_interest: Monthly mortgage interest
+            pension_contribution: Monthly pension contribution
+            post_retirement_medical: Post-retirement medical fund contribution
+
+        Returns:
+            dict: gross_salary, net_pay, exact flag and the statutory breakdown as Decimals
+        """
+        result = self.solve_cents(
+            to_cents(net_pay), employment_type,
+            insurance_premiums=to_cents(insurance_premiums),
+            mortgage_interest=to_cents(mortgage_interest),
+            pension_contribution=to_cents(pension_contribution),
+            post_retirement_medical=to_cents(post_retirement_medical),
+        )
+        return {
+            'gross_salary': cents_to_decimal(result['gross_pay']),
+            'target_net_pay': cents_to_decimal(result['target_net_pay']),
+            'net_pay': cents_to_decimal(result['net_pay']),
+            'exact': result['exact'],
+            'employment_type': employment_type,
+            'breakdown': CentsStatutoryCalculator.to_decimal(result['breakdown']),
+        }
+
+    def solve_cents(self, net_pay, employment_type=None, insurance_premiums=0, mortgage_interest=0,
+                    pension_contribution=0, post_retirement_medical=0):
+        """
+        Gross up a net pay amount given in integer cents
+
+        Returns the smallest gross pay whose rounded net pay equals the target. When
+        rounding skips the target cent, the smallest gross paying at least the target
+        is returned and exact is False.
+
+        Returns:
+            dict: gross_pay, target_net_pay, net_pay (cents), exact and the int breakdown
+        """
+        reliefs = {
+            'insurance_premiums': insurance_premiums,
+            'mortgage_interest': mortgage_interest,
+            'pension_contribution': pension_contribution,
+            'post_retirement_medical': post_retirement_medical,
+        }
+        deductions = (
+            min(mortgage_interest, MORTGAGE_INTEREST_CAP) +
+            min(pension_contribution, PENSION_CONTRIBUTION_CAP) +
+            min(post_retirement_medical, POST_RETIREMENT_MEDICAL_CAP)
+        )
+        relief_micro = (
+            self.rates.personal_relief_cents * MICRO_PER_CENT +
+            min(insurance_premiums * INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP * MICRO_PER_CENT)
+        )
+
+        def net_micro(gross):
+            return self._unrounded_net_micro(gross, employment_type, deductions, relief_micro)
+
+        key = (employment_type == 'CONTRACT', deductions, relief_micro)
+        if key not in self._breakpoints:
+            self._breakpoints[key] = self._net_breakpoints(employment_type, deductions, relief_micro)
+
+        estimate = _invert_increasing(net_micro, self._breakpoints[key], net_pay * MICRO_PER_CENT)
+        if estimate is None:
+            raise ValueError('Net pay cannot be reached with the current rates')
+
+        return self._settle(max(ceil(estimate), 1), net_pay, employment_type, reliefs)
+
+    def _settle(self, estimate, net_pay, employment_type, reliefs):
+        """Pick the exact cent near the unrounded solution using the integer engine"""
+        best = None
+        first_gross = max(estimate - SETTLE_WINDOW_CENTS, 1)
+        for gross in range(first_gross, estimate + SETTLE_WINDOW_CENTS + 1):
+            breakdown = self.calculator.calculate(gross, employment_type, **reliefs)
+            if breakdown['net_pay'] == net_pay:
+                best = (gross, breakdown)
+                break
+            if best is None and breakdown['net_pay'] > net_pay:
+                best = (gross, breakdown)
+
+        if best is None:
+            gross = estimate + SETTLE_WINDOW_CENTS
+            best = (gross, self.calculator.calculate(gross, employment_type, **reliefs))
+
+        gross, breakdown = best
+        return {
+            'gross_pay': gross,
+            'target_net_pay': net_pay,
+            'net_pay': breakdown['net_pay'],
+            'exact': breakdown['net_pay'] == net_pay,
+            'breakdown': breakdown,
+        }
+
+    def _unrounded_net_micro(self, gross, employment_type, deductions, relief_micro):
+        """Net pay in micro-shillings with no intermediate rounding"""
+        tier_1_micro, tier_2_micro, _, levy_employee_micro, _ = self.calculator._compute_contributions(
+            gross, employment_type
+        )
+        nssf_micro = tier_1_micro + tier_2_micro
+
+        shif_micro = 0
+        if self.rates.shif_terms and gross > 0:
+            shif_rate, shif_minimum = self.rates.shif_terms
+            shif_micro = max(gross * shif_rate, shif_minimum * MICRO_PER_CENT)
+
+        income = max(Fraction(gross) - Fraction(nssf_micro, MICRO_PER_CENT) - deductions, 0)
+        paye_micro = max(self.calculator._tax_on_income(income) - relief_micro, 0)
+
+        return gross * MICRO_PER_CENT - nssf_micro - shif_micro - levy_employee_micro - paye_micro
+
+    def _net_breakpoints(self, employment_type, deductions, relief_micro):
+        """Every gross pay (cents) at which unrounded net pay can change slope"""
+        contract = employment_type == 'CONTRACT'
+
+        nssf_points = []
+        if not contract:
+            for tier, lower, upper, rate in self.rates.nssf_tiers:
+                nssf_points.extend([lower - 100, lower, upper])
+        nssf_points = [point for point in nssf_points if point > 1]
+
+        def income_before_deductions(gross):
+            tier_1_micro, tier_2_micro = self.calculator._compute_contributions(gross, employment_type)[:2]
+            return Fraction(gross) - Fraction(tier_1_micro + tier_2_micro, MICRO_PER_CENT)
+
+        def gross_for_income(income):
+            return _invert_increasing(income_before_deductions, [1] + nssf_points, income + deductions)
+
+        # Income levels at which PAYE changes slope
+        income_points = [0]
+        if self.rates.paye_schedule is not None:
+            lower_limits, upper_limits = self.rates.paye_schedule[:2]
+        else:
+            lower_limits = [lower for lower, upper, rate in self.rates.paye_bands]
+            upper_limits = [upper for lower, upper, rate in self.rates.paye_bands]
+        income_points += [limit for limit in lower_limits + upper_limits if limit is not None and limit > 0]
+        relief_income = _invert_increasing(self.calculator._tax_on_income, income_points, relief_micro)
+        if relief_income is not None:
+            income_points.append(relief_income)
+
+        points = [1] + nssf_points
+        if self.rates.shif_terms:
+            shif_rate, shif_minimum = self.rates.shif_terms
+            if shif_rate:
+                points.append(Fraction(shif_minimum * MICRO_PER_CENT, shif_rate))
+        for income in income_points:
+            gross = gross_for_income(income)
+            if gross is not None:
+                points.append(gross)
+        return sorted(point for point in points if point >= 1)
@@ -0,0 +1,373 @@
+"""
+Precomputed statutory lookup tables per rate epoch
+
+For a fixed set of rates the unrounded NSSF, SHIF and Housing Levy amounts are
+piecewise-linear in gross pay with integer slopes (basis points per cent), and
+PAYE is piecewise-linear in income. The build_statutory_tables command stores
+each segment's start, value and slope as int64 arrays in a small binary
+artifact named after the rate snapshot id. The artifact is memory-mapped, and a
+standard calculation (no insurance, mortgage, pension or medical fund reliefs)
+becomes two binary searches and a few integer multiplications, with no database
+or Decimal work. Results match CentsStatutoryCalculator to the cent.
+
+Artifact layout: 8-byte magic, 4-byte little-endian header length, a JSON
+header, padding to an 8-byte boundary, then the int64 arrays listed in the
+header, in order.
+
+A table replaced by another epoch's table is not closed on the spot: requests
+that fetched it may still be reading its arrays. Each table unmaps itself when
+the last reference to it goes away, and tables that were never handed out are
+closed straight away.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import weakref
+from bisect import bisect_left, bisect_right
+from fractions import Fraction
+from math import ceil, floor
+
+from django.conf import settings
+from django.utils import timezone
+
+from .money import MICRO_PER_CENT, micro_to_cents
+from .utils import CentsStatutoryCalculator
+
+
+MAGIC = b'KESTBL01'
+FORMAT_VERSION = 1
+ACTIVE_POINTER = 'ACTIVE'
+UNBOUNDED = -1
+COMPONENTS = ('nssf_tier_1', 'nssf_tier_2', 'shif', 'levy_employee', 'levy_employer')
+EMPLOYMENT_CLASSES = ('standard', 'contract')
+
+# Length of the open-ended last segment used to measure its slope
+_TAIL_CENTS = 10 ** 8
+
+
+def lookup_table_dir():
+    """Directory holding the lookup table artifacts"""
+    return getattr(
+        settings, 'STATUTORY_LOOKUP_DIR',
+        os.path.join(settings.BASE_DIR, 'var', 'statutory_tables')
+    )
+
+
+def _unrounded_components(calculator, gross, employment_type):
+    """NSSF tiers, SHIF and levy in micro-shillings, before rounding"""
+    tier_1, tier_2, _, levy_employee, levy_employer = calculator._compute_contributions(gross, employment_type)
+    shif = 0
+    if calculator.rates.shif_terms and gross > 0:
+        shif_rate, shif_minimum = calculator.rates.shif_terms
+        shif = max(gross * shif_rate, shif_minimum * MICRO_PER_CENT)
+    return (tier_1, tier_2, shif, levy_employee, levy_employer)
+
+
+def _gross_breakpoints(rates, contract):
+    """Integer gross pay (cents) at which any contribution can change slope"""
+    points = {1}
+    if not contract:
+        for tier, lower, upper, rate in rates.nssf_tiers:
+            points.update([lower - 100, lower, upper])
+    if rates.shif_terms and rates.shif_terms[0]:
+        shif_rate, shif_minimum = rates.shif_terms
+        crossover = Fraction(shif_minimum * MICRO_PER_CENT, shif_rate)
+        points.update([floor(crossover), ceil(crossover)])
+    return sorted(point for point in points if point >= 1)
+
+
+def build_lookup_table(rate_snapshot):
+    """
+    Compile the segment arrays for a rate snapshot
+
+    Args:
+        rate_snapshot: RateSnapshot for the epoch to precompute
+
+    Returns:
+        tuple: (header dict, dict of array name to list of ints)
+
+    Raises:
+        ValueError: If the PAYE bands cannot be compiled into a schedule
+    """
+    calculator = CentsStatutoryCalculator(rate_snapshot=rate_snapshot, use_memo=False)
+    rates = calculator.rates
+    if rates.paye_schedule is None:
+        raise ValueError('PAYE bands overlap or are invalid; lookup table not built')
+
+    arrays = {}
+    for employment_class in EMPLOYMENT_CLASSES:
+        employment_type = 'CONTRACT' if employment_class == 'contract' else None
+        points = _gross_breakpoints(rates, employment_class == 'contract')
+        ends = points[1:] + [points[-1] + _TAIL_CENTS]
+        values = {component: [] for component in COMPONENTS}
+        slopes = {component: [] for component in COMPONENTS}
+        for start, end in zip(points, ends):
+            start_values = _unrounded_components(calculator, start, employment_type)
+            end_values = _unrounded_components(calculator, end, employment_type)
+            for component, start_value, end_value in zip(COMPONENTS, start_values, end_values):
+                slope, remainder = divmod(end_value - start_value, end - start)
+                if remainder:
+                    raise ValueError(f'{component} is not linear between {start} and {end} cents')
+                values[component].append(start_value)
+                slopes[component].append(slope)
+        arrays[f'{employment_class}_points'] = points
+        for component in COMPONENTS:
+            arrays[f'{employment_class}_{component}_value'] = values[component]
+            arrays[f'{employment_class}_{component}_slope'] = slopes[component]
+
+    lower_limits, upper_limits, tax_rates, cumulative_tax = rates.paye_schedule
+    arrays['paye_lower'] = list(lower_limits)
+    arrays['paye_upper'] = [UNBOUNDED if limit is None else limit for limit in upper_limits]
+    arrays['paye_rate'] = list(tax_rates)
+    arrays['paye_cumulative'] = list(cumulative_tax)
+
+    shif_rate = rate_snapshot.shif_rate
+    header = {
+        'format_version': FORMAT_VERSION,
+        'snapshot_id': rate_snapshot.snapshot_id,
+        'calculation_date': rate_snapshot.calculation_date.isoformat(),
+        'built_at': timezone.now().isoformat(),
+        'personal_relief_cents': rates.personal_relief_cents,
+        'shif_contribution_rate': str(shif_rate.contribution_rate) if shif_rate else '0',
+        'shif_minimum_contribution': str(shif_rate.minimum_contribution) if shif_rate else '0',
+    }
+    return header, arrays
+
+
+def write_lookup_table(header, arrays, directory=None, activate=True):
+    """
+    Write a lookup table artifact atomically
+
+    Args:
+        header: Header dict from build_lookup_table()
+        arrays: Arrays dict from build_lookup_table()
+        directory: Output directory (defaults to lookup_table_dir())
+        activate: Point the ACTIVE file at this artifact so it is mapped at startup
+
+    Returns:
+        str: Path of the written artifact
+    """
+    directory = directory or lookup_table_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    header = dict(header, arrays=[[name, len(values)] for name, values in arrays.items()])
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    prefix_length = len(MAGIC) + 4 + len(header_bytes)
+    padding = b'\0' * (-prefix_length % 8)
+
+    filename = f"{header['snapshot_id']}.tbl"
+    path = os.path.join(directory, filename)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as artifact:
+        artifact.write(MAGIC)
+        artifact.write(struct.pack('<I', len(header_bytes)))
+        artifact.write(header_bytes)
+        artifact.write(padding)
+        for values in arrays.values():
+            artifact.write(struct.pack(f'<{len(values)}q', *values))
+    os.replace(temp_path, path)
+
+    if activate:
+        pointer_path = os.path.join(directory, ACTIVE_POINTER)
+        with open(f'{pointer_path}.tmp', 'w') as pointer:
+            pointer.write(filename)
+        os.replace(f'{pointer_path}.tmp', pointer_path)
+    return path
+
+
+class StatutoryLookupTable:
+    """Memory-mapped lookup table serving standard calculations by interpolation"""
+
+    def __init__(self, path):
+        """
+        Map an artifact written by write_lookup_table()
+
+        Args:
+            path: Path of the .tbl artifact
+
+        Raises:
+            ValueError: If the file is not a compatible lookup table
+        """
+        if sys.byteorder != 'little':
+            raise ValueError('Lookup tables are stored little-endian')
+
+        self.path = path
+        with open(path, 'rb') as artifact:
+            self._mmap = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+        self.arrays = {}
+        # Unmaps the artifact on close() or once the table is no longer referenced
+        self._finalizer = weakref.finalize(self, _release_mapping, self._mmap, self.arrays)
+
+        try:
+            if self._mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path} is not a statutory lookup table')
+            header_length = struct.unpack_from('<I', self._mmap, len(MAGIC))[0]
+            header_start = len(MAGIC) + 4
+            self.header = json.loads(self._mmap[header_start:header_start + header_length].decode('utf-8'))
+            if self.header.get('format_version') != FORMAT_VERSION:
+                raise ValueError(f'{path} has an unsupported format version')
+
+            offset = header_start + header_length
+            offset += -offset % 8
+            view = memoryview(self._mmap)
+            for name, length in self.header['arrays']:
+                self.arrays[name] = view[offset:offset + 8 * length].cast('q')
+                offset += 8 * length
+        except Exception:
+            self.close()
+            raise
+
+        self.snapshot_id = self.header['snapshot_id']
+        self.personal_relief_cents = self.header['personal_relief_cents']
+
+    def calculate(self, gross_pay, employment_type=None):
+        """
+        Statutory deductions for a standard case (no reliefs other than personal relief)
+
+        Args:
+            gross_pay: Monthly gross pay in cents
+            employment_type: Employee's employment type (optional)
+
+        Returns:
+            dict: Integer cents per name in CentsStatutoryCalculator.RESULT_FIELDS, plus
+                unrounded tax_before_relief_micro and paye_micro
+        """
+        arrays = self.arrays
+        employment_class = 'contract' if employment_type == 'CONTRACT' else 'standard'
+
+        components = dict.fromkeys(COMPONENTS, 0)
+        if gross_pay > 0:
+            points = arrays[f'{employment_class}_points']
+            index = max(bisect_right(points, gross_pay) - 1, 0)
+            distance = gross_pay - points[index]
+            for component in COMPONENTS:
+                components[component] = (
+                    arrays[f'{employment_class}_{component}_value'][index] +
+                    distance * arrays[f'{employment_class}_{component}_slope'][index]
+                )
+
+        nssf_micro = components['nssf_tier_1'] + components['nssf_tier_2']
+        nssf_employee = micro_to_cents(nssf_micro)
+        shif = micro_to_cents(components['shif'])
+        levy_employee = micro_to_cents(components['levy_employee'])
+
+        taxable_income = gross_pay - nssf_employee
+        income = max(taxable_income, 0)
+        tax_micro = 0
+        index = bisect_left(arrays['paye_lower'], income) - 1
+        if index >= 0:
+            upper = arrays['paye_upper'][index]
+            top = income if upper == UNBOUNDED else min(income, upper)
+            tax_micro = arrays['paye_cumulative'][index] + (top - arrays['paye_lower'][index]) * arrays['paye_rate'][index]
+        paye_micro = max(tax_micro - self.personal_relief_cents * MICRO_PER_CENT, 0)
+        paye = micro_to_cents(paye_micro)
+
+        total_deductions = nssf_employee + shif + levy_employee + paye
+        return {
+            'gross_pay': gross_pay,
+            'nssf_tier_1': micro_to_cents(components['nssf_tier_1']),
+            'nssf_tier_2': micro_to_cents(components['nssf_tier_2']),
+            'nssf_employee': nssf_employee,
+            'nssf_employer': nssf_employee,
+            'nssf_total': micro_to_cents(nssf_micro * 2),
+            'shif_contribution': shif,
+            'housing_levy_employee': levy_employee,
+            'housing_levy_employer': micro_to_cents(components['levy_employer']),
+            'housing_levy_total': micro_to_cents(components['levy_employee'] + components['levy_employer']),
+            'taxable_income': taxable_income,
+            'allowable_deductions': 0,
+            'income_after_deductions': income,
+            'tax_before_relief': micro_to_cents(tax_micro),
+            'personal_relief': self.personal_relief_cents,
+            'insurance_relief': 0,
+            'paye_tax': paye,
+            'total_deductions': total_deductions,
+            'net_pay': gross_pay - total_deductions,
+            'tax_before_relief_micro': tax_micro,
+            'paye_micro': paye_micro,
+        }
+
+    def close(self):
+        """Unmap the artifact; only call once no reader can still be using the table"""
+        self._finalizer()
+        self.arrays = {}
+
+
+def _release_mapping(mapping, arrays):
+    for array in arrays.values():
+        array.release()
+    arrays.clear()
+    mapping.close()
+
+
+_active = {'table': None, 'checked': None}
+_active_lock = threading.Lock()
+
+
+def _open_table(path):
+    try:
+        return StatutoryLookupTable(path)
+    except (OSError, ValueError):
+        return None
+
+
+def load_active_table():
+    """Map the artifact named by the ACTIVE pointer (called at startup)"""
+    if not getattr(settings, 'STATUTORY_LOOKUP_TABLES', True):
+        return None
+    try:
+        with open(os.path.join(lookup_table_dir(), ACTIVE_POINTER)) as pointer:
+            filename = pointer.read().strip()
+    except OSError:
+        return None
+
+    table = _open_table(os.path.join(lookup_table_dir(), filename))
+    with _active_lock:
+        _active['table'] = table
+    return table
+
+
+def get_lookup_table(rate_snapshot):
+    """
+    Get the mapped lookup table for a rate snapshot
+
+    Args:
+        rate_snapshot: RateSnapshot in force for the calculation
+
+    Returns:
+        StatutoryLookupTable: Table built for exactly these rates, or None
+    """
+    if not getattr(settings, 'STATUTORY_LOOKUP_TABLES', True):
+        return None
+
+    snapshot_id = rate_snapshot.snapshot_id
+    table = _active['table']
+    if table is not None and table.snapshot_id == snapshot_id:
+        return table
+
+    # Look for an artifact for this epoch once per snapshot id, not on every request
+    with _active_lock:
+        if _active['checked'] == snapshot_id:
+            return None
+        _active['checked'] = snapshot_id
+
+    table = _open_table(os.path.join(lookup_table_dir(), f'{snapshot_id}.tbl'))
+    if table is None:
+        return None
+    if table.snapshot_id != snapshot_id:
+        table.close()
+        return None
+    # The replaced table unmaps itself once the requests still reading it drop it
+    with _active_lock:
+        _active['table'] = table
+    return table
+
+
+def reset_lookup_tables():
+    """Forget the mapped table so the next request looks on disk again"""
+    with _active_lock:
+        _active['table'] = None
+        _active['checked'] = None
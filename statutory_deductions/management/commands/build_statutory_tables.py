@@ -0,0 +1,60 @@
+"""
+Management command to precompute statutory lookup tables for the active rate epoch
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from statutory_deductions.lookup import (
+    build_lookup_table, write_lookup_table, lookup_table_dir, reset_lookup_tables
+)
+from statutory_deductions.rates import load_rate_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Precompute NSSF/SHIF/Housing Levy/PAYE breakpoints into a memory-mapped lookup table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Calculation date (YYYY-MM-DD) whose rates to precompute (defaults to today)'
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Directory for the artifact (defaults to STATUTORY_LOOKUP_DIR)'
+        )
+        parser.add_argument(
+            '--no-activate',
+            action='store_true',
+            help='Write the artifact without making it the one mapped at startup'
+        )
+
+    def handle(self, *args, **options):
+        calculation_date = None
+        if options['date']:
+            try:
+                calculation_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        self.stdout.write('🔧 Building statutory lookup table...')
+        snapshot = load_rate_snapshot(calculation_date)
+        if not snapshot.tax_bands:
+            raise CommandError('No active PAYE tax bands found. Run setup_tax_data first.')
+
+        try:
+            header, arrays = build_lookup_table(snapshot)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        path = write_lookup_table(
+            header, arrays,
+            directory=options['output_dir'] or lookup_table_dir(),
+            activate=not options['no_activate']
+        )
+        reset_lookup_tables()
+
+        segments = len(arrays['standard_points'])
+        self.stdout.write(f'   - Rate epoch: {snapshot.snapshot_id} ({snapshot.calculation_date})')
+        self.stdout.write(f'   - Gross segments: {segments}, PAYE bands: {len(arrays["paye_lower"])}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Lookup table written to {path}'))
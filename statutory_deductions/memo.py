@@ -0,0 +1,89 @@
+"""
+Memoized NSSF, SHIF and Housing Levy contributions
+
+Staff on the same grade share a gross salary, so a payroll run computes the
+same contributions many times over. ContributionMemo is a bounded LRU keyed by
+(rate snapshot id, gross pay in cents, employment type) with hit/miss counters.
+The key carries the snapshot id, so a rate change can never return a stale
+result; the memo is still cleared by the rate table signals to free memory.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ContributionMemo:
+    """Thread-safe bounded LRU of contribution results with hit/miss counters"""
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, 'STATUTORY_MEMO_SIZE', 4096)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the memoized value for key, computing and storing it on a miss
+
+        Args:
+            key: Hashable key, normally (snapshot_id, gross_cents, employment_type)
+            compute: Zero-argument callable returning an immutable value
+
+        Returns:
+            The memoized value
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+contribution_memo = ContributionMemo()
+
+
+def contribution_memo_stats():
+    """Hit/miss counters of the process-wide contribution memo"""
+    return contribution_memo.stats()
+
+
+def clear_contribution_memo():
+    """Drop all memoized contributions (called when any rate table changes)"""
+    contribution_memo.clear()
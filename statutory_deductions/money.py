@@ -0,0 +1,116 @@
+"""
+Fixed-point money helpers for the payroll hot path
+
+Amounts are held as integer cents and percentage rates as integer basis points
+(1% = 100 bp). Multiplying cents by basis points gives micro-shillings
+(1/10,000 of a cent) exactly, so a whole calculation can run on ints and be
+rounded to cents with ROUND_HALF_UP at the same points as the Decimal
+calculators. Conversion to and from Decimal happens only at the model boundary.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+
+CENTS_PER_SHILLING = 100
+BASIS_POINTS_PER_PERCENT = 100
+MICRO_PER_CENT = 10000
+
+
+def to_cents(value):
+    """Convert a shilling amount (Decimal, int, float or str) to integer cents"""
+    if value is None or value == '':
+        return 0
+    amount = Decimal(str(value)) * CENTS_PER_SHILLING
+    return int(amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def to_basis_points(rate):
+    """Convert a percentage rate (e.g. Decimal('2.75')) to integer basis points"""
+    if rate is None or rate == '':
+        return 0
+    points = Decimal(str(rate)) * BASIS_POINTS_PER_PERCENT
+    return int(points.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def cents_to_decimal(cents):
+    """Convert integer cents back to a two-decimal-place Decimal"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def round_half_up(numerator, denominator):
+    """
+    Divide two ints and round the quotient ROUND_HALF_UP (ties away from zero)
+
+    Matches Decimal.quantize(..., rounding=ROUND_HALF_UP) exactly.
+    """
+    if numerator >= 0:
+        return (2 * numerator + denominator) // (2 * denominator)
+    return -((-2 * numerator + denominator) // (2 * denominator))
+
+
+def micro_to_cents(micro):
+    """Round a micro-shilling amount to cents (ROUND_HALF_UP)"""
+    return round_half_up(micro, MICRO_PER_CENT)
+
+
+SALARY_STRUCTURE_AMOUNT_FIELDS = (
+    'basic_salary', 'house_allowance', 'transport_allowance', 'medical_allowance',
+    'lunch_allowance', 'communication_allowance', 'other_allowances',
+    'car_benefit_value', 'housing_benefit_value',
+    'life_insurance_premium', 'health_insurance_premium', 'education_insurance_premium',
+    'mortgage_interest', 'post_retirement_medical_fund', 'pension_contribution',
+)
+
+
+def salary_structure_cents(salary_structure):
+    """
+    Convert a SalaryStructure to the integer-cents inputs of the statutory engine
+
+    Args:
+        salary_structure: SalaryStructure instance
+
+    Returns:
+        dict: Field amounts in cents, plus gross_pay and insurance_premiums totals
+    """
+    amounts = {
+        field: to_cents(getattr(salary_structure, field) or 0)
+        for field in SALARY_STRUCTURE_AMOUNT_FIELDS
+    }
+    amounts['gross_pay'] = (
+        amounts['basic_salary'] + amounts['house_allowance'] + amounts['transport_allowance'] +
+        amounts['medical_allowance'] + amounts['lunch_allowance'] + amounts['communication_allowance'] +
+        amounts['other_allowances'] + amounts['car_benefit_value'] + amounts['housing_benefit_value']
+    )
+    amounts['insurance_premiums'] = (
+        amounts['life_insurance_premium'] + amounts['health_insurance_premium'] +
+        amounts['education_insurance_premium']
+    )
+    return amounts
+
+
+def salary_structure_columns(salary_structures, amount_field='gross_pay', include_reliefs=True):
+    """
+    Build the cents columns StatutoryBatchCalculator.calculate_cents() expects
+
+    Args:
+        salary_structures: SalaryStructure instances
+        amount_field: 'gross_pay' or a SalaryStructure amount field used as gross pay
+        include_reliefs: Include insurance, mortgage, pension and medical fund columns
+
+    Returns:
+        tuple: (gross pay column, dict of relief columns)
+    """
+    amounts = [salary_structure_cents(salary_structure) for salary_structure in salary_structures]
+    reliefs = {}
+    if include_reliefs:
+        reliefs = {
+            'insurance_premiums': [a['insurance_premiums'] for a in amounts],
+            'mortgage_interest': [a['mortgage_interest'] for a in amounts],
+            'pension_contribution': [a['pension_contribution'] for a in amounts],
+            'post_retirement_medical': [a['post_retirement_medical_fund'] for a in amounts],
+        }
+    return [a[amount_field] for a in amounts], reliefs
+
+
+def decimal_amounts(cents_amounts):
+    """Convert a dict of integer cents to Decimal values for model fields"""
+    return {field: cents_to_decimal(cents) for field, cents in cents_amounts.items()}
@@ -0,0 +1,415 @@
+"""
+Immutable snapshots of the statutory rate tables
+
+Building the PAYE, NSSF, SHIF and Housing Levy calculators queries five rate
+tables. A RateSnapshot captures everything the calculators need for one
+calculation date as frozen values. RateTimeline reads all rate rows once and
+resolves the snapshot for any date with a binary search over the rate epochs,
+so repeated and retroactive calculations do not touch the database.
+
+The timeline is dropped by post_save/post_delete signals on the rate models
+(see signals.py). It also expires after RATE_SNAPSHOT_TTL seconds so that other
+worker processes pick up rate changes made elsewhere.
+"""
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import PAYETaxBand, TaxRelief, NSSFRate, SHIFRate, AffordableHousingLevyRate
+
+
+DEFAULT_PERSONAL_RELIEF = Decimal('2400')  # KES 2,400 per month
+
+
+@dataclass(frozen=True)
+class TaxBandRate:
+    """Frozen copy of a PAYETaxBand row"""
+    lower_limit: Decimal
+    upper_limit: Decimal
+    tax_rate: Decimal
+
+    def __str__(self):
+        if self.upper_limit:
+            return f"KES {self.lower_limit:,.0f} - {self.upper_limit:,.0f} @ {self.tax_rate}%"
+        return f"KES {self.lower_limit:,.0f} and above @ {self.tax_rate}%"
+
+
+@dataclass(frozen=True)
+class NSSFTierRate:
+    """Frozen copy of an NSSFRate row"""
+    tier: int
+    lower_limit: Decimal
+    upper_limit: Decimal
+    contribution_rate: Decimal
+
+    def __str__(self):
+        return f"NSSF Tier {self.tier}: KES {self.lower_limit:,.0f} - {self.upper_limit:,.0f} @ {self.contribution_rate}%"
+
+
+@dataclass(frozen=True)
+class SHIFContributionRate:
+    """Frozen copy of a SHIFRate row"""
+    contribution_rate: Decimal
+    minimum_contribution: Decimal
+
+
+@dataclass(frozen=True)
+class HousingLevyRate:
+    """Frozen copy of an AffordableHousingLevyRate row"""
+    employee_rate: Decimal
+    employer_rate: Decimal
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    """
+    All statutory rates in force on a calculation date
+
+    Attribute names match the ones the calculators load from the database, so a
+    snapshot can be passed to PAYECalculator, NSSFCalculator, SHIFCalculator and
+    AffordableHousingLevyCalculator in place of their queries. Snapshots are
+    immutable and picklable.
+    """
+    calculation_date: date
+    tax_bands: tuple
+    personal_relief: Decimal
+    nssf_rates: tuple
+    shif_rate: SHIFContributionRate = None
+    levy_rate: HousingLevyRate = None
+
+    @property
+    def snapshot_id(self):
+        """Content hash identifying the rate set (shared by dates with identical rates)"""
+        content = repr((self.tax_bands, self.personal_relief, self.nssf_rates, self.shif_rate, self.levy_rate))
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def load_rate_snapshot(calculation_date=None):
+    """
+    Build a RateSnapshot from the database
+
+    Args:
+        calculation_date: Date for which to resolve rates (defaults to today)
+
+    Returns:
+        RateSnapshot: Rates in force on the calculation date
+    """
+    calculation_date = calculation_date or date.today()
+
+    tax_bands = tuple(
+        TaxBandRate(band.lower_limit, band.upper_limit, band.tax_rate)
+        for band in PAYETaxBand.objects.filter(
+            effective_date__lte=calculation_date,
+            is_active=True
+        ).order_by('lower_limit')
+    )
+
+    relief = TaxRelief.objects.filter(
+        relief_type='PERSONAL',
+        effective_date__lte=calculation_date,
+        is_active=True
+    ).order_by('-effective_date').first()
+    personal_relief = relief.amount if relief and relief.amount is not None else DEFAULT_PERSONAL_RELIEF
+
+    nssf_rates = tuple(
+        NSSFTierRate(rate.tier, rate.lower_limit, rate.upper_limit, rate.contribution_rate)
+        for rate in NSSFRate.objects.filter(
+            effective_date__lte=calculation_date,
+            is_active=True
+        ).order_by('tier', 'lower_limit')
+    )
+
+    shif = SHIFRate.objects.filter(
+        effective_date__lte=calculation_date,
+        is_active=True
+    ).order_by('-effective_date').first()
+
+    levy = AffordableHousingLevyRate.objects.filter(
+        effective_date__lte=calculation_date,
+        is_active=True
+    ).order_by('-effective_date').first()
+
+    return RateSnapshot(
+        calculation_date=calculation_date,
+        tax_bands=tax_bands,
+        personal_relief=personal_relief,
+        nssf_rates=nssf_rates,
+        shif_rate=SHIFContributionRate(shif.contribution_rate, shif.minimum_contribution) if shif else None,
+        levy_rate=HousingLevyRate(levy.employee_rate, levy.employer_rate) if levy else None,
+    )
+
+
+def _decimal(value, name):
+    try:
+        return Decimal(str(value))
+    except (ArithmeticError, ValueError, TypeError):
+        raise ValueError(f'{name} must be a number')
+
+
+def build_proposed_snapshot(base_snapshot, tax_bands=None, nssf_rates=None, shif_rate=None,
+                            levy_rate=None, personal_relief=None):
+    """
+    Build a hypothetical RateSnapshot, e.g. from a proposed Finance Act
+
+    Sections that are not given keep the base snapshot's rates. Nothing is
+    written to the rate tables.
+
+    Args:
+        base_snapshot: RateSnapshot to start from (normally the current rates)
+        tax_bands: List of dicts with lower_limit, upper_limit (None for the top band) and tax_rate
+        nssf_rates: List of dicts with tier, lower_limit, upper_limit and contribution_rate
+        shif_rate: Dict with contribution_rate and minimum_contribution
+        levy_rate: Dict with employee_rate and employer_rate
+        personal_relief: Monthly personal relief amount
+
+    Returns:
+        RateSnapshot: The proposed rates
+
+    Raises:
+        ValueError: If a proposed value is missing or not a number
+    """
+    changes = {}
+    try:
+        if tax_bands is not None:
+            changes['tax_bands'] = tuple(sorted(
+                (
+                    TaxBandRate(
+                        _decimal(band['lower_limit'], 'lower_limit'),
+                        _decimal(band['upper_limit'], 'upper_limit') if band.get('upper_limit') not in (None, '') else None,
+                        _decimal(band['tax_rate'], 'tax_rate'),
+                    )
+                    for band in tax_bands
+                ),
+                key=lambda band: band.lower_limit
+            ))
+        if nssf_rates is not None:
+            changes['nssf_rates'] = tuple(sorted(
+                (
+                    NSSFTierRate(
+                        int(rate['tier']),
+                        _decimal(rate['lower_limit'], 'lower_limit'),
+                        _decimal(rate['upper_limit'], 'upper_limit'),
+                        _decimal(rate['contribution_rate'], 'contribution_rate'),
+                    )
+                    for rate in nssf_rates
+                ),
+                key=lambda rate: (rate.tier, rate.lower_limit)
+            ))
+        if shif_rate is not None:
+            changes['shif_rate'] = SHIFContributionRate(
+                _decimal(shif_rate['contribution_rate'], 'contribution_rate'),
+                _decimal(shif_rate.get('minimum_contribution', 0), 'minimum_contribution'),
+            )
+        if levy_rate is not None:
+            changes['levy_rate'] = HousingLevyRate(
+                _decimal(levy_rate['employee_rate'], 'employee_rate'),
+                _decimal(levy_rate['employer_rate'], 'employer_rate'),
+            )
+        if personal_relief is not None:
+            changes['personal_relief'] = _decimal(personal_relief, 'personal_relief')
+    except KeyError as e:
+        raise ValueError(f'Missing proposed rate field: {e.args[0]}')
+    except (TypeError, AttributeError):
+        raise ValueError('Proposed rates must be objects (or lists of objects)')
+
+    return replace(base_snapshot, **changes)
+
+
+class RateTimeline:
+    """
+    Interval index over every active rate row
+
+    All five rate tables are read once. Their distinct effective dates split
+    time into epochs within which the rates in force do not change, so the rate
+    set for any date is found with one binary search over the epoch start
+    dates. Snapshots are built lazily per epoch and shared by every date in it,
+    which lets one run span several rate epochs without re-querying.
+    """
+
+    def __init__(self, tax_bands, reliefs, nssf_rates, shif_rates, levy_rates):
+        """
+        Args:
+            tax_bands: Active PAYETaxBand rows
+            reliefs: Active personal TaxRelief rows
+            nssf_rates: Active NSSFRate rows
+            shif_rates: Active SHIFRate rows
+            levy_rates: Active AffordableHousingLevyRate rows
+        """
+        self._tax_bands = sorted(tax_bands, key=lambda band: (band.effective_date, band.pk))
+        self._reliefs = sorted(reliefs, key=lambda relief: (relief.effective_date, relief.pk))
+        self._nssf_rates = sorted(nssf_rates, key=lambda rate: (rate.effective_date, rate.pk))
+        self._shif_rates = sorted(shif_rates, key=lambda rate: (rate.effective_date, rate.pk))
+        self._levy_rates = sorted(levy_rates, key=lambda rate: (rate.effective_date, rate.pk))
+
+        rows = self._tax_bands + self._reliefs + self._nssf_rates + self._shif_rates + self._levy_rates
+        self.epoch_starts = sorted({row.effective_date for row in rows})
+        self._epoch_snapshots = {}
+        self._date_snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        """Read every active rate row (five queries)"""
+        return cls(
+            PAYETaxBand.objects.filter(is_active=True),
+            TaxRelief.objects.filter(relief_type='PERSONAL', is_active=True),
+            NSSFRate.objects.filter(is_active=True),
+            SHIFRate.objects.filter(is_active=True),
+            AffordableHousingLevyRate.objects.filter(is_active=True),
+        )
+
+    def epoch_index(self, calculation_date):
+        """Index of the epoch containing a date, or -1 before the first effective date"""
+        return bisect_right(self.epoch_starts, calculation_date) - 1
+
+    def epoch_bounds(self, calculation_date):
+        """
+        (start, end) of the epoch containing a date
+
+        Either bound is None when the epoch is open-ended; end is exclusive.
+        """
+        index = self.epoch_index(calculation_date)
+        start = self.epoch_starts[index] if index >= 0 else None
+        end = self.epoch_starts[index + 1] if index + 1 < len(self.epoch_starts) else None
+        return start, end
+
+    def snapshot_for(self, calculation_date):
+        """
+        RateSnapshot in force on a date
+
+        Args:
+            calculation_date: Date for which to resolve rates
+
+        Returns:
+            RateSnapshot: Same rates load_rate_snapshot() would return for the date
+        """
+        with self._lock:
+            snapshot = self._date_snapshots.get(calculation_date)
+            if snapshot is not None:
+                self._date_snapshots.move_to_end(calculation_date)
+                return snapshot
+
+        index = self.epoch_index(calculation_date)
+        with self._lock:
+            epoch_snapshot = self._epoch_snapshots.get(index)
+        if epoch_snapshot is None:
+            epoch_snapshot = self._build_epoch_snapshot(index)
+
+        snapshot = replace(epoch_snapshot, calculation_date=calculation_date)
+        with self._lock:
+            self._epoch_snapshots.setdefault(index, epoch_snapshot)
+            self._date_snapshots[calculation_date] = snapshot
+            while len(self._date_snapshots) > 256:
+                self._date_snapshots.popitem(last=False)
+        return snapshot
+
+    def snapshots_for(self, dates):
+        """
+        Resolve many dates at once, e.g. every period of a multi-month run
+
+        Returns:
+            dict: date to RateSnapshot; dates in the same epoch share rates and snapshot_id
+        """
+        return {calculation_date: self.snapshot_for(calculation_date) for calculation_date in set(dates)}
+
+    def _build_epoch_snapshot(self, index):
+        cutoff = self.epoch_starts[index] if index >= 0 else None
+
+        def in_force(rows):
+            if cutoff is None:
+                return []
+            return rows[:bisect_right([row.effective_date for row in rows], cutoff)]
+
+        tax_bands = tuple(
+            TaxBandRate(band.lower_limit, band.upper_limit, band.tax_rate)
+            for band in sorted(in_force(self._tax_bands), key=lambda band: band.lower_limit)
+        )
+        reliefs = in_force(self._reliefs)
+        relief = reliefs[-1] if reliefs else None
+        personal_relief = relief.amount if relief and relief.amount is not None else DEFAULT_PERSONAL_RELIEF
+        nssf_rates = tuple(
+            NSSFTierRate(rate.tier, rate.lower_limit, rate.upper_limit, rate.contribution_rate)
+            for rate in sorted(in_force(self._nssf_rates), key=lambda rate: (rate.tier, rate.lower_limit))
+        )
+        shif_rates = in_force(self._shif_rates)
+        shif = shif_rates[-1] if shif_rates else None
+        levy_rates = in_force(self._levy_rates)
+        levy = levy_rates[-1] if levy_rates else None
+
+        return RateSnapshot(
+            calculation_date=cutoff,
+            tax_bands=tax_bands,
+            personal_relief=personal_relief,
+            nssf_rates=nssf_rates,
+            shif_rate=SHIFContributionRate(shif.contribution_rate, shif.minimum_contribution) if shif else None,
+            levy_rate=HousingLevyRate(levy.employee_rate, levy.employer_rate) if levy else None,
+        )
+
+
+class RateTimelineCache:
+    """Process-wide RateTimeline, reloaded after RATE_SNAPSHOT_TTL seconds or on invalidation"""
+
+    def __init__(self):
+        self._timeline = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RATE_SNAPSHOT_TTL', 300)
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._timeline is not None and now - self._loaded_at < self.ttl:
+                return self._timeline
+
+        timeline = RateTimeline.load()
+
+        with self._lock:
+            self._timeline = timeline
+            self._loaded_at = now
+        return timeline
+
+    def clear(self):
+        with self._lock:
+            self._timeline = None
+            self._loaded_at = None
+
+
+_timeline_cache = RateTimelineCache()
+
+
+def get_rate_timeline():
+    """
+    Get the cached RateTimeline
+
+    Returns:
+        RateTimeline: Interval index over all active rate rows
+    """
+    return _timeline_cache.get()
+
+
+def get_rate_snapshot(calculation_date=None):
+    """
+    Get the cached RateSnapshot for a calculation date
+
+    Args:
+        calculation_date: Date for which to resolve rates (defaults to today)
+
+    Returns:
+        RateSnapshot: Rates in force on the calculation date
+    """
+    return get_rate_timeline().snapshot_for(calculation_date or date.today())
+
+
+def invalidate_rate_snapshots():
+    """Drop the cached timeline and snapshots (called when any rate table changes)"""
+    _timeline_cache.clear()
@@ -0,0 +1,25 @@
+"""
+Signal handlers for statutory rate tables
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import PAYETaxBand, TaxRelief, NSSFRate, SHIFRate, AffordableHousingLevyRate
+from .lookup import reset_lookup_tables
+from .memo import clear_contribution_memo
+from .rates import invalidate_rate_snapshots
+
+
+RATE_MODELS = (PAYETaxBand, TaxRelief, NSSFRate, SHIFRate, AffordableHousingLevyRate)
+
+
+def rate_table_changed(sender, **kwargs):
+    """Invalidate cached snapshots, contributions and lookup tables whenever a rate row is saved or deleted"""
+    invalidate_rate_snapshots()
+    clear_contribution_memo()
+    reset_lookup_tables()
+
+
+for rate_model in RATE_MODELS:
+    receiver(post_save, sender=rate_model, dispatch_uid=f'rate_snapshot_save_{rate_model.__name__}')(rate_table_changed)
+    receiver(post_delete, sender=rate_model, dispatch_uid=f'rate_snapshot_delete_{rate_model.__name__}')(rate_table_changed)
@@ -1,3 +1,468 @@
+import gc
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from .models import PAYETaxBand, TaxRelief, NSSFRate, SHIFRate, AffordableHousingLevyRate
+from .rates import get_rate_snapshot, get_rate_timeline, invalidate_rate_snapshots, load_rate_snapshot
+from .utils import (
+    PAYECalculator, NSSFCalculator, SHIFCalculator, AffordableHousingLevyCalculator,
+    PAYEBandSchedule, StatutoryBatchCalculator, CentsStatutoryCalculator,
+    validate_statutory_compliance_batch,
+)
+from .gross_up import NetToGrossSolver
+from .lookup import StatutoryLookupTable, get_lookup_table, reset_lookup_tables
+from .memo import contribution_memo, contribution_memo_stats
+from .money import to_cents, cents_to_decimal, round_half_up
+
+
+def create_kenyan_rates(effective_date=date(2024, 1, 1)):
+    """Create the rate tables set up by the setup_tax_data command"""
+    bands = [
+        (0, 24000, '10'),
+        (24001, 32333, '25'),
+        (32334, 500000, '30'),
+        (500001, 800000, '32.5'),
+        (800001, None, '35'),
+    ]
+    for lower, upper, rate in bands:
+        PAYETaxBand.objects.create(
+            lower_limit=Decimal(lower),
+            upper_limit=Decimal(upper) if upper else None,
+            tax_rate=Decimal(rate),
+            effective_date=effective_date,
+        )
+    TaxRelief.objects.create(relief_type='PERSONAL', amount=Decimal('2400'), effective_date=effective_date)
+    NSSFRate.objects.create(
+        tier=1, lower_limit=Decimal('0'), upper_limit=Decimal('7000'),
+        contribution_rate=Decimal('6'), effective_date=effective_date
+    )
+    NSSFRate.objects.create(
+        tier=2, lower_limit=Decimal('7001'), upper_limit=Decimal('36000'),
+        contribution_rate=Decimal('6'), effective_date=effective_date
+    )
+    SHIFRate.objects.create(
+        contribution_rate=Decimal('2.75'), minimum_contribution=Decimal('300'), effective_date=effective_date
+    )
+    AffordableHousingLevyRate.objects.create(
+        employee_rate=Decimal('1.5'), employer_rate=Decimal('1.5'), effective_date=effective_date
+    )
+
+
+GROSS_SAMPLES = [
+    '0', '0.01', '1', '5000', '7000', '7000.01', '7001', '10909.09', '15000', '24000', '24000.50',
+    '24001', '32333', '32333.33', '32334', '36000', '36000.01', '50000', '99999.99', '123456.78',
+    '500000', '500001', '650000.55', '800000', '800001', '1234567.89',
+]
+EMPLOYMENT_TYPES = ['PERMANENT', 'CONTRACT', 'CASUAL', 'INTERN', None]
+
+
+class StatutoryBatchCalculatorTests(TestCase):
+    """The batch calculator must match the scalar calculators to the cent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def build_cases(self):
+        cases = []
+        for index, gross in enumerate(GROSS_SAMPLES):
+            for offset, employment_type in enumerate(EMPLOYMENT_TYPES):
+                seed = index * len(EMPLOYMENT_TYPES) + offset
+                cases.append({
+                    'gross': Decimal(gross),
+                    'employment_type': employment_type,
+                    'insurance_premiums': Decimal(seed * 1733 % 40000) / 100 * 3,
+                    'mortgage_interest': Decimal(seed * 997 % 4000000) / 100 if seed % 3 == 0 else Decimal('0'),
+                    'pension_contribution': Decimal(seed * 1511 % 4000000) / 100 if seed % 4 == 0 else Decimal('0'),
+                    'post_retirement_medical': Decimal(seed * 613 % 2000000) / 100 if seed % 5 == 0 else Decimal('0'),
+                })
+        return cases
+
+    def scalar_row(self, case):
+        nssf = NSSFCalculator().calculate_nssf_contribution(case['gross'], case['employment_type'])
+        shif = SHIFCalculator().calculate_shif_contribution(case['gross'])
+        levy = AffordableHousingLevyCalculator().calculate_housing_levy(case['gross'], case['employment_type'])
+        paye = PAYECalculator().calculate_paye(
+            taxable_income=case['gross'] - nssf['employee_contribution'],
+            insurance_premiums=case['insurance_premiums'],
+            mortgage_interest=case['mortgage_interest'],
+            pension_contribution=case['pension_contribution'],
+            post_retirement_medical=case['post_retirement_medical'],
+        )
+        total_deductions = (
+            nssf['employee_contribution'] + shif['shif_contribution'] +
+            levy['employee_contribution'] + paye['paye_tax']
+        )
+        return {
+            'nssf_tier_1': nssf['tier_1_contribution'],
+            'nssf_tier_2': nssf['tier_2_contribution'],
+            'nssf_employee': nssf['employee_contribution'],
+            'nssf_employer': nssf['employer_contribution'],
+            'nssf_total': nssf['total_contribution'],
+            'shif_contribution': shif['shif_contribution'],
+            'housing_levy_employee': levy['employee_contribution'],
+            'housing_levy_employer': levy['employer_contribution'],
+            'housing_levy_total': levy['total_contribution'],
+            'paye_tax': paye['paye_tax'],
+            'total_deductions': total_deductions,
+            'net_pay': case['gross'] - total_deductions,
+        }
+
+    def run_batch(self, cases):
+        results = StatutoryBatchCalculator().calculate(
+            [case['gross'] for case in cases],
+            [case['employment_type'] for case in cases],
+            insurance_premiums=[case['insurance_premiums'] for case in cases],
+            mortgage_interest=[case['mortgage_interest'] for case in cases],
+            pension_contribution=[case['pension_contribution'] for case in cases],
+            post_retirement_medical=[case['post_retirement_medical'] for case in cases],
+        )
+        return list(StatutoryBatchCalculator.iter_rows(results))
+
+    def assert_matches_scalar(self, cases, rows):
+        self.assertEqual(len(rows), len(cases))
+        for case, row in zip(cases, rows):
+            expected = self.scalar_row(case)
+            for field, value in expected.items():
+                self.assertEqual(row[field], value, f"{field} differs for {case}")
+
+    def test_matches_scalar_calculators(self):
+        cases = self.build_cases()
+        self.assert_matches_scalar(cases, self.run_batch(cases))
+
+    def test_scalar_fallback_without_numpy(self):
+        cases = self.build_cases()[:20]
+        with mock.patch('statutory_deductions.utils.np', None):
+            rows = self.run_batch(cases)
+        self.assert_matches_scalar(cases, rows)
+
+    def test_reliefs_are_optional(self):
+        results = StatutoryBatchCalculator().calculate([Decimal('50000')], ['PERMANENT'])
+        row = next(StatutoryBatchCalculator.iter_rows(results))
+        paye = PAYECalculator().calculate_paye(Decimal('50000') - row['nssf_employee'])
+        self.assertEqual(row['paye_tax'], paye['paye_tax'])
+        self.assertEqual(row['personal_relief'], Decimal('2400.00'))
+
+
+class CentsStatutoryCalculatorTests(StatutoryBatchCalculatorTests):
+    """The integer-cents calculator must match the scalar calculators to the cent"""
+
+    def run_batch(self, cases):
+        calculator = CentsStatutoryCalculator()
+        rows = []
+        for case in cases:
+            result = calculator.calculate(
+                to_cents(case['gross']),
+                case['employment_type'],
+                insurance_premiums=to_cents(case['insurance_premiums']),
+                mortgage_interest=to_cents(case['mortgage_interest']),
+                pension_contribution=to_cents(case['pension_contribution']),
+                post_retirement_medical=to_cents(case['post_retirement_medical']),
+            )
+            self.assertTrue(all(type(value) is int for value in result.values()))
+            rows.append(CentsStatutoryCalculator.to_decimal(result))
+        return rows
+
+    def test_round_half_up_matches_decimal(self):
+        for numerator in range(-30000, 30001, 2500):
+            expected = (Decimal(numerator) / 10000).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
+            self.assertEqual(round_half_up(numerator, 10000), int(expected))
+        self.assertEqual(cents_to_decimal(to_cents('1234.565')), Decimal('1234.57'))
+
+
+class ContributionMemoTests(TestCase):
+    """Contributions are memoized per snapshot, gross pay and employment type"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        contribution_memo.clear()
+
+    def test_repeated_gross_hits_memo(self):
+        calculator = CentsStatutoryCalculator(rate_snapshot=get_rate_snapshot())
+        first = calculator.calculate(to_cents('85000'), 'PERMANENT')
+        for _ in range(4):
+            self.assertEqual(calculator.calculate(to_cents('85000'), 'PERMANENT'), first)
+        calculator.calculate(to_cents('85000'), 'CONTRACT')
+
+        stats = contribution_memo_stats()
+        self.assertEqual(stats['hits'], 4)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(first, CentsStatutoryCalculator(use_memo=False).calculate(to_cents('85000'), 'PERMANENT'))
+
+    def test_rate_change_clears_memo(self):
+        calculator = CentsStatutoryCalculator(rate_snapshot=get_rate_snapshot())
+        calculator.calculate(to_cents('85000'), 'PERMANENT')
+        self.assertEqual(contribution_memo_stats()['size'], 1)
+
+        levy = AffordableHousingLevyRate.objects.get()
+        levy.employee_rate = Decimal('2')
+        levy.save()
+        self.assertEqual(contribution_memo_stats()['size'], 0)
+
+        result = CentsStatutoryCalculator(rate_snapshot=get_rate_snapshot()).calculate(to_cents('85000'), 'PERMANENT')
+        self.assertEqual(result['housing_levy_employee'], to_cents('1700'))
+
+    def test_memo_is_bounded(self):
+        with self.settings(STATUTORY_MEMO_SIZE=3):
+            calculator = CentsStatutoryCalculator(rate_snapshot=get_rate_snapshot())
+            for gross in range(10):
+                calculator.calculate(to_cents(40000 + gross))
+            self.assertEqual(contribution_memo_stats()['size'], 3)
+
+
+class NetToGrossSolverTests(TestCase):
+    """Grossing up must invert the integer engine to the cent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def test_round_trip_returns_smallest_gross(self):
+        calculator = CentsStatutoryCalculator(use_memo=False)
+        solver = NetToGrossSolver()
+        reliefs = {'insurance_premiums': to_cents('3000'), 'mortgage_interest': to_cents('20000')}
+        for employment_type in ('PERMANENT', 'CONTRACT'):
+            for relief in ({}, reliefs):
+                for gross in list(range(50000, 200000000, 1234567)) + [to_cents(value) for value in GROSS_SAMPLES[3:]]:
+                    net = calculator.calculate(gross, employment_type, **relief)['net_pay']
+                    result = solver.solve_cents(net, employment_type, **relief)
+                    self.assertTrue(result['exact'])
+                    self.assertLessEqual(result['gross_pay'], gross)
+                    below = calculator.calculate(result['gross_pay'] - 1, employment_type, **relief)
+                    self.assertNotEqual(below['net_pay'], net)
+
+    def test_solve_returns_decimals(self):
+        result = NetToGrossSolver().solve(Decimal('100000'), 'PERMANENT')
+        self.assertEqual(result['net_pay'], Decimal('100000.00'))
+        self.assertEqual(result['breakdown']['net_pay'], Decimal('100000.00'))
+        self.assertEqual(result['breakdown']['gross_pay'], result['gross_salary'])
+
+
+class StatutoryLookupTableTests(TestCase):
+    """Precomputed lookup tables must match the integer engine to the cent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+        reset_lookup_tables()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(reset_lookup_tables)
+        settings_override = self.settings(STATUTORY_LOOKUP_DIR=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def build(self):
+        call_command('build_statutory_tables', stdout=StringIO())
+        snapshot = get_rate_snapshot()
+        return snapshot, get_lookup_table(snapshot)
+
+    def test_matches_integer_engine(self):
+        snapshot, table = self.build()
+        self.assertIsNotNone(table)
+        calculator = CentsStatutoryCalculator(rate_snapshot=snapshot, use_memo=False)
+        grosses = [to_cents(value) for value in GROSS_SAMPLES] + list(range(1, 150000000, 98765))
+        grosses += [1090909, 1090910, 1090908]  # Around the SHIF minimum crossover
+        for employment_type in EMPLOYMENT_TYPES:
+            for gross in grosses:
+                expected = calculator.calculate(gross, employment_type)
+                row = table.calculate(gross, employment_type)
+                for field in CentsStatutoryCalculator.RESULT_FIELDS:
+                    self.assertEqual(row[field], expected[field], f'{field} differs at {gross} cents')
+
+    def test_artifact_is_per_rate_epoch(self):
+        snapshot, table = self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, f'{snapshot.snapshot_id}.tbl')))
+        self.assertEqual(StatutoryLookupTable(table.path).snapshot_id, snapshot.snapshot_id)
+
+        shif_rate = SHIFRate.objects.get()
+        shif_rate.contribution_rate = Decimal('3')
+        shif_rate.save()
+        self.assertIsNone(get_lookup_table(get_rate_snapshot()))
+
+
+    def test_replaced_table_is_unmapped_once_released(self):
+        snapshot, table = self.build()
+        finalizer = table._finalizer
+        shif_rate = SHIFRate.objects.get()
+        shif_rate.contribution_rate = Decimal('3')
+        shif_rate.save()
+        _, table_2 = self.build()
+        self.assertIsNot(table_2, table)
+        # A reader still holding the old table can keep using it
+        self.assertTrue(finalizer.alive)
+        self.assertEqual(table.calculate(5000000)['gross_pay'], 5000000)
+
+        del table
+        gc.collect()
+        self.assertFalse(finalizer.alive)
+
+class RateSnapshotTests(TestCase):
+    """Rate snapshots are cached per date and dropped when rate tables change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+
+    def test_calculators_use_snapshot_without_queries(self):
+        calculation_date = date(2025, 3, 1)
+        snapshot = get_rate_snapshot(calculation_date)
+        with self.assertNumQueries(0):
+            self.assertIs(get_rate_snapshot(calculation_date), snapshot)
+            paye = PAYECalculator(rate_snapshot=snapshot).calculate_paye(Decimal('80000'))
+            nssf = NSSFCalculator(rate_snapshot=snapshot).calculate_nssf_contribution(Decimal('80000'))
+            shif = SHIFCalculator(rate_snapshot=snapshot).calculate_shif_contribution(Decimal('80000'))
+            levy = AffordableHousingLevyCalculator(rate_snapshot=snapshot).calculate_housing_levy(Decimal('80000'))
+
+        self.assertEqual(paye['paye_tax'], PAYECalculator(calculation_date).calculate_paye(Decimal('80000'))['paye_tax'])
+        self.assertEqual(nssf['employee_contribution'], Decimal('2160.00'))
+        self.assertEqual(shif['shif_contribution'], Decimal('2200.00'))
+        self.assertEqual(levy['employee_contribution'], Decimal('1200.00'))
+
+    def test_rate_change_invalidates_snapshot(self):
+        snapshot = get_rate_snapshot(date(2025, 3, 1))
+        shif_rate = SHIFRate.objects.get()
+        shif_rate.contribution_rate = Decimal('3')
+        shif_rate.save()
+
+        refreshed = get_rate_snapshot(date(2025, 3, 1))
+        self.assertIsNot(refreshed, snapshot)
+        self.assertEqual(refreshed.shif_rate.contribution_rate, Decimal('3'))
+        self.assertNotEqual(refreshed.snapshot_id, snapshot.snapshot_id)
+
+    def test_snapshot_resolves_effective_date(self):
+        self.assertEqual(get_rate_snapshot(date(2023, 12, 31)).tax_bands, ())
+        self.assertEqual(len(get_rate_snapshot(date(2024, 1, 1)).tax_bands), 5)
+
+
+class RateTimelineTests(TestCase):
+    """The timeline resolves any date to the same rates as querying for it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates(effective_date=date(2023, 7, 1))
+        # The NHIF to SHIF transition and a later levy change open new epochs
+        SHIFRate.objects.create(
+            contribution_rate=Decimal('3'), minimum_contribution=Decimal('350'), effective_date=date(2024, 10, 1)
+        )
+        AffordableHousingLevyRate.objects.create(
+            employee_rate=Decimal('1.75'), employer_rate=Decimal('1.5'), effective_date=date(2025, 3, 15)
+        )
+        TaxRelief.objects.create(relief_type='PERSONAL', amount=Decimal('2500'), effective_date=date(2025, 3, 15))
+        NSSFRate.objects.create(
+            tier=2, lower_limit=Decimal('8001'), upper_limit=Decimal('72000'),
+            contribution_rate=Decimal('6'), effective_date=date(2025, 2, 1), is_active=False
+        )
+
+    def setUp(self):
+        invalidate_rate_snapshots()
+
+    def test_matches_database_resolution(self):
+        dates = [
+            date(2023, 6, 30), date(2023, 7, 1), date(2024, 9, 30), date(2024, 10, 1),
+            date(2025, 2, 1), date(2025, 3, 14), date(2025, 3, 15), date(2026, 1, 31),
+        ]
+        for calculation_date in dates:
+            self.assertEqual(get_rate_snapshot(calculation_date), load_rate_snapshot(calculation_date))
+
+    def test_run_spanning_epochs_queries_once(self):
+        timeline = get_rate_timeline()
+        with self.assertNumQueries(0):
+            snapshots = timeline.snapshots_for([date(2024, month, 28) for month in range(1, 13)])
+        self.assertEqual(len({snapshot.snapshot_id for snapshot in snapshots.values()}), 2)
+        self.assertEqual(snapshots[date(2024, 9, 28)].shif_rate.contribution_rate, Decimal('2.75'))
+        self.assertEqual(snapshots[date(2024, 10, 28)].shif_rate.contribution_rate, Decimal('3'))
+        self.assertEqual(timeline.epoch_bounds(date(2024, 12, 1)), (date(2024, 10, 1), date(2025, 3, 15)))
+
+
+class PAYEBandScheduleTests(TestCase):
+    """The compiled band schedule must agree with walking the bands"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_kenyan_rates()
+
+    def test_parity_with_band_walk(self):
+        calculator = PAYECalculator()
+        self.assertIsNotNone(calculator.band_schedule)
+
+        incomes = [Decimal(value) for value in GROSS_SAMPLES] + [
+            Decimal('-5'), Decimal('24000.01'), Decimal('24000.99'), Decimal('32333.50'),
+            Decimal('499999.99'), Decimal('800000.50'), Decimal('987654321.09'),
+        ]
+        incomes += [Decimal(cents) / 100 for cents in range(0, 120000000, 987651)]
+        for income in incomes:
+            self.assertEqual(
+                calculator._calculate_tax_on_income(income),
+                calculator._calculate_tax_by_walking_bands(income),
+                f"Tax differs for income {income}"
+            )
+
+    def test_marginal_band(self):
+        calculator = PAYECalculator()
+        self.assertIsNone(calculator.get_marginal_band(Decimal('0')))
+        self.assertEqual(calculator.get_marginal_band(Decimal('24000'))['band_index'], 0)
+        self.assertEqual(calculator.get_marginal_band(Decimal('24001.50'))['marginal_rate'], Decimal('25'))
+        self.assertEqual(calculator.get_marginal_band(Decimal('2000000'))['band_number'], 5)
+
+        result = calculator.calculate_paye(Decimal('100000'))
+        self.assertEqual(result['marginal_tax_rate'], Decimal('30'))
+        self.assertEqual(result['tax_band_index'], 2)
+
+    def test_overlapping_bands_fall_back_to_band_walk(self):
+        PAYETaxBand.objects.create(
+            lower_limit=Decimal('20000'), upper_limit=Decimal('30000'),
+            tax_rate=Decimal('15'), effective_date=date(2024, 1, 1)
+        )
+        with self.assertRaises(ValueError):
+            PAYEBandSchedule.compile(PAYETaxBand.objects.order_by('lower_limit'))
+
+        calculator = PAYECalculator()
+        self.assertIsNone(calculator.band_schedule)
+        self.assertEqual(
+            calculator._calculate_tax_on_income(Decimal('60000')),
+            calculator._calculate_tax_by_walking_bands(Decimal('60000'))
+        )
+
+
+class ComplianceBatchValidatorTests(TestCase):
+    """The batch compliance validator flags the same rows with and without NumPy"""
+
+    EMPLOYMENT_TYPES = ['PERMANENT', 'CONTRACT', 'CASUAL', 'CONTRACT', 'INTERN']
+    NSSF = [Decimal('0'), Decimal('0'), Decimal('0'), Decimal('360'), Decimal('480')]
+    LEVY = [Decimal('750'), Decimal('0'), Decimal('450'), Decimal('0'), Decimal('0')]
+
+    EXPECTED = {
+        'NSSF_MISSING': [0, 2],
+        'CONTRACT_NSSF_DEDUCTED': [3],
+        'HOUSING_LEVY_MISSING': [4],
+        'CONTRACT_HOUSING_LEVY_DEDUCTED': [],
+        'CASUAL_MANDATORY_REMINDER': [2],
+        'CONTRACT_SHIF_ONLY': [1, 3],
+    }
+
+    def test_rules(self):
+        self.assertEqual(validate_statutory_compliance_batch(self.EMPLOYMENT_TYPES, self.NSSF, self.LEVY), self.EXPECTED)
+
+    def test_rules_without_numpy(self):
+        with mock.patch('statutory_deductions.utils.np', None):
+            self.assertEqual(
+                validate_statutory_compliance_batch(self.EMPLOYMENT_TYPES, self.NSSF, self.LEVY), self.EXPECTED
+            )
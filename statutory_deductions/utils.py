@@ -1,9 +1,111 @@
 """
 Utility functions for calculating Kenyan statutory deductions
 """
+from bisect import bisect_left
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import date
 from .models import PAYETaxBand, TaxRelief, NSSFRate, SHIFRate, AffordableHousingLevyRate
+from .memo import contribution_memo
+from .money import (
+    CENTS_PER_SHILLING, MICRO_PER_CENT, to_cents, to_basis_points, cents_to_decimal,
+    micro_to_cents, decimal_amounts
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional - batch calculations fall back to the scalar calculators
+    np = None
+
+
+# Statutory compliance rules: code -> (severity, message template)
+COMPLIANCE_RULES = {
+    'NSSF_MISSING': (
+        'ERROR',
+        "NSSF contribution is mandatory for {employment_type} employees. "
+        "Employee {payroll_number} missing NSSF deduction."
+    ),
+    'CONTRACT_NSSF_DEDUCTED': (
+        'WARNING',
+        "Contract employee {payroll_number} should not have NSSF deductions. "
+        "Only SHIF is mandatory for contract employees."
+    ),
+    'HOUSING_LEVY_MISSING': (
+        'ERROR',
+        "Housing Levy is mandatory for {employment_type} employees. "
+        "Employee {payroll_number} missing Housing Levy deduction."
+    ),
+    'CONTRACT_HOUSING_LEVY_DEDUCTED': (
+        'WARNING',
+        "Contract employee {payroll_number} should not have Housing Levy deductions. "
+        "Only SHIF is mandatory for contract employees."
+    ),
+    'CASUAL_MANDATORY_REMINDER': (
+        'WARNING',
+        "REMINDER: Both NSSF and Housing Levy are mandatory for casual workers "
+        "as per NSSF Act 2013 and KRA Housing Levy regulations."
+    ),
+    'CONTRACT_SHIF_ONLY': (
+        'WARNING',
+        "Contract employee {payroll_number}: Only SHIF deductions apply. "
+        "NSSF and Housing Levy are not deducted for contract employees."
+    ),
+}
+
+
+def compliance_message(rule, employment_type, payroll_number):
+    """Message for a compliance rule broken by one employee"""
+    return COMPLIANCE_RULES[rule][1].format(employment_type=employment_type, payroll_number=payroll_number)
+
+
+def validate_statutory_compliance_batch(employment_types, nssf_contributions, housing_levy_contributions):
+    """
+    Validate statutory deductions compliance for a whole payroll at once
+
+    NSSF and Housing Levy are mandatory for every employment type except
+    CONTRACT, where only SHIF applies.
+
+    Args:
+        employment_types: Sequence of employment types
+        nssf_contributions: Sequence of employee NSSF contributions
+        housing_levy_contributions: Sequence of employee Housing Levy contributions
+
+    Returns:
+        dict: COMPLIANCE_RULES code to the list of row indices breaking that rule
+    """
+    if np is None:
+        findings = {rule: [] for rule in COMPLIANCE_RULES}
+        rows = zip(employment_types, nssf_contributions, housing_levy_contributions)
+        for index, (employment_type, nssf_contribution, housing_levy_contribution) in enumerate(rows):
+            contract = employment_type == 'CONTRACT'
+            has_nssf = nssf_contribution > 0
+            has_levy = housing_levy_contribution > 0
+            checks = {
+                'NSSF_MISSING': not contract and not has_nssf,
+                'CONTRACT_NSSF_DEDUCTED': contract and has_nssf,
+                'HOUSING_LEVY_MISSING': not contract and not has_levy,
+                'CONTRACT_HOUSING_LEVY_DEDUCTED': contract and has_levy,
+                'CASUAL_MANDATORY_REMINDER': employment_type == 'CASUAL' and not (has_nssf and has_levy),
+                'CONTRACT_SHIF_ONLY': contract,
+            }
+            for rule, broken in checks.items():
+                if broken:
+                    findings[rule].append(index)
+        return findings
+
+    employment_types = np.asarray(list(employment_types), dtype=object)
+    contract = employment_types == 'CONTRACT'
+    casual = employment_types == 'CASUAL'
+    has_nssf = np.asarray([float(value) for value in nssf_contributions], dtype=np.float64) > 0
+    has_levy = np.asarray([float(value) for value in housing_levy_contributions], dtype=np.float64) > 0
+    masks = {
+        'NSSF_MISSING': ~contract & ~has_nssf,
+        'CONTRACT_NSSF_DEDUCTED': contract & has_nssf,
+        'HOUSING_LEVY_MISSING': ~contract & ~has_levy,
+        'CONTRACT_HOUSING_LEVY_DEDUCTED': contract & has_levy,
+        'CASUAL_MANDATORY_REMINDER': casual & ~(has_nssf & has_levy),
+        'CONTRACT_SHIF_ONLY': contract,
+    }
+    return {rule: np.flatnonzero(mask).tolist() for rule, mask in masks.items()}
 
 
 def validate_statutory_deductions_compliance(employee, nssf_contribution, housing_levy_contribution):
@@ -17,9 +119,6 @@ def validate_statutory_deductions_compliance(employee, nssf_contribution, housin
 
     Returns:
         dict: Validation results with compliance status
-
-    Raises:
-        ValueError: If mandatory deductions are missing for any employment type
     """
     validation_results = {
         'is_compliant': True,
@@ -28,54 +127,109 @@ def validate_statutory_deductions_compliance(employee, nssf_contribution, housin
         'employment_type': employee.employment_type
     }
 
-    # NSSF Validation - Mandatory for ALL employment types EXCEPT CONTRACT
-    if employee.employment_type != 'CONTRACT':
-        if nssf_contribution <= 0:
+    findings = validate_statutory_compliance_batch(
+        [employee.employment_type], [nssf_contribution], [housing_levy_contribution]
+    )
+    for rule, rows in findings.items():
+        if not rows:
+            continue
+        message = compliance_message(rule, employee.employment_type, employee.payroll_number)
+        if COMPLIANCE_RULES[rule][0] == 'ERROR':
             validation_results['is_compliant'] = False
-            validation_results['errors'].append(
-                f"NSSF contribution is mandatory for {employee.employment_type} employees. "
-                f"Employee {employee.payroll_number} missing NSSF deduction."
-            )
-    else:
-        # Contract employees are exempt from NSSF
-        if nssf_contribution > 0:
-            validation_results['warnings'].append(
-                f"Contract employee {employee.payroll_number} should not have NSSF deductions. "
-                "Only SHIF is mandatory for contract employees."
-            )
+            validation_results['errors'].append(message)
+        else:
+            validation_results['warnings'].append(message)
 
-    # Housing Levy Validation - Mandatory for ALL employment types EXCEPT CONTRACT
-    if employee.employment_type != 'CONTRACT':
-        if housing_levy_contribution <= 0:
-            validation_results['is_compliant'] = False
-            validation_results['errors'].append(
-                f"Housing Levy is mandatory for {employee.employment_type} employees. "
-                f"Employee {employee.payroll_number} missing Housing Levy deduction."
-            )
-    else:
-        # Contract employees are exempt from Housing Levy
-        if housing_levy_contribution > 0:
-            validation_results['warnings'].append(
-                f"Contract employee {employee.payroll_number} should not have Housing Levy deductions. "
-                "Only SHIF is mandatory for contract employees."
-            )
+    return validation_results
 
-    # Additional validation for casual workers (common misconception)
-    if employee.employment_type == 'CASUAL':
-        if nssf_contribution <= 0 or housing_levy_contribution <= 0:
-            validation_results['warnings'].append(
-                "REMINDER: Both NSSF and Housing Levy are mandatory for casual workers "
-                "as per NSSF Act 2013 and KRA Housing Levy regulations."
-            )
 
-    # Contract employee specific validation
-    if employee.employment_type == 'CONTRACT':
-        validation_results['warnings'].append(
-            f"Contract employee {employee.payroll_number}: Only SHIF deductions apply. "
-            "NSSF and Housing Levy are not deducted for contract employees."
-        )
+class PAYEBandSchedule:
+    """
+    Compiled PAYE band table
 
-    return validation_results
+    Precomputes the cumulative tax due at the lower limit of every band, so tax
+    on any income is a binary search for the marginal band followed by a single
+    multiply-add. Bands must be sorted by lower limit and must not overlap.
+    """
+
+    def __init__(self, lower_limits, upper_limits, tax_rates, cumulative_tax):
+        self.lower_limits = lower_limits
+        self.upper_limits = upper_limits
+        self.tax_rates = tax_rates
+        self.rate_fractions = [rate / Decimal('100') for rate in tax_rates]
+        self.cumulative_tax = cumulative_tax
+
+    @classmethod
+    def compile(cls, tax_bands):
+        """
+        Compile PAYE bands into a schedule
+
+        Args:
+            tax_bands: Bands ordered by lower limit (PAYETaxBand rows or snapshot bands)
+
+        Returns:
+            PAYEBandSchedule: Compiled schedule
+
+        Raises:
+            ValueError: If the bands overlap or have inverted limits
+        """
+        lower_limits = []
+        upper_limits = []
+        tax_rates = []
+        cumulative_tax = []
+        total_tax = Decimal('0')
+
+        for band in tax_bands:
+            if band.lower_limit < 0 or (band.upper_limit is not None and band.upper_limit < band.lower_limit):
+                raise ValueError(f"Invalid PAYE band: {band}")
+            if upper_limits and (upper_limits[-1] is None or band.lower_limit < upper_limits[-1]):
+                raise ValueError(f"PAYE band overlaps the band below it: {band}")
+
+            lower_limits.append(band.lower_limit)
+            upper_limits.append(band.upper_limit)
+            tax_rates.append(band.tax_rate)
+            cumulative_tax.append(total_tax)
+
+            if band.upper_limit is not None:
+                total_tax += (band.upper_limit - band.lower_limit) * (band.tax_rate / Decimal('100'))
+
+        return cls(lower_limits, upper_limits, tax_rates, cumulative_tax)
+
+    def band_index(self, income):
+        """Index of the band taxing the top shilling of income, or None below the first band"""
+        index = bisect_left(self.lower_limits, income) - 1
+        return index if index >= 0 else None
+
+    def tax_on_income(self, income):
+        """Calculate tax on income before reliefs"""
+        if income <= 0:
+            return Decimal('0')
+
+        index = self.band_index(income)
+        if index is None:
+            return Decimal('0')
+
+        upper_limit = self.upper_limits[index]
+        top = income if upper_limit is None else min(income, upper_limit)
+        return self.cumulative_tax[index] + (top - self.lower_limits[index]) * self.rate_fractions[index]
+
+    def marginal_band(self, income):
+        """
+        Get the marginal band for an income (for payslip display)
+
+        Returns:
+            dict: band_index, band_number, marginal_rate and band limits, or None
+        """
+        index = self.band_index(income) if income > 0 else None
+        if index is None:
+            return None
+        return {
+            'band_index': index,
+            'band_number': index + 1,
+            'marginal_rate': self.tax_rates[index],
+            'lower_limit': self.lower_limits[index],
+            'upper_limit': self.upper_limits[index],
+        }
 
 
 class PAYECalculator:
@@ -84,16 +238,24 @@ class PAYECalculator:
     Based on KRA tax bands and regulations
     """
     
-    def __init__(self, calculation_date=None):
+    def __init__(self, calculation_date=None, rate_snapshot=None):
         """
         Initialize PAYE calculator with effective date
         
         Args:
             calculation_date: Date for which to calculate PAYE (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
         """
-        self.calculation_date = calculation_date or date.today()
-        self.tax_bands = self._get_active_tax_bands()
-        self.personal_relief = self._get_personal_relief()
+        if rate_snapshot is not None:
+            self.calculation_date = calculation_date or rate_snapshot.calculation_date
+            self.tax_bands = rate_snapshot.tax_bands
+            self.personal_relief = rate_snapshot.personal_relief
+        else:
+            self.calculation_date = calculation_date or date.today()
+            self.tax_bands = self._get_active_tax_bands()
+            self.personal_relief = self._get_personal_relief()
+
+        self.band_schedule = self._compile_band_schedule()
     
     def _get_active_tax_bands(self):
         """Get active PAYE tax bands for the calculation date"""
@@ -102,6 +264,13 @@ class PAYECalculator:
             is_active=True
         ).order_by('lower_limit')
     
+    def _compile_band_schedule(self):
+        """Compile tax bands for bisect lookup (None if the bands overlap)"""
+        try:
+            return PAYEBandSchedule.compile(self.tax_bands)
+        except ValueError:
+            return None
+
     def _get_personal_relief(self):
         """Get personal relief amount for the calculation date"""
         try:
@@ -150,6 +319,9 @@ class PAYECalculator:
         
         # Calculate final PAYE
         paye_tax = max(Decimal('0'), tax_before_relief - reliefs['total'])
+
+        # Marginal band for payslip display
+        marginal_band = self.get_marginal_band(income_after_deductions)
         
         return {
             'taxable_income': taxable_income,
@@ -158,7 +330,9 @@ class PAYECalculator:
             'tax_before_relief': tax_before_relief,
             'tax_reliefs': reliefs,
             'paye_tax': paye_tax.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-            'effective_tax_rate': (paye_tax / taxable_income * 100) if taxable_income > 0 else Decimal('0')
+            'effective_tax_rate': (paye_tax / taxable_income * 100) if taxable_income > 0 else Decimal('0'),
+            'marginal_tax_rate': marginal_band['marginal_rate'] if marginal_band else Decimal('0'),
+            'tax_band_index': marginal_band['band_index'] if marginal_band else None
         }
     
     def _calculate_allowable_deductions(self, insurance_premiums=None, 
@@ -196,7 +370,13 @@ class PAYECalculator:
         return deductions
     
     def _calculate_tax_on_income(self, income):
-        """Calculate tax on income using progressive tax bands"""
+        """Calculate tax on income using the compiled band schedule"""
+        if self.band_schedule is None:
+            return self._calculate_tax_by_walking_bands(income)
+        return self.band_schedule.tax_on_income(income)
+
+    def _calculate_tax_by_walking_bands(self, income):
+        """Calculate tax on income by walking every progressive tax band"""
         if income <= 0:
             return Decimal('0')
         
@@ -249,6 +429,20 @@ class PAYECalculator:
         
         return reliefs
     
+    def get_marginal_band(self, income):
+        """
+        Get the marginal tax band for an income after allowable deductions
+
+        Args:
+            income: Monthly income after allowable deductions
+
+        Returns:
+            dict: band_index, band_number, marginal_rate and band limits, or None
+        """
+        if self.band_schedule is None:
+            return None
+        return self.band_schedule.marginal_band(Decimal(str(income)))
+
     def get_tax_bands_info(self):
         """Get information about current tax bands"""
         bands_info = []
@@ -286,7 +480,7 @@ def calculate_annual_paye(monthly_taxable_income, **kwargs):
                     annual_calculation[key][sub_key] = sub_value * 12
                 else:
                     annual_calculation[key][sub_key] = sub_value
-        elif isinstance(value, Decimal) and key != 'effective_tax_rate':
+        elif isinstance(value, Decimal) and key not in ('effective_tax_rate', 'marginal_tax_rate'):
             annual_calculation[key] = value * 12
         else:
             annual_calculation[key] = value
@@ -304,13 +498,19 @@ class NSSFCalculator:
     Only SHIF is mandatory for contract employees.
     """
 
-    def __init__(self, calculation_date=None):
+    def __init__(self, calculation_date=None, rate_snapshot=None):
         """
         Initialize NSSF calculator with effective date
 
         Args:
             calculation_date: Date for which to calculate NSSF (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
         """
+        if rate_snapshot is not None:
+            self.calculation_date = calculation_date or rate_snapshot.calculation_date
+            self.nssf_rates = rate_snapshot.nssf_rates
+            return
+
         self.calculation_date = calculation_date or date.today()
         self.nssf_rates = self._get_active_nssf_rates()
 
@@ -441,13 +641,19 @@ class SHIFCalculator:
     with a minimum contribution of KES 300 per month.
     """
 
-    def __init__(self, calculation_date=None):
+    def __init__(self, calculation_date=None, rate_snapshot=None):
         """
         Initialize SHIF calculator with effective date
 
         Args:
             calculation_date: Date for which to calculate SHIF (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
         """
+        if rate_snapshot is not None:
+            self.calculation_date = calculation_date or rate_snapshot.calculation_date
+            self.shif_rate = rate_snapshot.shif_rate
+            return
+
         self.calculation_date = calculation_date or date.today()
         self.shif_rate = self._get_active_shif_rate()
 
@@ -503,13 +709,19 @@ class AffordableHousingLevyCalculator:
     Only SHIF is mandatory for contract employees.
     """
 
-    def __init__(self, calculation_date=None):
+    def __init__(self, calculation_date=None, rate_snapshot=None):
         """
         Initialize Housing Levy calculator with effective date
 
         Args:
             calculation_date: Date for which to calculate levy (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
         """
+        if rate_snapshot is not None:
+            self.calculation_date = calculation_date or rate_snapshot.calculation_date
+            self.levy_rate = rate_snapshot.levy_rate
+            return
+
         self.calculation_date = calculation_date or date.today()
         self.levy_rate = self._get_active_levy_rate()
 
@@ -580,3 +792,487 @@ class AffordableHousingLevyCalculator:
             'employer_rate': self.levy_rate.employer_rate,
             'applicable': True
         }
+
+
+def _round_micro_to_cents(values):
+    """Round micro-shilling arrays to cents using ROUND_HALF_UP (ties away from zero)"""
+    half = MICRO_PER_CENT // 2
+    return np.where(
+        values >= 0,
+        (values + half) // MICRO_PER_CENT,
+        -((half - values) // MICRO_PER_CENT)
+    )
+
+
+# Statutory caps, in cents
+MORTGAGE_INTEREST_CAP = 30000 * CENTS_PER_SHILLING
+PENSION_CONTRIBUTION_CAP = 30000 * CENTS_PER_SHILLING
+POST_RETIREMENT_MEDICAL_CAP = 15000 * CENTS_PER_SHILLING
+INSURANCE_RELIEF_RATE = 1500  # 15% in basis points
+INSURANCE_RELIEF_CAP = 5000 * CENTS_PER_SHILLING
+
+
+class CompiledRates:
+    """
+    Statutory rates converted to integer cents and basis points
+
+    Built once from the NSSF, SHIF, Housing Levy and PAYE calculators so the
+    integer engines never touch Decimal or the database.
+    """
+
+    def __init__(self, nssf_calculator, shif_calculator, housing_calculator, paye_calculator):
+        self.nssf_tiers = [
+            (rate.tier, to_cents(rate.lower_limit), to_cents(rate.upper_limit),
+             to_basis_points(rate.contribution_rate))
+            for rate in nssf_calculator.nssf_rates
+        ]
+
+        shif_rate = shif_calculator.shif_rate
+        self.shif_terms = (
+            (to_basis_points(shif_rate.contribution_rate), to_cents(shif_rate.minimum_contribution))
+            if shif_rate else None
+        )
+
+        levy_rate = housing_calculator.levy_rate
+        self.levy_terms = (
+            (to_basis_points(levy_rate.employee_rate), to_basis_points(levy_rate.employer_rate))
+            if levy_rate else None
+        )
+
+        self.paye_bands = [
+            (to_cents(band.lower_limit),
+             to_cents(band.upper_limit or Decimal('999999999')),  # Same top-band sentinel as the band walk
+             to_basis_points(band.tax_rate))
+            for band in paye_calculator.tax_bands
+        ]
+
+        # Compiled schedule: cumulative tax (micro-shillings) at each band's lower limit
+        self.paye_schedule = None
+        if paye_calculator.band_schedule is not None:
+            schedule = paye_calculator.band_schedule
+            lower_limits = [to_cents(limit) for limit in schedule.lower_limits]
+            upper_limits = [None if limit is None else to_cents(limit) for limit in schedule.upper_limits]
+            tax_rates = [to_basis_points(rate) for rate in schedule.tax_rates]
+            cumulative_tax = []
+            total_tax = 0
+            for lower, upper, rate in zip(lower_limits, upper_limits, tax_rates):
+                cumulative_tax.append(total_tax)
+                if upper is not None:
+                    total_tax += (upper - lower) * rate
+            self.paye_schedule = (lower_limits, upper_limits, tax_rates, cumulative_tax)
+
+        self.personal_relief_cents = to_cents(paye_calculator.personal_relief)
+
+
+class CentsStatutoryCalculator:
+    """
+    Per-employee statutory deductions calculator on integer cents
+
+    Opt-in fixed-point counterpart of the Decimal calculators: inputs and
+    results are ints (cents), rates are basis points, and rounding is
+    ROUND_HALF_UP at the same points, so results match the Decimal
+    calculators to the cent without allocating any Decimal objects.
+    """
+
+    RESULT_FIELDS = (
+        'gross_pay',
+        'nssf_tier_1', 'nssf_tier_2', 'nssf_employee', 'nssf_employer', 'nssf_total',
+        'shif_contribution',
+        'housing_levy_employee', 'housing_levy_employer', 'housing_levy_total',
+        'taxable_income', 'allowable_deductions', 'income_after_deductions',
+        'tax_before_relief', 'personal_relief', 'insurance_relief', 'paye_tax',
+        'total_deductions', 'net_pay',
+    )
+
+    def __init__(self, calculation_date=None, rate_snapshot=None, use_memo=True):
+        """
+        Initialize calculator with effective date
+
+        Args:
+            calculation_date: Date for which to calculate deductions (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
+            use_memo: Memoize NSSF/SHIF/levy results per gross pay (requires rate_snapshot)
+        """
+        if rate_snapshot is not None:
+            calculation_date = calculation_date or rate_snapshot.calculation_date
+        self.calculation_date = calculation_date or date.today()
+        self.rate_snapshot = rate_snapshot
+        self.nssf_calculator = NSSFCalculator(self.calculation_date, rate_snapshot)
+        self.shif_calculator = SHIFCalculator(self.calculation_date, rate_snapshot)
+        self.housing_calculator = AffordableHousingLevyCalculator(self.calculation_date, rate_snapshot)
+        self.paye_calculator = PAYECalculator(self.calculation_date, rate_snapshot)
+        self.rates = CompiledRates(
+            self.nssf_calculator, self.shif_calculator, self.housing_calculator, self.paye_calculator
+        )
+        # Contributions are only memoized against an immutable snapshot
+        self.snapshot_id = rate_snapshot.snapshot_id if use_memo and rate_snapshot is not None else None
+
+    def calculate(self, gross_pay, employment_type=None, insurance_premiums=0,
+                  mortgage_interest=0, pension_contribution=0, post_retirement_medical=0):
+        """
+        Calculate statutory deductions for one employee
+
+        Args:
+            gross_pay: Monthly gross pay in cents
+            employment_type: Employee's employment type (optional)
+            insurance_premiums: Monthly insurance premiums in cents
+            mortgage_interest: Monthly mortgage interest in cents
+            pension_contribution: Monthly pension contribution in cents
+            post_retirement_medical: Post-retirement medical fund contribution in cents
+
+        Returns:
+            dict: Integer cents per name in RESULT_FIELDS
+        """
+        rates = self.rates
+        tier_1_micro, tier_2_micro, shif, levy_employee_micro, levy_employer_micro = self.contributions(
+            gross_pay, employment_type
+        )
+        nssf_micro = tier_1_micro + tier_2_micro
+        nssf_employee = micro_to_cents(nssf_micro)
+        levy_employee = micro_to_cents(levy_employee_micro)
+
+        # PAYE on gross less the NSSF employee contribution
+        taxable_income = gross_pay - nssf_employee
+        deductions = (
+            min(mortgage_interest, MORTGAGE_INTEREST_CAP) +
+            min(pension_contribution, PENSION_CONTRIBUTION_CAP) +
+            min(post_retirement_medical, POST_RETIREMENT_MEDICAL_CAP)
+        )
+        income = max(taxable_income - deductions, 0)
+        tax_micro = self._tax_on_income(income)
+
+        insurance_micro = min(insurance_premiums * INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP * MICRO_PER_CENT)
+        relief_micro = rates.personal_relief_cents * MICRO_PER_CENT + insurance_micro
+        paye = micro_to_cents(max(tax_micro - relief_micro, 0))
+
+        total_deductions = nssf_employee + shif + levy_employee + paye
+
+        return {
+            'gross_pay': gross_pay,
+            'nssf_tier_1': micro_to_cents(tier_1_micro),
+            'nssf_tier_2': micro_to_cents(tier_2_micro),
+            'nssf_employee': nssf_employee,
+            'nssf_employer': nssf_employee,
+            'nssf_total': micro_to_cents(nssf_micro * 2),
+            'shif_contribution': shif,
+            'housing_levy_employee': levy_employee,
+            'housing_levy_employer': micro_to_cents(levy_employer_micro),
+            'housing_levy_total': micro_to_cents(levy_employee_micro + levy_employer_micro),
+            'taxable_income': taxable_income,
+            'allowable_deductions': deductions,
+            'income_after_deductions': income,
+            'tax_before_relief': micro_to_cents(tax_micro),
+            'personal_relief': rates.personal_relief_cents,
+            'insurance_relief': micro_to_cents(insurance_micro),
+            'paye_tax': paye,
+            'total_deductions': total_deductions,
+            'net_pay': gross_pay - total_deductions,
+        }
+
+    def contributions(self, gross_pay, employment_type=None):
+        """
+        NSSF, SHIF and Housing Levy for a gross pay, memoized per rate snapshot
+
+        Args:
+            gross_pay: Monthly gross pay in cents
+            employment_type: Employee's employment type (optional)
+
+        Returns:
+            tuple: (NSSF tier 1 micro, NSSF tier 2 micro, SHIF cents,
+                levy employee micro, levy employer micro)
+        """
+        if self.snapshot_id is None:
+            return self._compute_contributions(gross_pay, employment_type)
+        return contribution_memo.get_or_compute(
+            (self.snapshot_id, gross_pay, employment_type),
+            lambda: self._compute_contributions(gross_pay, employment_type)
+        )
+
+    def _compute_contributions(self, gross_pay, employment_type):
+        rates = self.rates
+        contract = employment_type == 'CONTRACT'
+        positive = gross_pay > 0
+
+        # NSSF - replicates NSSFCalculator tier by tier, exempting contract employees
+        tier_1_micro = 0
+        tier_2_micro = 0
+        if positive and not contract:
+            for tier, lower, upper, rate in rates.nssf_tiers:
+                if tier == 1:
+                    tier_1_micro = min(gross_pay, upper) * rate
+                elif tier == 2:
+                    threshold = lower - CENTS_PER_SHILLING
+                    if gross_pay > threshold:
+                        tier_2_micro = min(max(gross_pay - threshold, 0), upper - threshold) * rate
+
+        # SHIF - percentage of gross with a minimum, applies to all employment types
+        shif = 0
+        if rates.shif_terms and positive:
+            shif_rate, shif_minimum = rates.shif_terms
+            shif = micro_to_cents(max(gross_pay * shif_rate, shif_minimum * MICRO_PER_CENT))
+
+        # Housing Levy - exempt for contract employees
+        levy_employee_micro = levy_employer_micro = 0
+        if rates.levy_terms and positive and not contract:
+            employee_rate, employer_rate = rates.levy_terms
+            levy_employee_micro = gross_pay * employee_rate
+            levy_employer_micro = gross_pay * employer_rate
+
+        return tier_1_micro, tier_2_micro, shif, levy_employee_micro, levy_employer_micro
+
+    def _tax_on_income(self, income):
+        """Tax before relief in micro-shillings"""
+        if self.rates.paye_schedule is not None:
+            lower_limits, upper_limits, tax_rates, cumulative_tax = self.rates.paye_schedule
+            index = bisect_left(lower_limits, income) - 1
+            if index < 0:
+                return 0
+            upper = upper_limits[index]
+            top = income if upper is None else min(income, upper)
+            return cumulative_tax[index] + (top - lower_limits[index]) * tax_rates[index]
+
+        tax_micro = 0
+        remaining = income
+        for lower, upper, rate in self.rates.paye_bands:
+            if remaining <= 0:
+                break
+            if income <= lower:
+                continue
+            taxable_in_band = upper - lower if income > upper else income - lower
+            tax_micro += taxable_in_band * rate
+            remaining -= taxable_in_band
+        return tax_micro
+
+    @staticmethod
+    def to_decimal(result):
+        """Convert a calculate() result to Decimal amounts at the model boundary"""
+        return decimal_amounts(result)
+
+
+class StatutoryBatchCalculator:
+    """
+    Whole-payroll statutory deductions calculator
+
+    Computes NSSF, SHIF, Housing Levy and PAYE for many employees at once from
+    columnar inputs. All arithmetic is done on integer cents with NumPy, and the
+    results match NSSFCalculator, SHIFCalculator, AffordableHousingLevyCalculator
+    and PAYECalculator to the cent.
+
+    When NumPy is not installed CentsStatutoryCalculator is used row by row and
+    the same result shape is returned.
+    """
+
+    RESULT_FIELDS = CentsStatutoryCalculator.RESULT_FIELDS
+    INPUT_FIELDS = (
+        'insurance_premiums', 'mortgage_interest', 'pension_contribution', 'post_retirement_medical',
+    )
+
+    def __init__(self, calculation_date=None, rate_snapshot=None):
+        """
+        Initialize batch calculator with effective date
+
+        Args:
+            calculation_date: Date for which to calculate deductions (defaults to today)
+            rate_snapshot: RateSnapshot to use instead of querying the rate tables (optional)
+        """
+        self.cents_calculator = CentsStatutoryCalculator(calculation_date, rate_snapshot)
+        self.calculation_date = self.cents_calculator.calculation_date
+        self.rate_snapshot = rate_snapshot
+        self.rates = self.cents_calculator.rates
+
+    def calculate(self, gross_pay, employment_types=None, insurance_premiums=None,
+                  mortgage_interest=None, pension_contribution=None,
+                  post_retirement_medical=None):
+        """
+        Calculate statutory deductions for a whole payroll
+
+        Args:
+            gross_pay: Sequence of monthly gross pay amounts
+            employment_types: Sequence of employment types (None entries are treated as non-contract)
+            insurance_premiums: Sequence of monthly insurance premiums (optional)
+            mortgage_interest: Sequence of monthly mortgage interest amounts (optional)
+            pension_contribution: Sequence of monthly pension contributions (optional)
+            post_retirement_medical: Sequence of post-retirement medical fund amounts (optional)
+
+        Returns:
+            dict: One column of integer cents per name in RESULT_FIELDS
+        """
+        inputs = {
+            'insurance_premiums': insurance_premiums,
+            'mortgage_interest': mortgage_interest,
+            'pension_contribution': pension_contribution,
+            'post_retirement_medical': post_retirement_medical,
+        }
+        return self.calculate_cents(
+            [to_cents(value) for value in gross_pay],
+            employment_types,
+            **{
+                field: [to_cents(value) for value in values]
+                for field, values in inputs.items() if values is not None
+            }
+        )
+
+    def calculate_cents(self, gross_pay, employment_types=None, **cents_columns):
+        """
+        Calculate statutory deductions from columns already in integer cents
+
+        Args:
+            gross_pay: Sequence of monthly gross pay in cents
+            employment_types: Sequence of employment types (optional)
+            **cents_columns: Optional cents columns named as in INPUT_FIELDS
+
+        Returns:
+            dict: One column of integer cents per name in RESULT_FIELDS
+        """
+        size = len(gross_pay)
+        columns = {'gross_pay': gross_pay}
+        for field in self.INPUT_FIELDS:
+            values = cents_columns.get(field)
+            columns[field] = values if values is not None else [0] * size
+        employment_types = list(employment_types) if employment_types is not None else [None] * size
+
+        if np is None:
+            return self._calculate_scalar(columns, employment_types)
+        return self._calculate_vectorized(columns, employment_types)
+
+    def _calculate_vectorized(self, columns, employment_types):
+        rates = self.rates
+        gross = np.asarray(columns['gross_pay'], dtype=np.int64)
+        contract = np.asarray([employment_type == 'CONTRACT' for employment_type in employment_types], dtype=bool)
+        zeros = np.zeros_like(gross)
+        positive = gross > 0
+
+        # NSSF - replicates NSSFCalculator tier by tier, exempting contract employees
+        tier_1_micro = zeros.copy()
+        tier_2_micro = zeros.copy()
+        for tier, lower, upper, rate in rates.nssf_tiers:
+            if tier == 1:
+                tier_1_micro = np.minimum(gross, upper) * rate
+            elif tier == 2:
+                threshold = lower - CENTS_PER_SHILLING
+                pensionable = np.minimum(np.maximum(gross - threshold, 0), upper - threshold)
+                tier_2_micro = np.where(gross > threshold, pensionable * rate, tier_2_micro)
+        nssf_applies = positive & ~contract
+        tier_1_micro = np.where(nssf_applies, tier_1_micro, 0)
+        tier_2_micro = np.where(nssf_applies, tier_2_micro, 0)
+        nssf_micro = tier_1_micro + tier_2_micro
+        nssf_employee = _round_micro_to_cents(nssf_micro)
+
+        # SHIF - percentage of gross with a minimum, applies to all employment types
+        if rates.shif_terms:
+            shif_rate, shif_minimum = rates.shif_terms
+            shif_micro = np.maximum(gross * shif_rate, shif_minimum * MICRO_PER_CENT)
+            shif = np.where(positive, _round_micro_to_cents(shif_micro), 0)
+        else:
+            shif = zeros
+
+        # Housing Levy - exempt for contract employees
+        if rates.levy_terms:
+            employee_rate, employer_rate = rates.levy_terms
+            levy_applies = positive & ~contract
+            levy_employee_micro = np.where(levy_applies, gross * employee_rate, 0)
+            levy_employer_micro = np.where(levy_applies, gross * employer_rate, 0)
+        else:
+            levy_employee_micro = levy_employer_micro = zeros
+        levy_employee = _round_micro_to_cents(levy_employee_micro)
+        levy_employer = _round_micro_to_cents(levy_employer_micro)
+
+        # PAYE on gross less the NSSF employee contribution
+        taxable_income = gross - nssf_employee
+        deductions = (
+            np.minimum(np.asarray(columns['mortgage_interest'], dtype=np.int64), MORTGAGE_INTEREST_CAP) +
+            np.minimum(np.asarray(columns['pension_contribution'], dtype=np.int64), PENSION_CONTRIBUTION_CAP) +
+            np.minimum(np.asarray(columns['post_retirement_medical'], dtype=np.int64), POST_RETIREMENT_MEDICAL_CAP)
+        )
+        income = np.maximum(taxable_income - deductions, 0)
+
+        if rates.paye_schedule is not None:
+            tax_micro = self._tax_from_schedule(income)
+        else:
+            tax_micro = zeros.copy()
+            remaining = income.copy()
+            for lower, upper, rate in rates.paye_bands:
+                in_band = (remaining > 0) & (income > lower)
+                taxable_in_band = np.where(income > upper, upper - lower, income - lower)
+                tax_micro = tax_micro + np.where(in_band, taxable_in_band * rate, 0)
+                remaining = remaining - np.where(in_band, taxable_in_band, 0)
+
+        # Insurance relief: 15% of premiums, capped at KES 5,000 per month
+        premiums = np.asarray(columns['insurance_premiums'], dtype=np.int64)
+        insurance_micro = np.minimum(premiums * INSURANCE_RELIEF_RATE, INSURANCE_RELIEF_CAP * MICRO_PER_CENT)
+        personal_micro = rates.personal_relief_cents * MICRO_PER_CENT
+        paye = _round_micro_to_cents(np.maximum(tax_micro - personal_micro - insurance_micro, 0))
+
+        total_deductions = nssf_employee + shif + levy_employee + paye
+
+        return {
+            'gross_pay': gross,
+            'nssf_tier_1': _round_micro_to_cents(tier_1_micro),
+            'nssf_tier_2': _round_micro_to_cents(tier_2_micro),
+            'nssf_employee': nssf_employee,
+            'nssf_employer': nssf_employee.copy(),
+            'nssf_total': _round_micro_to_cents(nssf_micro * 2),
+            'shif_contribution': shif,
+            'housing_levy_employee': levy_employee,
+            'housing_levy_employer': levy_employer,
+            'housing_levy_total': _round_micro_to_cents(levy_employee_micro + levy_employer_micro),
+            'taxable_income': taxable_income,
+            'allowable_deductions': deductions,
+            'income_after_deductions': income,
+            'tax_before_relief': _round_micro_to_cents(tax_micro),
+            'personal_relief': np.full_like(gross, rates.personal_relief_cents),
+            'insurance_relief': _round_micro_to_cents(insurance_micro),
+            'paye_tax': paye,
+            'total_deductions': total_deductions,
+            'net_pay': gross - total_deductions,
+        }
+
+    def _tax_from_schedule(self, income):
+        """Tax before relief in micro-shillings using a binary search for each marginal band"""
+        lower_limits, upper_limits, tax_rates, cumulative_tax = self.rates.paye_schedule
+        if not lower_limits:
+            return np.zeros_like(income)
+
+        lower = np.asarray(lower_limits, dtype=np.int64)
+        upper = np.asarray(
+            [np.iinfo(np.int64).max if limit is None else limit for limit in upper_limits], dtype=np.int64
+        )
+        rate = np.asarray(tax_rates, dtype=np.int64)
+        cumulative = np.asarray(cumulative_tax, dtype=np.int64)
+
+        index = np.searchsorted(lower, income, side='left') - 1
+        in_a_band = index >= 0
+        index = np.maximum(index, 0)
+        top = np.minimum(income, upper[index])
+        return np.where(in_a_band, cumulative[index] + (top - lower[index]) * rate[index], 0)
+
+    def _calculate_scalar(self, columns, employment_types):
+        """Row-by-row fallback on the integer engine, used when NumPy is unavailable"""
+        results = {field: [] for field in self.RESULT_FIELDS}
+
+        for index, gross_pay in enumerate(columns['gross_pay']):
+            row = self.cents_calculator.calculate(
+                gross_pay,
+                employment_types[index],
+                **{field: columns[field][index] for field in self.INPUT_FIELDS}
+            )
+            for field in self.RESULT_FIELDS:
+                results[field].append(row[field])
+
+        return results
+
+    @classmethod
+    def iter_rows(cls, results):
+        """
+        Yield one dict of Decimal amounts per employee from a calculate() result
+
+        Args:
+            results: Columnar result returned by calculate()
+
+        Yields:
+            dict: Field name to Decimal amount for a single employee
+        """
+        columns = [(field, results[field]) for field in cls.RESULT_FIELDS]
+        size = len(results['gross_pay'])
+        for index in range(size):
+            yield {field: cents_to_decimal(column[index]) for field, column in columns}